@@ -0,0 +1,121 @@
+"""
+Time each stage of the matching pipeline on synthetic questionnaire exports
+
+Each size runs in a fresh process, so that its peak memory is measured on its own
+Results are written as JSON, one entry per size with the records of every stage, see
+date_matching/profiling.py
+
+    python -m benchmarks.run_benchmarks --sizes 100 1000 --backend blossom
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from benchmarks.synthetic import write_responses
+
+SIZES = [100, 1000, 10000, 50000]
+RESULTS_DIR = "benchmarks/results"
+
+
+def run_size(size: int, backend: str, seed: int, trace_memory: bool) -> dict:
+    """Run the whole pipeline once on a synthetic export of the given size"""
+    # Imported here, so that the parent process doesn't count towards the memory of each size
+    from data_transformer import load_participants
+    from date_matching.matching.matchmaker import MatchMaker
+    from date_matching.matching.results import WRITERS, write_results
+    from date_matching.profiling import profiler
+
+    logging.getLogger().setLevel(logging.WARNING)
+    profiler.trace_memory = trace_memory
+    result = {"size": size, "backend": backend, "seed": seed}
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(
+        io.StringIO()
+    ):
+        raw_csv = write_responses(os.path.join(directory, "raw.csv"), size, seed)
+        try:
+            participants = load_participants(raw_csv)
+            mm = MatchMaker(
+                participants, solver_backend=backend, use_score_cache=False, quiet=True
+            )
+            mm.solve()
+            write_results(mm.results, os.path.join(directory, "matches"), WRITERS)
+
+            result.update(
+                participants=len(mm.persons),
+                possible_matches=len(mm.match_tracker.possible_matches),
+                components=len(mm.components),
+                matched=mm.results.matched,
+                objective=mm.results.objective,
+            )
+        except MemoryError as e:
+            result["error"] = f"MemoryError: {e}"
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+
+    # Nested stages, such as matchmaker/compatibility, are part of the outermost ones
+    result["stages"] = profiler.records
+    result["total_wall_s"] = sum(
+        record["wall_s"] for record in profiler.records if "/" not in record["stage"]
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--backend", default="blossom")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="also record the peak Python allocations of each stage (slower)",
+    )
+    parser.add_argument("--output", help="path of the JSON results")
+    args = parser.parse_args()
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "runs": [],
+    }
+
+    context = multiprocessing.get_context("spawn")
+    for size in args.sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            run = executor.submit(
+                run_size, size, args.backend, args.seed, args.trace_memory
+            ).result()
+        results["runs"].append(run)
+
+        summary = ", ".join(
+            f"{record['stage'].split('/')[-1]} {record['wall_s']:.2f}s"
+            for record in run["stages"]
+            if record["stage"].count("/") <= 1
+        )
+        print(f"{size} participants: {summary}")
+        if "error" in run:
+            print(f"  failed: {run['error']}")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"benchmark_{timestamp}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
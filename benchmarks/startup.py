@@ -0,0 +1,86 @@
+"""
+Time the startup of the command line, and guard it against regressions
+
+Each command runs in a fresh interpreter, several times, keeping the fastest run so that a busy
+machine doesn't fail the check. The check fails (exit code 1) if a command takes longer than
+--max-seconds, or if it imports a library its stage doesn't need
+
+    python -m benchmarks.startup --runs 5 --max-seconds 1.0
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from typing import List
+
+# Command line arguments of main.py, and the libraries each must not import
+COMMANDS = {
+    "help": (["--help"], ["numpy", "pandas", "pulp", "scipy"]),
+    "validate": (["validate"], ["pandas", "pulp", "scipy"]),
+}
+MAX_SECONDS = 1.0
+
+# Runs main.py as a script, then prints the heavy libraries that were imported
+PROBE = """
+import json, runpy, sys
+sys.argv = ["main.py"] + {args!r}
+try:
+    runpy.run_path("main.py", run_name="__main__")
+except SystemExit:
+    pass
+print(json.dumps(sorted(set({forbidden!r}) & set(sys.modules))), file=sys.stderr)
+"""
+
+
+def time_command(args: List[str], runs: int) -> float:
+    """The fastest wall time, in seconds, of running main.py with the given arguments"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "main.py", *args],
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def imported(args: List[str], forbidden: List[str]) -> List[str]:
+    """The libraries amongst forbidden that main.py imports with the given arguments"""
+    probe = subprocess.run(
+        [sys.executable, "-c", PROBE.format(args=args, forbidden=forbidden)],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return json.loads(probe.stderr.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=MAX_SECONDS)
+    args = parser.parse_args()
+
+    failures = []
+    for name, (command, forbidden) in COMMANDS.items():
+        seconds = time_command(command, args.runs)
+        heavy = imported(command, forbidden)
+        print(f"{name}: {seconds:.3f}s" + (f", imports {heavy}" if heavy else ""))
+        if seconds > args.max_seconds:
+            failures.append(f"{name} took {seconds:.3f}s, over {args.max_seconds}s")
+        if heavy:
+            failures.append(f"{name} imports {', '.join(heavy)}")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
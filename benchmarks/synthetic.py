@@ -0,0 +1,156 @@
+"""
+Generate synthetic questionnaire exports, in the raw format read by
+data_transformer.transform_csv_for_matching()
+"""
+
+import argparse
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+QUESTIONS = [
+    "adventurous",
+    "believeInTrueLove",
+    "confident",
+    "lookingForSerious",
+    "intellectualConversations",
+    "talkingAboutFeelings",
+    "extrovert",
+    "careAboutEnvironment",
+    "likeToDance",
+    "religiousConnection",
+    "outClubbing",
+    "closeToFamily",
+    "likeToTravel",
+    "swearALot",
+    "organizedAndTidy",
+    "commitmentImportant",
+    "prioritizeAcademics",
+    "discussBooksMovies",
+    "laidBack",
+    "likeSarcasticPeople",
+    "decisionBasedOnFeelings",
+    "openToChangingViews",
+    "healthyLiving",
+    "actionsOverWords",
+    "passionateAboutPolitics",
+    "sharedMoralsImportant",
+    "romantic",
+    "stemOverHumanities",
+]
+
+# The export repeats the submittedAt column after dateFormat
+COLUMNS = (
+    [
+        "submittedAt",
+        "studentId",
+        "identity",
+        "preferredDate",
+        "yearOfStudy",
+        "dateType",
+        "dateFormat",
+        "submittedAt",
+    ]
+    + QUESTIONS
+    + ["partnerPreference", "yearPreference", "purchased"]
+)
+
+# Default mixes, roughly those of the 2024 sign-ups
+GENDER_MIX = {"male": 0.55, "female": 0.4, "non-binary": 0.05}
+SEEKING_MIX = {
+    "male": {"women": 0.85, "men": 0.1, "everyone": 0.05},
+    "female": {"men": 0.75, "women": 0.1, "everyone": 0.15},
+    "non-binary": {"everyone": 0.6, "men": 0.2, "women": 0.2},
+}
+DAY_SPLIT = {"11/21/24": 0.5, "11/22/24": 0.5}
+YEAR_MIX = {"1": 0.2, "2": 0.35, "3": 0.25, "4": 0.05, "postgraduate": 0.15}
+YEAR_PREFERENCE_MIX = {"any": 0.7, "same": 0.2, "different": 0.1}
+DATE_FORMAT_MIX = {"one-on-one": 0.9, "double": 0.1}
+DATE_TYPE_MIX = {"romantic": 0.9, "friend": 0.1}
+
+
+def _choice(rng: np.random.Generator, mix: Dict[str, float], size: int) -> np.ndarray:
+    options = list(mix)
+    probabilities = np.array([mix[option] for option in options], dtype=float)
+    return rng.choice(options, size=size, p=probabilities / probabilities.sum())
+
+
+def generate_responses(
+    num_participants: int,
+    seed: int = 0,
+    gender_mix: Dict[str, float] = GENDER_MIX,
+    seeking_mix: Dict[str, Dict[str, float]] = SEEKING_MIX,
+    day_split: Dict[str, float] = DAY_SPLIT,
+    year_mix: Dict[str, float] = YEAR_MIX,
+    year_preference_mix: Dict[str, float] = YEAR_PREFERENCE_MIX,
+    date_format_mix: Dict[str, float] = DATE_FORMAT_MIX,
+    num_personas: int = 8,
+    answer_noise: float = 1.0,
+    purchased_rate: float = 1.0,
+) -> pd.DataFrame:
+    """
+    Generate a raw questionnaire export of num_participants responses
+
+    Answers are drawn around num_personas random personas, with normal noise of standard
+    deviation answer_noise, then rounded and clipped to the 1-5 scale. Fewer personas and
+    less noise give more clustered, more compatible populations
+    """
+    rng = np.random.default_rng(seed)
+    size = num_participants
+
+    identity = _choice(rng, gender_mix, size)
+    partner_preference = np.empty(size, dtype=object)
+    for gender, mix in seeking_mix.items():
+        is_gender = identity == gender
+        partner_preference[is_gender] = _choice(rng, mix, int(is_gender.sum()))
+
+    personas = rng.uniform(1, 5, size=(num_personas, len(QUESTIONS)))
+    persona = rng.integers(num_personas, size=size)
+    answers = personas[persona] + rng.normal(
+        0, answer_noise, size=(size, len(QUESTIONS))
+    )
+    answers = np.clip(np.rint(answers), 1, 5).astype(int)
+
+    submitted = pd.Timestamp("2024-11-12T09:00:00+00:00") + pd.to_timedelta(
+        np.sort(rng.uniform(0, 7 * 24 * 3600, size=size)), unit="s"
+    )
+    submitted = submitted.strftime("%Y-%m-%dT%H:%M:%S.000+00:00")
+    student_ids = rng.choice(np.arange(1_000_000, 6_000_000), size=size, replace=False)
+    purchased = np.where(rng.random(size) < purchased_rate, "yes", "")
+
+    columns = (
+        [
+            submitted,
+            student_ids,
+            identity,
+            _choice(rng, day_split, size),
+            _choice(rng, year_mix, size),
+            _choice(rng, DATE_TYPE_MIX, size),
+            _choice(rng, date_format_mix, size),
+            submitted,
+        ]
+        + list(answers.T)
+        + [
+            partner_preference,
+            _choice(rng, year_preference_mix, size),
+            purchased,
+        ]
+    )
+    responses = pd.DataFrame(dict(enumerate(columns)))
+    responses.columns = COLUMNS
+    return responses
+
+
+def write_responses(path: str, num_participants: int, seed: int = 0, **kwargs) -> str:
+    generate_responses(num_participants, seed, **kwargs).to_csv(path, index=False)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("size", type=int, help="number of participants")
+    parser.add_argument("output", help="path of the CSV to write")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_responses(args.output, args.size, args.seed)
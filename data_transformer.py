@@ -1,6 +1,16 @@
-import pandas as pd
-import numpy as np
-from datetime import datetime
+import csv
+import logging
+from typing import TYPE_CHECKING
+
+from date_matching.config import INGEST_CHUNK_SIZE
+from date_matching.participants import ParticipantTable
+from date_matching.profiling import profiled, profiler
+
+# pandas is slow to import, so it is only imported by the functions that read the rows with it
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
 
 def format_student_id(student_id):
     """
@@ -17,16 +27,270 @@ def format_student_id(student_id):
         return f"u{student_id}"
     return student_id
 
-def transform_csv_for_matching(input_csv: str, output_csv: str):
+# The personality questions, as worded in the romantic_dates.csv format
+PERSONALITY_QUESTIONS = [
+    'I like to be adventurous.',
+    'I believe in true love.',
+    'I am confident.',
+    'I am looking for something serious.',
+    'I like to have intellectual conversations.',
+    'I like talking about my feelings and emotions.',
+    'I am an extrovert.',
+    'I care about the environment.',
+    'I like to dance.',
+    'I have a strong connection with religion.',
+    'On a Friday night, I would be most likely out clubbing.',
+    'I believe being close to your family is important.',
+    'I like to travel.',
+    'I tend to swear a lot.',
+    'I am always very organised and tidy.',
+    'I believe commitment is the most important factor in a relationship.',
+    'I tend to prioritize my academic life over my social life.',
+    'I like discussing books or/and movies.',
+    'I am laid back.',
+    'I like sarcastic people.',
+    'I tend to base my decisions on feelings rather than rational thinking.',
+    'In a heated argument, I am okay with being proven wrong and/or change my view based on what my opponent has said.',
+    'Healthy living is important to me.',
+    'I believe actions speak louder than words.',
+    'I am passionate about talking about politics',
+    "It's important for my partner to share the same morals as me.",
+    'I am a romantic.'
+]
+
+# Map the personality questions from the input column names to the exact format needed
+QUESTION_COLUMN_MAPPING = {
+    'adventurous': 'I like to be adventurous.',
+    'believeInTrueLove': 'I believe in true love.',
+    'confident': 'I am confident.',
+    'lookingForSerious': 'I am looking for something serious.',
+    'intellectualConversations': 'I like to have intellectual conversations.',
+    'talkingAboutFeelings': 'I like talking about my feelings and emotions.',
+    'extrovert': 'I am an extrovert.',
+    'careAboutEnvironment': 'I care about the environment.',
+    'likeToDance': 'I like to dance.',
+    'religiousConnection': 'I have a strong connection with religion.',
+    'outClubbing': 'On a Friday night, I would be most likely out clubbing.',
+    'closeToFamily': 'I believe being close to your family is important.',
+    'likeToTravel': 'I like to travel.',
+    'swearALot': 'I tend to swear a lot.',
+    'organizedAndTidy': 'I am always very organised and tidy.',
+    'commitmentImportant': 'I believe commitment is the most important factor in a relationship.',
+    'prioritizeAcademics': 'I tend to prioritize my academic life over my social life.',
+    'discussBooksMovies': 'I like discussing books or/and movies.',
+    'laidBack': 'I am laid back.',
+    'likeSarcasticPeople': 'I like sarcastic people.',
+    'decisionBasedOnFeelings': 'I tend to base my decisions on feelings rather than rational thinking.',
+    'openToChangingViews': 'In a heated argument, I am okay with being proven wrong and/or change my view based on what my opponent has said.',
+    'healthyLiving': 'Healthy living is important to me.',
+    'actionsOverWords': 'I believe actions speak louder than words.',
+    'passionateAboutPolitics': 'I am passionate about talking about politics',
+    'sharedMoralsImportant': "It's important for my partner to share the same morals as me.",
+    'romantic': 'I am a romantic.'
+}
+
+# Columns of the raw export that are read, along with the personality questions above
+RAW_COLUMNS = [
+    'submittedAt',
+    'studentId',
+    'identity',
+    'preferredDate',
+    'yearOfStudy',
+    'dateType',
+    'dateFormat',
+    'partnerPreference',
+    'yearPreference',
+    'purchased',
+]
+
+def validate_header(input_csv: str):
+    """
+    Check that the raw export has every column the transformation reads, from its header only.
+    
+    Args:
+        input_csv: Path to the input CSV file
+    
+    Raises:
+        ValueError: If any column is missing
+    """
+    with open(input_csv, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f), [])
+    missing_columns = [col for col in RAW_COLUMNS + list(QUESTION_COLUMN_MAPPING) if col not in header]
+    if missing_columns:
+        raise ValueError(f"Missing columns in {input_csv}: {missing_columns}")
+
+def read_transformed_chunks(input_csv: str, chunksize: int = INGEST_CHUNK_SIZE):
+    """
+    Read the raw export in chunks of rows, transforming and filtering each chunk as it is read,
+    so that the whole export is never held in memory at once.
+    
+    Args:
+        input_csv: Path to the input CSV file
+        chunksize: Number of raw rows to read at a time
+        
+    Yields:
+        pd.DataFrame: The transformed rows of each chunk, in the romantic_dates.csv format
+    """
+    import pandas as pd
+
+    validate_header(input_csv)
+    # Read the categorical columns as text, so that each chunk is typed the same way
+    # e.g. yearOfStudy would be read as numbers in a chunk without any postgraduate
+    dtypes = {col: str for col in RAW_COLUMNS}
+    dtypes.update({col: float for col in QUESTION_COLUMN_MAPPING})
+    chunks = pd.read_csv(
+        input_csv,
+        usecols=RAW_COLUMNS + list(QUESTION_COLUMN_MAPPING),
+        dtype=dtypes,
+        chunksize=chunksize,
+    )
+    for df in chunks:
+        yield transform_chunk(df)
+
+@profiled("transform")
+def load_participants(
+    input_csv: str, output_path: str = None, chunksize: int = INGEST_CHUNK_SIZE
+) -> ParticipantTable:
+    """
+    Read the raw export in chunks straight into a ParticipantTable for the matcher,
+    without writing and parsing an intermediate CSV.
+    
+    Args:
+        input_csv: Path to the input CSV file
+        output_path: Optional path of a .npz file to save the participants to,
+            read it back with ParticipantTable.load()
+        chunksize: Number of raw rows to read at a time
+        
+    Returns:
+        ParticipantTable: Every participant that purchased a ticket
+    """
+    tables = [
+        ParticipantTable.from_frame(chunk)
+        for chunk in read_transformed_chunks(input_csv, chunksize)
+    ]
+    if not tables:
+        raise ValueError(f"No responses in {input_csv}")
+    participants = ParticipantTable.concatenate(tables)
+    logger.info(f"Loaded {len(participants)} participants from {input_csv}")
+    
+    if output_path is not None:
+        participants.save(output_path)
+        logger.info(f"Participants saved to {output_path}")
+    profiler.record(chunks=len(tables), participants=len(participants))
+    return participants
+
+def validate_export(input_csv: str) -> dict:
+    """
+    Check the raw export without transforming it: its header, and that every answer given by
+    the participants that purchased a ticket is a number. Read with the csv module, so that
+    checking an export doesn't import pandas.
+    
+    Args:
+        input_csv: Path to the input CSV file
+        
+    Returns:
+        dict: The number of responses, of participants that purchased a ticket, and the
+            (1-based) data rows of those with a non-numeric answer
+        
+    Raises:
+        ValueError: If any column is missing
+    """
+    validate_header(input_csv)
+    responses, purchased, invalid_rows = 0, 0, []
+    with open(input_csv, newline='', encoding='utf-8-sig') as f:
+        for row_number, row in enumerate(csv.DictReader(f), start=1):
+            responses += 1
+            if (row['purchased'] or '').strip().lower() != 'yes':
+                continue
+            purchased += 1
+            try:
+                # Unanswered questions are left out of the scores, so only the answers given are checked
+                for col in QUESTION_COLUMN_MAPPING:
+                    if row[col].strip():
+                        float(row[col])
+            except (AttributeError, ValueError):
+                # AttributeError is a row cut short, without the column
+                invalid_rows.append(row_number)
+    return {'responses': responses, 'purchased': purchased, 'invalid_rows': invalid_rows}
+
+def load_table(path: str, output_path: str = None) -> ParticipantTable:
+    """
+    Read participants from any of the formats the pipeline writes or receives.
+    
+    Args:
+        path: Participants saved as .npz, the raw questionnaire export, or responses that
+            were already transformed to the romantic_dates.csv format
+        output_path: Optional path of a .npz file to save participants read from the raw
+            export to, see load_participants()
+        
+    Returns:
+        ParticipantTable: The participants
+    """
+    if path.endswith('.npz'):
+        return ParticipantTable.load(path)
+    try:
+        validate_header(path)
+    except ValueError:
+        import pandas as pd
+
+        return ParticipantTable.from_frame(pd.read_csv(path))
+    return load_participants(path, output_path)
+
+@profiled("transform")
+def transform_csv_for_matching(
+    input_csv: str, output_csv: str, chunksize: int = INGEST_CHUNK_SIZE
+):
     """
     Transform the downloaded CSV format to match the romantic_dates.csv format.
+    The export is transformed in chunks, each appended to the output as it is read.
     
     Args:
         input_csv: Path to the input CSV file
         output_csv: Path where the transformed CSV should be saved
+        chunksize: Number of raw rows to read at a time
+    """
+    import pandas as pd
+
+    entries = 0
+    columns = []
+    for chunk_number, transformed_df in enumerate(read_transformed_chunks(input_csv, chunksize)):
+        transformed_df.to_csv(
+            output_csv,
+            mode='w' if chunk_number == 0 else 'a',
+            header=chunk_number == 0,
+            index=False,
+        )
+        entries += len(transformed_df)
+        columns = transformed_df.columns
+    print(f"Transformed data saved to {output_csv}")
+    print(f"Total number of entries: {entries}")
+    profiler.record(entries=entries)
+
+    # Validate the transformation against the header of the original format
+    original_columns = pd.read_csv("date_matching/data/romantic_dates.csv", nrows=0).columns
+    missing_columns = set(original_columns) - set(columns)
+    if missing_columns:
+        print(f"\nWarning: Missing columns compared to original format: {missing_columns}")
+    extra_columns = set(columns) - set(original_columns)
+    if extra_columns:
+        print(f"\nWarning: Extra columns not in original format: {extra_columns}")
+
+def transform_chunk(df: 'pd.DataFrame') -> 'pd.DataFrame':
+    """
+    Transform rows of the downloaded CSV format to the romantic_dates.csv format,
+    keeping only the participants that purchased a ticket.
+    
+    Args:
+        df: Rows of the raw export
+        
+    Returns:
+        pd.DataFrame: The transformed rows
     """
-    # Read the raw CSV
-    df = pd.read_csv(input_csv)
+    import pandas as pd
+
+    # Filter out rows where 'purchased' column is not 'yes'
+    # This is done first, as pandas would re-index an empty DataFrame when columns are added to it
+    df = df[df['purchased'].str.lower() == 'yes']
     
     # Create a new DataFrame with the desired column structure
     transformed_df = pd.DataFrame()
@@ -88,92 +352,15 @@ def transform_csv_for_matching(input_csv: str, output_csv: str):
     }
     transformed_df['I am interested in...'] = df['partnerPreference'].map(partner_pref_map)
     
-    # Filter out rows where 'purchased' column is not 'yes'
-    transformed_df = transformed_df[df['purchased'].str.lower() == 'yes']
-    
-    # Add all personality questions
-    personality_questions = [
-        'I like to be adventurous.',
-        'I believe in true love.',
-        'I am confident.',
-        'I am looking for something serious.',
-        'I like to have intellectual conversations.',
-        'I like talking about my feelings and emotions.',
-        'I am an extrovert.',
-        'I care about the environment.',
-        'I like to dance.',
-        'I have a strong connection with religion.',
-        'On a Friday night, I would be most likely out clubbing.',
-        'I believe being close to your family is important.',
-        'I like to travel.',
-        'I tend to swear a lot.',
-        'I am always very organised and tidy.',
-        'I believe commitment is the most important factor in a relationship.',
-        'I tend to prioritize my academic life over my social life.',
-        'I like discussing books or/and movies.',
-        'I am laid back.',
-        'I like sarcastic people.',
-        'I tend to base my decisions on feelings rather than rational thinking.',
-        'In a heated argument, I am okay with being proven wrong and/or change my view based on what my opponent has said.',
-        'Healthy living is important to me.',
-        'I believe actions speak louder than words.',
-        'I am passionate about talking about politics',
-        "It's important for my partner to share the same morals as me.",
-        'I am a romantic.'
-    ]
-    
-    # Map the personality questions from the input column names to the exact format needed
-    column_mapping = {
-        'adventurous': 'I like to be adventurous.',
-        'believeInTrueLove': 'I believe in true love.',
-        'confident': 'I am confident.',
-        'lookingForSerious': 'I am looking for something serious.',
-        'intellectualConversations': 'I like to have intellectual conversations.',
-        'talkingAboutFeelings': 'I like talking about my feelings and emotions.',
-        'extrovert': 'I am an extrovert.',
-        'careAboutEnvironment': 'I care about the environment.',
-        'likeToDance': 'I like to dance.',
-        'religiousConnection': 'I have a strong connection with religion.',
-        'outClubbing': 'On a Friday night, I would be most likely out clubbing.',
-        'closeToFamily': 'I believe being close to your family is important.',
-        'likeToTravel': 'I like to travel.',
-        'swearALot': 'I tend to swear a lot.',
-        'organizedAndTidy': 'I am always very organised and tidy.',
-        'commitmentImportant': 'I believe commitment is the most important factor in a relationship.',
-        'prioritizeAcademics': 'I tend to prioritize my academic life over my social life.',
-        'discussBooksMovies': 'I like discussing books or/and movies.',
-        'laidBack': 'I am laid back.',
-        'likeSarcasticPeople': 'I like sarcastic people.',
-        'decisionBasedOnFeelings': 'I tend to base my decisions on feelings rather than rational thinking.',
-        'openToChangingViews': 'In a heated argument, I am okay with being proven wrong and/or change my view based on what my opponent has said.',
-        'healthyLiving': 'Healthy living is important to me.',
-        'actionsOverWords': 'I believe actions speak louder than words.',
-        'passionateAboutPolitics': 'I am passionate about talking about politics',
-        'sharedMoralsImportant': "It's important for my partner to share the same morals as me.",
-        'romantic': 'I am a romantic.'
-    }
-    
     # Add all personality question responses
-    for old_col, new_col in column_mapping.items():
+    for old_col, new_col in QUESTION_COLUMN_MAPPING.items():
         transformed_df[new_col] = df[old_col].astype(float)
     
     # Ensure all values are in the correct format
-    for col in personality_questions:
+    for col in PERSONALITY_QUESTIONS:
         transformed_df[col] = transformed_df[col].round(1)
     
-    # Save the transformed DataFrame
-    transformed_df.to_csv(output_csv, index=False)
-    print(f"Transformed data saved to {output_csv}")
-    print(f"Total number of entries: {len(transformed_df)}")
-
-    # Validate the transformation
-    original_format = pd.read_csv("date_matching/data/romantic_dates.csv")
-    missing_columns = set(original_format.columns) - set(transformed_df.columns)
-    if missing_columns:
-        print(f"\nWarning: Missing columns compared to original format: {missing_columns}")
-    extra_columns = set(transformed_df.columns) - set(original_format.columns)
-    if extra_columns:
-        print(f"\nWarning: Extra columns not in original format: {extra_columns}")
+    return transformed_df
 
 if __name__ == "__main__":
     transform_csv_for_matching(
@@ -1,6 +1,21 @@
 PROBLEM_NAME = "date_matching"
 DATA_DIR = "data"
-LOG_LP_FILE_PATH = f"date_matching/{DATA_DIR}/{PROBLEM_NAME}.lp"
+
+# The raw questionnaire export is read and transformed this many rows at a time
+INGEST_CHUNK_SIZE = 10_000
+# Optionally save the transformed participants as typed arrays (.npz), None to skip
+TRANSFORMED_OUTPUT_PATH = None
+
+# Export the ILP model to a file for debugging, inspect it to see the linear function being optimised
+# Written as MPS (.mps) or LP (.lp), compressed if the path ends in .gz
+EXPORT_MODEL = False
+MODEL_EXPORT_PATH = f"date_matching/{DATA_DIR}/{PROBLEM_NAME}.mps.gz"
+
+# Cache the compatibility scores and pairability between runs, see matching/score_cache.py
+# Only pairs involving new or changed responses are scored again
+# Off by default, as it writes (participants x participants) files on every run
+USE_SCORE_CACHE = False
+SCORE_CACHE_DIR = f"date_matching/{DATA_DIR}/score_cache"
 
 
 # IMPORTANT, this is the penalty multiplier for when a soft constraint is violated
@@ -9,3 +24,129 @@ LOG_LP_FILE_PATH = f"date_matching/{DATA_DIR}/{PROBLEM_NAME}.lp"
 # The closer it is to 1, the more of a hard constraint it becomes
 # Realistically, keep it small, and below 0.9
 PENALTY_MULTIPLIER = 0.1
+
+# History of the runs, see matching/history.py
+# Runs recorded in HISTORY_PATH (with `python main.py solve --record`, or RECORD_HISTORY), and
+# published matches files imported into it, keep track of who was matched with whom. Pairs
+# matched before are left out with PAST_PAIRS = "exclude", have PAST_PAIR_PENALTY taken off
+# their weight with "penalise", or are treated like any other pair with None
+# Only record a run once its matches are final, as re-matching it would leave its pairs out
+HISTORY_PATH = f"date_matching/{DATA_DIR}/history.sqlite"
+RECORD_HISTORY = False
+PAST_PAIRS = None
+PAST_PAIR_PENALTY = 0.5
+
+# Objective of the matching, see matching/fairness.py
+# "total" maximises the total weight of the pairs, even if a few people get poor partners
+# "bottleneck" first makes the lowest compatibility of any pair as high as it can be, while
+# matching as many people as possible, then maximises the total weight
+# "floor" first matches as many people as it can with a compatibility of at least SCORE_FLOOR,
+# never pairing anyone below it, then maximises the total weight
+OBJECTIVE = "total"
+SCORE_FLOOR = 0.5
+
+
+# Algorithm used to solve the matching, see matching/backends.py
+# "ilp" builds a PuLP model and solves it with CBC
+# "blossom" solves the same problem exactly with Edmonds' blossom algorithm, without building a model
+# "greedy" is a fast approximation, matching the highest scoring pairs first
+# "local_search" improves the greedy matching with partner swaps, see MatchMaker.preview()
+# Prefer "blossom" for large events, the ILP model grows quadratically with the number of participants
+SOLVER_BACKEND = "ilp"
+
+# Settings of the "ilp" backend
+# MIP_SOLVER is the solver PuLP runs, "CBC" (bundled with PuLP), "HiGHS" (needs highspy), or the
+# name of any other PuLP solver that is installed, such as "GUROBI" or "CPLEX_CMD"
+MIP_SOLVER = "CBC"
+# Threads of the solver, None for its default. Each component solved in parallel runs its own
+# solver, so keep SOLVER_THREADS * MAX_WORKERS to the number of cores
+SOLVER_THREADS = None
+# Stop the solver after this many seconds (per component), with the best matching found so far
+SOLVER_TIME_LIMIT = None
+# Stop the solver once the matching is proven to be within this fraction of the optimum
+# e.g. 0.001 for 0.1%, None to prove optimality
+SOLVER_GAP = None
+# If True, the ILP solver is given the greedy solution as a starting point
+WARM_START = True
+
+# Solve independent groups of people (connected components of the pairable graph) as separate
+# sub-problems on a process pool of at most MAX_WORKERS processes (None uses every core)
+SOLVE_COMPONENTS_IN_PARALLEL = True
+MAX_WORKERS = None
+# Below this many possible matches in total, the components are solved one after the other in
+# the main process, as starting the pool costs more than solving them
+PARALLEL_MIN_PAIRS = 20_000
+
+# Candidate pruning for very large events, see matching/candidates.py
+# If set, each person only keeps the CANDIDATE_TOP_K partners they are most compatible with as
+# possible matches, rather than everyone they can be paired with. The people left unmatched
+# have their number of partners doubled and the problem is solved again, up to
+# CANDIDATE_WIDENINGS times. None keeps every pairable pair
+CANDIDATE_TOP_K = None
+CANDIDATE_WIDENINGS = 3
+# Events of at most this many participants are also solved without pruning, with the blossom
+# backend, to report how much of the objective the pruning lost
+CANDIDATE_CHECK_LIMIT = 1000
+# Events of at least this many participants find the CANDIDATE_TOP_K partners with an
+# approximate nearest neighbour index rather than an exact search over every pair, probing the
+# CANDIDATE_INDEX_PROBES cells closest to each person, see matching/neighbours.py
+CANDIDATE_INDEX_MIN_PARTICIPANTS = 20_000
+CANDIDATE_INDEX_PROBES = 16
+
+# Tiled scoring for events too large to hold the scores of every pair (8 bytes per pair, 20 GB
+# for 50k participants), see matching/tiles.py. If True, the pairs are scored in float32 a tile
+# at a time, keeping the partners whose weight is above SCORE_THRESHOLD, at most CANDIDATE_TOP_K
+# of them for each person if it's set. Other scores are computed when they are needed
+# As every pair would be kept otherwise, it needs CANDIDATE_TOP_K or a positive SCORE_THRESHOLD
+TILED_SCORING = False
+SCORE_THRESHOLD = 0.0
+# Memory the tiles being scored at once may use, in bytes, and the number of threads scoring
+# them (None uses every core). Without CANDIDATE_TOP_K, the partners kept may use as much, and
+# the search fails if there are more
+SCORING_MEMORY_BUDGET = 256 * 2**20
+SCORING_WORKERS = None
+
+# Venue capacity, in pairs, of each time slot of each day, for example
+# {"Thursday, 21st Nov": {"18:00": 15, "19:30": 15}, "Friday, 22nd Nov": {"18:00": 20}}
+# If set, each match is assigned a day and time slot within capacity, see matching/scheduling.py
+# Pairs free on either day are used to balance the load, and pairs that don't fit are reported
+# None leaves the day of each match to the participants' choices, without any capacity limit
+VENUE_CAPACITY = None
+
+# Group dates, see matching/groups.py
+# If True, the people who chose a group date (e.g. a double date) are formed into groups of
+# GROUP_SIZE people (an even number, as groups are made of couples), and only the people who
+# chose a one-on-one date are paired. GROUP_SEED seeds the clustering of the groups
+GROUP_DATES = False
+GROUP_SIZE = 4
+GROUP_SEED = 0
+
+# Formats the results are written in by main.py, see matching/results.py
+# "text" (the matches by day, as published), "csv" (one row per person, e.g. for a mail merge),
+# "json" (everything about the matching) and "summary" (the counts and solver statistics)
+RESULT_FORMATS = ["text"]
+
+# Instrumentation of the pipeline stages, see profiling.py
+# Write the wall time, CPU time, memory and statistics of each stage as JSON, None to disable
+PROFILE_OUTPUT_PATH = None
+# Profile each outermost stage with cProfile, writing <stage>.prof files to this directory
+CPROFILE_DIR = None
+# Only the latest stages are kept, so long-lived processes such as the service don't grow
+PROFILE_MAX_RECORDS = 10_000
+
+# Don't print every participant and every pair, so large runs aren't held up by the console
+QUIET = False
+
+# The matching service, see service.py
+SERVICE_SOCKET = f"date_matching/{DATA_DIR}/matching.sock"
+# Worker processes solving the requests of the service, each keeping its own warm ILP model
+SERVICE_WORKERS = 2
+
+# The parameter sweep, see sweep.py
+# Every combination of the penalty multipliers, day rules ("enforce" keeps the day a hard
+# constraint, "relax" makes a clash of days a soft one) and objectives is solved, on a pool of
+# SWEEP_WORKERS processes (None uses every core), and compared in a table
+SWEEP_PENALTIES = [0.0, 0.05, 0.1, 0.2, 0.3, 0.5, 0.9]
+SWEEP_DAY_RULES = ["enforce"]
+SWEEP_OBJECTIVES = ["total"]
+SWEEP_WORKERS = None
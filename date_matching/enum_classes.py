@@ -14,19 +14,20 @@ class Identity(StrRepr, Enum):
 
     @classmethod
     def from_string(cls: "Identity", s: str) -> "Identity":
-        s = s.upper()
+        return _IDENTITY_ALIASES.get(s.upper(), cls.UNDEFINED)
 
-        # TODO: move to configs
-        gender_map = {
-            cls.ANY: ["NON-BINARY", "EVERYONE", "ANYONE", "ANY", "ALL"],
-            cls.WOMAN: ["WOMAN", "WOMEN"],
-            cls.MAN: ["MAN", "MEN"],
-        }
-        for gender_enum, aliases in gender_map.items():
-            if s in aliases:
-                return gender_enum
 
-        return cls.UNDEFINED
+# TODO: move to configs
+# Built once, rather than on every call to Identity.from_string()
+_IDENTITY_ALIASES = {
+    alias: gender_enum
+    for gender_enum, aliases in {
+        Identity.ANY: ["NON-BINARY", "EVERYONE", "ANYONE", "ANY", "ALL"],
+        Identity.WOMAN: ["WOMAN", "WOMEN"],
+        Identity.MAN: ["MAN", "MEN"],
+    }.items()
+    for alias in aliases
+}
 
 
 class Year(StrRepr, Enum):
@@ -55,3 +56,16 @@ class YearPreference(StrRepr, Enum):
             return cls.DIFFERENT
         elif "OPEN" in s:
             return cls.ANY
+
+
+class DateFormat(StrRepr, Enum):
+    ONE_ON_ONE = "ONE_ON_ONE"
+    GROUP = "GROUP"
+
+    @classmethod
+    def from_string(cls: "DateFormat", s: str) -> "DateFormat":
+        # e.g. "Double date (Matched with another date pair)"
+        s = s.upper()
+        if "DOUBLE" in s or "GROUP" in s:
+            return cls.GROUP
+        return cls.ONE_ON_ONE
@@ -0,0 +1,457 @@
+import inspect
+import os
+import re
+import tempfile
+from collections import defaultdict
+from typing import TYPE_CHECKING, List, Sequence, Tuple
+
+import numpy as np
+
+from date_matching.config import (
+    MIP_SOLVER,
+    PROBLEM_NAME,
+    SOLVER_GAP,
+    SOLVER_THREADS,
+    SOLVER_TIME_LIMIT,
+    WARM_START,
+)
+from date_matching.matching.blossom import max_weight_matching
+from date_matching.matching.matchtracker import MatchTracker
+
+if TYPE_CHECKING:
+    import pulp
+
+# Summary lines of the CBC log, and the statistic each is reported as
+CBC_STATISTICS = {
+    "Objective value": "objective",
+    "Gap": "gap",
+    "Enumerated nodes": "nodes",
+    "Total iterations": "iterations",
+    "Time (Wallclock seconds)": "solver_time_s",
+}
+CBC_STATISTIC_LINE = re.compile(
+    rf"^({'|'.join(map(re.escape, CBC_STATISTICS))}):\s+(\S+)", re.MULTILINE
+)
+
+# Short names of the PuLP solvers, any other name is passed to PuLP as it is
+MIP_SOLVERS = {"CBC": "PULP_CBC_CMD", "HIGHS": "HiGHS", "HIGHS_CMD": "HiGHS_CMD"}
+
+
+class SolverBackend:
+    """
+    Base class for the algorithms that can solve the matching problem
+
+    Each backend receives the MatchTracker holding the possible matches and the weight of
+    each possible match (in the same order), and returns the pairs of indices that are matched
+    People that are left unmatched are not returned, the MatchTracker pairs them with themselves
+    """
+
+    name = ""
+    # Status of the last solve, in the same terms as LpStatus
+    status = "Not Solved"
+    # Statistics of the last solve, such as the nodes explored by the solver
+    stats = {}
+
+    def solve(
+        self, match_tracker: MatchTracker, weights: Sequence[float]
+    ) -> List[Tuple[int, int]]:
+        raise NotImplementedError
+
+    @property
+    def description(self) -> str:
+        return self.name
+
+    def _candidate_edges(
+        self, match_tracker: MatchTracker, weights: Sequence[float]
+    ) -> List[Tuple[int, int, float]]:
+        # Only edges with a positive weight can improve the objective
+        return [
+            (idx1, idx2, weight)
+            for (idx1, idx2), weight in zip(match_tracker.possible_matches, weights)
+            if idx1 != idx2 and weight > 0
+        ]
+
+
+class GreedyBackend(SolverBackend):
+    """Repeatedly match the highest weighted pair of people that are both still unmatched"""
+
+    name = "greedy"
+    status = "Heuristic"
+
+    def solve(self, match_tracker, weights, initial_matches=()):
+        # Start from the initial matches if given, and add to them greedily
+        matches = list(initial_matches)
+        matched = {idx for match in matches for idx in match}
+        edges = self._candidate_edges(match_tracker, weights)
+        self.stats = {"candidate_edges": len(edges)}
+        for idx1, idx2, _ in sorted(edges, key=lambda edge: edge[2], reverse=True):
+            if idx1 not in matched and idx2 not in matched:
+                matched.update((idx1, idx2))
+                matches.append((idx1, idx2))
+        return matches
+
+
+def matching_upper_bound(edges: List[Tuple[int, int, float]]) -> float:
+    """
+    Upper bound of the objective of any matching of the edges
+    Each matched edge weighs at most the mean of the best edges of its two people, so the
+    optimum is at most half the sum of the best edge of every person
+    """
+    if not edges:
+        return 0.0
+    edges = np.array(edges, dtype=float)
+    people = edges[:, :2].astype(np.int64)
+    best = np.zeros(people.max() + 1)
+    for column in people.T:
+        np.maximum.at(best, column, edges[:, 2])
+    return float(best.sum() / 2)
+
+
+class LocalSearchBackend(GreedyBackend):
+    """
+    Match greedily, then improve the matching with 2-opt partner swaps, fast enough for a preview
+    For two pairs (a, b) and (c, d), a swap re-pairs them as (a, c) and (b, d) if that scores
+    more, and a person can also leave their partner for someone unmatched
+    The objective of the result is reported with an upper bound, see matching_upper_bound()
+    """
+
+    name = "local_search"
+    status = "Heuristic"
+
+    def __init__(self, max_passes: int = 20) -> None:
+        self.max_passes = max_passes
+
+    def solve(self, match_tracker, weights, initial_matches=()):
+        weights = np.asarray(weights, dtype=float).tolist()
+        matches = super().solve(match_tracker, weights, initial_matches)
+        edges = self._candidate_edges(match_tracker, weights)
+
+        # Partners of each person, from the highest weight down
+        neighbours = defaultdict(list)
+        for idx1, idx2, weight in edges:
+            neighbours[idx1].append((weight, idx2))
+            neighbours[idx2].append((weight, idx1))
+        neighbours = {
+            idx: {partner: weight for weight, partner in sorted(partners, reverse=True)}
+            for idx, partners in neighbours.items()
+        }
+        best = {
+            idx: next(iter(partners.values())) for idx, partners in neighbours.items()
+        }
+
+        def weight(idx1, idx2):
+            return neighbours[idx1].get(idx2, 0.0) if idx1 in neighbours else 0.0
+
+        # Partner of each matched person, and the weight of their pair
+        mate, paired = {}, {}
+
+        def pair(idx1, idx2):
+            mate[idx1], mate[idx2] = idx2, idx1
+            paired[idx1] = paired[idx2] = weight(idx1, idx2)
+
+        for idx1, idx2 in matches:
+            pair(idx1, idx2)
+
+        def best_free(idx):
+            # The two unmatched partners idx scores the most with, as (weight, partner)
+            partners = []
+            for partner, weight in neighbours[idx].items():
+                if partner not in mate:
+                    partners.append((weight, partner))
+                    if len(partners) == 2:
+                        break
+            return partners + [(0.0, None)] * 2
+
+        swaps = 0
+        for _ in range(self.max_passes):
+            improved = False
+            for a, partners in neighbours.items():
+                b = mate.get(a)
+                current = paired.get(a, 0.0)
+                # Whatever b is left with weighs at most their best edge
+                most = best.get(b, 0.0) - current
+                free = None
+                best_gain, best_move = 1e-12, None
+                for c, new in partners.items():
+                    if new + most <= best_gain:
+                        break
+                    if c == b:
+                        continue
+                    d = mate.get(c)
+                    if d is None:
+                        # a leaves b (if any) for the unmatched c, b takes another unmatched
+                        # partner if they have one
+                        if b is None:
+                            d_weight = 0.0
+                        else:
+                            free = free or best_free(b)
+                            d_weight, d = free[0] if free[0][1] != c else free[1]
+                        gain = new - current + d_weight
+                    else:
+                        # a and c pair up, leaving b and d to pair up if they can
+                        gain = new - paired[c] - current
+                        if gain + most + current <= best_gain:
+                            continue
+                        if b is not None:
+                            gain += weight(b, d)
+                    if gain > best_gain:
+                        best_gain, best_move = gain, (c, d)
+                if best_move is None:
+                    continue
+
+                c, d = best_move
+                for idx in (b, c, d):
+                    mate.pop(idx, None)
+                    paired.pop(idx, None)
+                pair(a, c)
+                if b is not None and d is not None and d in neighbours[b]:
+                    pair(b, d)
+                swaps += 1
+                improved = True
+            if not improved:
+                break
+
+        matches = [(idx1, idx2) for idx1, idx2 in mate.items() if idx1 < idx2]
+        objective = sum(weight(idx1, idx2) for idx1, idx2 in matches)
+        upper_bound = matching_upper_bound(edges)
+        self.stats = {
+            "candidate_edges": len(edges),
+            "swaps": swaps,
+            "objective": float(objective),
+            "upper_bound": upper_bound,
+            "quality": objective / upper_bound if upper_bound > 0 else 1.0,
+        }
+        return matches
+
+
+class BlossomBackend(SolverBackend):
+    """
+    Solve the matching exactly with Edmonds' blossom algorithm
+    This runs in polynomial time and doesn't build an ILP model
+    """
+
+    name = "blossom"
+    status = "Optimal"
+
+    def solve(self, match_tracker, weights):
+        edges = self._candidate_edges(match_tracker, weights)
+        self.stats = {"candidate_edges": len(edges)}
+        mate = max_weight_matching(edges)
+        return [(idx1, idx2) for idx1, idx2 in enumerate(mate) if idx1 < idx2]
+
+
+class ILPBackend(SolverBackend):
+    """
+    Solve the matching as an integer linear program, with CBC by default
+    solver is the name of the PuLP solver, see MIP_SOLVERS
+    threads, time_limit (seconds) and gap (relative) are passed to the solver if set
+    If warm_start is set, the solver is given the greedy solution as a starting point
+    PuLP is only imported once a problem is built or solved, so the other backends never load it
+    """
+
+    name = "ilp"
+
+    def __init__(
+        self,
+        warm_start: bool = WARM_START,
+        solver: str = MIP_SOLVER,
+        threads: int = SOLVER_THREADS,
+        time_limit: float = SOLVER_TIME_LIMIT,
+        gap: float = SOLVER_GAP,
+    ) -> None:
+        self.warm_start = warm_start
+        self.solver = solver
+        self.threads = threads
+        self.time_limit = time_limit
+        self.gap = gap
+
+    @property
+    def description(self) -> str:
+        return f"{self.name} ({self.solver})"
+
+    def make_solver(self, log_path: str = None) -> "pulp.LpSolver":
+        """The PuLP solver, with the options it supports, logging to log_path if it can"""
+        import pulp
+
+        name = MIP_SOLVERS.get(self.solver.upper(), self.solver)
+        if name not in pulp.listSolvers():
+            raise ValueError(
+                f"Unknown MIP solver '{self.solver}', choose one of "
+                f"{', '.join(dict.fromkeys(list(MIP_SOLVERS) + pulp.listSolvers()))}"
+            )
+        options = {
+            "msg": False,
+            "timeLimit": self.time_limit,
+            "gapRel": self.gap,
+            "threads": self.threads,
+        }
+        solver_class = type(pulp.getSolver(name, msg=False))
+        supported = inspect.signature(solver_class.__init__).parameters
+        if "warmStart" in supported:
+            options["warmStart"] = self.warm_start
+        if "logPath" in supported:
+            options["logPath"] = log_path
+        solver = solver_class(
+            **{key: value for key, value in options.items() if value is not None}
+        )
+        if not solver.available():
+            raise ValueError(
+                f"The MIP solver '{self.solver}' isn't installed, the available ones are "
+                f"{', '.join(pulp.listSolvers(onlyAvailable=True))}"
+            )
+        return solver
+
+    def build_problem(
+        self, match_tracker: MatchTracker, weights: Sequence[float]
+    ) -> "pulp.LpProblem":
+        """
+        Initialise the problem and add the objective function
+        Then add each of the constraints to represent the problem
+        """
+        import pulp
+
+        prob = pulp.LpProblem(f"{PROBLEM_NAME}_problem".title(), pulp.LpMaximize)
+        self.set_objective(prob, match_tracker, weights)
+
+        # Ensure that each person is matched with one other person
+        for idx, _ in enumerate(match_tracker.persons):
+            variables_for_person = match_tracker.get_variables_for_person(idx)
+            prob += pulp.lpSum(variables_for_person) == 1
+
+        return prob
+
+    @staticmethod
+    def set_objective(
+        prob: "pulp.LpProblem", match_tracker: MatchTracker, weights: Sequence[float]
+    ):
+        """
+        Set the objective of the problem, e.g. to re-solve a model that is already built
+        with other weights, as the constraints don't depend on them
+        """
+        import pulp
+
+        # Scoring function, maximise the sum of the scores while penalising for any soft constraints that are violated
+        prob.setObjective(
+            pulp.lpSum(
+                variable * weight
+                for (variable, _, _), weight in zip(
+                    match_tracker.get_variables_to_indices(), weights
+                )
+            )
+        )
+
+    def solve(
+        self,
+        match_tracker,
+        weights,
+        prob: "pulp.LpProblem" = None,
+        initial_matches: List[Tuple[int, int]] = None,
+    ):
+        """
+        Solve the model, building it if it isn't given
+        initial_matches is a previous (partial) solution to warm-start from, completed greedily
+        """
+        import pulp
+
+        match_tracker.solution = None
+        if prob is None:
+            prob = self.build_problem(match_tracker, weights)
+
+        if self.warm_start:
+            self._set_initial_values(
+                match_tracker,
+                GreedyBackend().solve(match_tracker, weights, initial_matches or []),
+            )
+
+        # CBC's summary is only available from its log
+        log_file, log_path = tempfile.mkstemp(suffix=".log")
+        os.close(log_file)
+        try:
+            solver = self.make_solver(log_path)
+            prob.solve(solver=solver)
+            with open(log_path) as f:
+                log = f.read()
+        finally:
+            os.remove(log_path)
+        self.status = pulp.LpStatus[prob.status]
+        self.stats = {
+            "variables": prob.numVariables(),
+            "constraints": prob.numConstraints(),
+            # Optimal, or only feasible if the solver stopped on the time limit or the gap
+            "solution": pulp.LpSolution[prob.sol_status],
+            "solver_time_s": prob.solutionTime,
+        }
+        if isinstance(solver, pulp.PULP_CBC_CMD):
+            self.stats.update(self._parse_cbc_log(log))
+        else:
+            self.stats.update(self._highs_info(prob))
+        if prob.sol_status == pulp.LpSolutionOptimal:
+            self.stats.setdefault("gap", 0.0)
+
+        return [
+            (idx1, idx2)
+            for variable, idx1, idx2 in match_tracker.get_variables_to_indices()
+            if idx1 != idx2 and variable.varValue > 0
+        ]
+
+    @staticmethod
+    def _parse_cbc_log(log: str) -> dict:
+        stats = {}
+        for line, value in CBC_STATISTIC_LINE.findall(log):
+            try:
+                stats[CBC_STATISTICS[line]] = float(value)
+            except ValueError:
+                continue
+        for count in ("nodes", "iterations"):
+            if count in stats:
+                stats[count] = int(stats[count])
+        return stats
+
+    @staticmethod
+    def _highs_info(prob: "pulp.LpProblem") -> dict:
+        # The HiGHS API keeps the model it solved, along with its statistics
+        model = getattr(prob, "solverModel", None)
+        if model is None or not hasattr(model, "getInfo"):
+            return {}
+        info = model.getInfo()
+        return {
+            "objective": float(info.objective_function_value),
+            "gap": float(info.mip_gap),
+            "nodes": int(info.mip_node_count),
+        }
+
+    def _set_initial_values(self, match_tracker, matches):
+        matched = set(matches)
+        for idx1, idx2 in matches:
+            matched.update(((idx1, idx1), (idx2, idx2)))
+        for variable, idx1, idx2 in match_tracker.get_variables_to_indices():
+            if idx1 == idx2:
+                variable.setInitialValue(int((idx1, idx1) not in matched))
+            else:
+                variable.setInitialValue(int((idx1, idx2) in matched))
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (ILPBackend, BlossomBackend, GreedyBackend, LocalSearchBackend)
+}
+
+
+def get_backend(name: str, **kwargs) -> SolverBackend:
+    """
+    Returns an instance of the solver backend registered under the given name
+    kwargs are the options of the backend, e.g. time_limit for the ILP
+    """
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown solver backend '{name}', choose one of {', '.join(BACKENDS)}"
+        )
+    supported = inspect.signature(BACKENDS[name]).parameters
+    unsupported = [option for option in kwargs if option not in supported]
+    if unsupported:
+        accepted = f"only {', '.join(supported)}" if supported else "none"
+        raise ValueError(
+            f"The {name} backend doesn't support the options {', '.join(unsupported)}, "
+            f"it accepts {accepted}"
+        )
+    return BACKENDS[name](**kwargs)
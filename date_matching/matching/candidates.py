@@ -0,0 +1,141 @@
+"""
+Pruning of the possible matches to the most promising partners of each person
+
+With every pairable pair as a possible match, the problem grows quadratically with the number
+of participants. Instead, each person only keeps the top_k partners they are most compatible
+with (the weight of the pair in the objective: compatibility, less the penalty of any soft
+constraint violated) amongst those they can be paired with, and the solver is given the union
+of these pairs, a sparse graph of at most participants x top_k pairs
+
+The neighbours are found by an exact search over the answers, a tile of people at a time (see
+matching/tiles.py), so the full (participants x participants) scores are never held at once.
+On very large events, an approximate nearest neighbour index (see matching/neighbours.py) only
+scores each person against the people with the most similar answers, so the search is no
+longer quadratic. Pruning can only lose pairs that neither person ranks (or the index finds) in
+their top_k, and the people that are left unmatched with partners they haven't been given can
+have their top_k widened, with an exact search, see CandidateGraph.widen()
+"""
+
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from date_matching.config import CANDIDATE_INDEX_MIN_PARTICIPANTS, PENALTY_MULTIPLIER
+from date_matching.matching.blossom import max_weight_matching
+from date_matching.matching.neighbours import CosineIndex
+from date_matching.matching.tiles import TileScorer, search_partners
+from date_matching.participants import ParticipantTable
+
+
+class CandidateGraph:
+    """
+    The top k[idx] partners of each person idx, for the people that are eligible to be paired
+    Partners are only kept if they are eligible, pairable and their weight is above threshold,
+    so that they improve the objective. With top_k None, every such partner is kept
+    With top_k set, events of at least index_min_participants people are first searched with
+    an approximate index, see matching/neighbours.py
+    """
+
+    def __init__(
+        self,
+        table: ParticipantTable,
+        top_k: Optional[int],
+        eligible: np.ndarray = None,
+        penalty_multiplier: float = PENALTY_MULTIPLIER,
+        threshold: float = 0.0,
+        index_min_participants: int = CANDIDATE_INDEX_MIN_PARTICIPANTS,
+    ) -> None:
+        if top_k is not None and top_k < 1:
+            raise ValueError(f"top_k must be at least 1, not {top_k}")
+        self.table = table
+        self.penalty_multiplier = penalty_multiplier
+        self.threshold = threshold
+        self.scorer = TileScorer(table.answers)
+        if eligible is None:
+            eligible = np.ones(len(table), dtype=bool)
+        self.eligible = np.asarray(eligible, dtype=bool)
+
+        self.k = None if top_k is None else np.where(self.eligible, top_k, 0)
+        self.neighbours: List[np.ndarray] = [np.empty(0, dtype=np.int64)] * len(table)
+        # True once every valid partner of the person is a neighbour, so k can't be widened
+        self.exhausted = ~self.eligible
+        self.index = None
+        if top_k is not None and len(table) >= index_min_participants:
+            self.index = CosineIndex(self.scorer)
+        self._search(np.flatnonzero(self.eligible), approximate=self.index is not None)
+
+    def _search(self, people: np.ndarray, approximate: bool = False):
+        """Find the top k[idx] partners of the given people, with the index if approximate"""
+        if approximate:
+            partners, _ = self.index.search(
+                self.table,
+                people,
+                self.k[people],
+                self.eligible,
+                self.penalty_multiplier,
+                self.threshold,
+            )
+            for idx, neighbours in zip(people.tolist(), partners):
+                self.neighbours[idx] = neighbours
+            # The index only searches part of the people, so anyone can still be widened
+            return
+        partners, counts = search_partners(
+            self.table,
+            people,
+            None if self.k is None else self.k[people],
+            self.eligible,
+            self.penalty_multiplier,
+            self.threshold,
+            scorer=self.scorer,
+        )
+        for idx, neighbours in zip(people.tolist(), partners):
+            self.neighbours[idx] = neighbours
+        self.exhausted[people] = True if self.k is None else counts <= self.k[people]
+
+    def pairs(self) -> List[Tuple[int, int]]:
+        """The pairs (idx1 < idx2) where either person is a neighbour of the other, sorted"""
+        people = np.repeat(
+            np.arange(len(self.table)), [len(n) for n in self.neighbours]
+        )
+        if not len(people):
+            return []
+        partners = np.concatenate(self.neighbours)
+        pairs = np.unique(
+            np.column_stack(
+                (np.minimum(people, partners), np.maximum(people, partners))
+            ),
+            axis=0,
+        )
+        return [(idx1, idx2) for idx1, idx2 in pairs.tolist()]
+
+    def widen(self, people: np.ndarray, factor: int = 2) -> np.ndarray:
+        """
+        Multiply the k of the given people, if they have partners they haven't been given yet
+        Returns the people whose neighbours were widened
+        """
+        people = np.asarray(people, dtype=np.int64)
+        people = people[~self.exhausted[people]]
+        if len(people):
+            self.k[people] *= factor
+            self._search(people)
+            logging.info(
+                f"Widened the candidate partners of {len(people)} persons, "
+                f"up to {self.k[people].max()} each."
+            )
+        return people
+
+
+def optimal_objective(
+    pairs: List[Tuple[int, int]], weights: np.ndarray
+) -> Tuple[float, List[Tuple[int, int]]]:
+    """The best objective over the given pairs, and its matches, solved exactly with blossom"""
+    edges = [
+        (idx1, idx2, weight)
+        for (idx1, idx2), weight in zip(pairs, np.asarray(weights).tolist())
+        if idx1 != idx2 and weight > 0
+    ]
+    mate = max_weight_matching(edges)
+    weight_of = {(idx1, idx2): weight for idx1, idx2, weight in edges}
+    matches = [(idx1, idx2) for idx1, idx2 in enumerate(mate) if idx1 < idx2]
+    return float(sum(weight_of[match] for match in matches)), matches
@@ -0,0 +1,103 @@
+from typing import Tuple
+
+import numpy as np
+
+
+def cosine_similarity(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity between every row of left and every row of right
+    NaN marks an unanswered question, only questions answered in both rows are compared
+    """
+    left_answered, right_answered = ~np.isnan(left), ~np.isnan(right)
+    left_values = np.where(left_answered, left, 0.0)
+    right_values = np.where(right_answered, right, 0.0)
+
+    # Only questions answered by both people contribute to the dot product and the norms
+    dot = left_values @ right_values.T
+    left_norms = (left_values * left_values) @ right_answered.T.astype(dot.dtype)
+    right_norms = left_answered.astype(dot.dtype) @ (right_values * right_values).T
+    norms = np.sqrt(left_norms * right_norms)
+
+    scores = np.divide(dot, norms, out=np.zeros_like(dot), where=norms > 0)
+    np.clip(scores, 0.0, 1.0, out=scores)
+    return scores
+
+
+def paired_cosine_similarity(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Cosine similarity between each row of left and the same row of right, masked the same"""
+    answered = ~np.isnan(left) & ~np.isnan(right)
+    left_values = np.where(answered, left, 0.0)
+    right_values = np.where(answered, right, 0.0)
+
+    dot = np.einsum("ij,ij->i", left_values, right_values)
+    norms = np.sqrt(
+        np.einsum("ij,ij->i", left_values, left_values)
+        * np.einsum("ij,ij->i", right_values, right_values)
+    )
+    scores = np.divide(dot, norms, out=np.zeros_like(dot), where=norms > 0)
+    np.clip(scores, 0.0, 1.0, out=scores)
+    return scores
+
+
+class PairScores:
+    """
+    Compatibility scores computed for the pairs they are asked for, rather than held for every
+    pair, for events too large to hold them all (see matching/tiles.py)
+    Indexed like the full scores: scores[idx1, idx2] for arrays of pairs, with broadcasting
+    """
+
+    # Number of pairs scored at once
+    CHUNK = 2**16
+
+    def __init__(self, answers: np.ndarray) -> None:
+        self.answers = np.asarray(answers, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self), len(self)
+
+    def __getitem__(self, pairs: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+        idx1, idx2 = (np.asarray(idx) for idx in pairs)
+        if idx1.ndim == idx2.ndim == 2 and idx1.shape[1] == idx2.shape[0] == 1:
+            # Every pair of two groups of people, as indexed by np.ix_()
+            scores = cosine_similarity(self.answers[idx1[:, 0]], self.answers[idx2[0]])
+        else:
+            idx1, idx2 = np.broadcast_arrays(idx1, idx2)
+            scores = np.empty(idx1.shape)
+            flat1, flat2, flat = idx1.ravel(), idx2.ravel(), scores.reshape(-1)
+            for start in range(0, len(flat), self.CHUNK):
+                chunk = slice(start, start + self.CHUNK)
+                flat[chunk] = paired_cosine_similarity(
+                    self.answers[flat1[chunk]], self.answers[flat2[chunk]]
+                )
+        scores[idx1 == idx2] = 0.0
+        return scores if scores.ndim else scores[()]
+
+
+class CompatibilityMatrix:
+    """
+    Pairwise compatibility scores for every participant, computed in one batch
+
+    The answers of every participant are stacked into a dense (persons x questions) array,
+    where NaN marks a question that was not answered. The cosine similarity is taken over
+    the questions both people answered, the same as Person.compatibility_score(), but for
+    all pairs at once using matrix products
+    """
+
+    def __init__(self, answers: np.ndarray) -> None:
+        answers = np.asarray(answers, dtype=np.float64)
+        self.scores = cosine_similarity(answers, answers)
+        np.fill_diagonal(self.scores, 0.0)
+
+    @classmethod
+    def from_scores(cls, scores: np.ndarray) -> "CompatibilityMatrix":
+        """Wrap scores that were already computed, e.g. by the ScoreCache, or PairScores"""
+        compatibility = cls.__new__(cls)
+        compatibility.scores = scores
+        return compatibility
+
+    def __len__(self) -> int:
+        return len(self.scores)
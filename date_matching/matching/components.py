@@ -0,0 +1,183 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from date_matching.config import PARALLEL_MIN_PAIRS
+from date_matching.matching.backends import get_backend
+from date_matching.matching.matchtracker import MatchTracker
+from date_matching.person import Person
+
+# Statistics of the whole problem that are the sums of those of its components. The other sums,
+# such as the constraints of the models solved, are labelled as summed over the components
+TOTALS = ("objective", "upper_bound")
+
+
+class Component:
+    """
+    An independent sub-problem, a group of people that can only be paired amongst themselves
+    members are the indices of the people in the full problem, in increasing order
+    match_ids are the ids of the possible matches between them in the full MatchTracker
+    """
+
+    def __init__(self, members: np.ndarray, match_ids: np.ndarray) -> None:
+        self.members = members
+        self.match_ids = match_ids
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    @classmethod
+    def from_members(
+        cls, match_tracker: MatchTracker, members: np.ndarray
+    ) -> "Component":
+        """The sub-problem of the possible matches between the given people only"""
+        members = np.unique(members)
+        pairs = np.array(match_tracker.possible_matches, dtype=np.int64).reshape(-1, 2)
+        is_member = np.zeros(len(match_tracker.persons), dtype=bool)
+        is_member[members] = True
+        match_ids = np.flatnonzero(
+            is_member[pairs[:, 0]]
+            & is_member[pairs[:, 1]]
+            & (pairs[:, 0] != pairs[:, 1])
+        )
+        return cls(members, match_ids)
+
+    def subproblem(
+        self, match_tracker: MatchTracker, weights: Sequence[float]
+    ) -> Tuple[List[Person], List[Tuple[int, int]], List[float]]:
+        """
+        The people, possible matches and weights of the component
+        Indices in the possible matches are relative to the people of the component
+        """
+        local = np.full(len(match_tracker.persons), -1, dtype=np.int64)
+        local[self.members] = np.arange(len(self))
+        possible_matches = np.array(match_tracker.possible_matches, dtype=np.int64)
+        pairs = local[possible_matches[self.match_ids].reshape(-1, 2)]
+        return (
+            [match_tracker.persons[idx] for idx in self.members],
+            [(idx1, idx2) for idx1, idx2 in pairs.tolist()],
+            np.asarray(weights)[self.match_ids].tolist(),
+        )
+
+    def to_global(self, matches: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Map matches between the people of the component back to the full problem"""
+        return [
+            (int(self.members[idx1]), int(self.members[idx2])) for idx1, idx2 in matches
+        ]
+
+
+def find_components(match_tracker: MatchTracker) -> List[Component]:
+    """
+    Split the pairable graph into connected components
+    People that can't be paired with anyone are left out, they are always unmatched
+    """
+    # Imported here, as SciPy is slow to import and only needed once the pairs are known
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    num_persons = len(match_tracker.persons)
+    pairs = np.array(match_tracker.possible_matches, dtype=np.int64).reshape(-1, 2)
+    match_ids = np.flatnonzero(pairs[:, 0] != pairs[:, 1])
+    pairs = pairs[match_ids]
+
+    graph = coo_matrix(
+        (np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])),
+        shape=(num_persons, num_persons),
+    )
+    _, labels = connected_components(graph, directed=False)
+
+    # Group the people and the possible matches by their component label
+    member_order = np.argsort(labels, kind="stable")
+    member_splits = np.flatnonzero(np.diff(labels[member_order])) + 1
+    match_labels = labels[pairs[:, 0]]
+    match_order = np.argsort(match_labels, kind="stable")
+    match_splits = np.flatnonzero(np.diff(match_labels[match_order])) + 1
+    matches_by_label = {
+        int(match_labels[group[0]]): match_ids[group]
+        for group in np.split(match_order, match_splits)
+        if len(group)
+    }
+
+    components = []
+    for members in np.split(member_order, member_splits):
+        label = int(labels[members[0]])
+        if label in matches_by_label:
+            components.append(Component(members, matches_by_label[label]))
+    return components
+
+
+def solve_component(
+    backend_name: str,
+    persons: List[Person],
+    pairs: List[Tuple[int, int]],
+    weights: Sequence[float],
+    backend_options: Dict = None,
+) -> Tuple[List[Tuple[int, int]], str, Dict]:
+    """
+    Solve one sub-problem, indices in pairs are relative to persons
+    backend_options are passed to the backend, e.g. the time limit of the ILP solver
+    Returns the matches, with the status and statistics of the backend
+    Runs in a worker process, so everything it needs is passed in
+    """
+    match_tracker = MatchTracker(persons, pairs)
+    weights = list(weights) + [0.0] * len(persons)
+    backend = get_backend(backend_name, **(backend_options or {}))
+    matches = backend.solve(match_tracker, weights)
+    return matches, backend.status, backend.stats
+
+
+def solve_components(
+    match_tracker: MatchTracker,
+    weights: Sequence[float],
+    backend_name: str,
+    components: List[Component],
+    max_workers: int = None,
+    backend_options: Dict = None,
+    min_parallel_pairs: int = PARALLEL_MIN_PAIRS,
+) -> Tuple[List[Tuple[int, int]], List[str], Dict]:
+    """
+    Solve each component as its own sub-problem on a process pool, then merge the matches
+    With fewer than min_parallel_pairs possible matches in total, the components are solved
+    in this process instead, as starting the pool would take longer than solving them
+    As the components are independent, the merged matching has the same objective value as
+    solving the full problem at once
+
+    Returns the matches, the status of each component and the statistics of the backend
+    summed over the components, named with a _summed suffix unless they are TOTALS (the gap is
+    the largest of any component)
+    """
+    jobs = [
+        (backend_name, *component.subproblem(match_tracker, weights), backend_options)
+        for component in components
+    ]
+
+    if sum(len(pairs) for _, _, pairs, _, _ in jobs) < min_parallel_pairs:
+        results = [solve_component(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(solve_component, *zip(*jobs)))
+
+    matches = []
+    statuses = []
+    stats = {}
+    for component, (component_matches, status, component_stats) in zip(
+        components, results
+    ):
+        matches += component.to_global(component_matches)
+        statuses.append(status)
+        for name, value in component_stats.items():
+            if isinstance(value, str):
+                # e.g. whether each solution is optimal, listed once each
+                values = set(stats.get(name, "").split(", ")) | {value}
+                stats[name] = ", ".join(sorted(values - {""}))
+            elif name == "gap":
+                stats[name] = max(stats.get(name, 0), value)
+            elif name != "quality":
+                key = name if name in TOTALS else f"{name}_summed"
+                stats[key] = stats.get(key, 0) + value
+    # The quality of a heuristic is relative to the bound of the whole problem
+    if "upper_bound" in stats:
+        upper_bound = stats["upper_bound"]
+        stats["quality"] = stats["objective"] / upper_bound if upper_bound > 0 else 1.0
+    return matches, statuses, stats
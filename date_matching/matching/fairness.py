@@ -0,0 +1,227 @@
+"""
+Fairness objectives, that look after the worst matched pairs before the total weight
+
+    "bottleneck" makes the lowest compatibility of any pair as high as it can be, while still
+                 matching as many people as every pair can
+    "floor"      matches as many people as it can with a compatibility of at least SCORE_FLOOR,
+                 and never pairs anyone below it
+
+Both are solved by any backend as the usual maximum weight matching, with the pairs re-weighted:
+pairs below the floor are left out, and every other pair gets a bonus greater than the weight of
+any matching. The matching with the most pairs at or above the floor always wins, and the total
+weight breaks the ties
+
+The floor of "bottleneck" is found with a binary search over the compatibility of the pairs. A
+floor is feasible if the pairs at or above it still match as many people as all the pairs do,
+which is checked with a maximum cardinality matching (Edmonds' algorithm, without weights), far
+faster than solving the weighted problem. Each check starts from the matching of the last
+feasible floor, less its pairs below the floor being checked
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from date_matching.config import SCORE_FLOOR
+
+OBJECTIVES = ("total", "bottleneck", "floor")
+
+
+def _adjacency(num_vertices: int, pairs: np.ndarray) -> List[List[int]]:
+    ends = np.concatenate((pairs, pairs[:, ::-1]))
+    order = np.argsort(ends[:, 0], kind="stable")
+    splits = np.cumsum(np.bincount(ends[:, 0], minlength=num_vertices))[:-1]
+    return [neighbours.tolist() for neighbours in np.split(ends[order, 1], splits)]
+
+
+def max_cardinality_matching(
+    num_vertices: int,
+    pairs: np.ndarray,
+    mate: Optional[List[int]] = None,
+    target: int = None,
+) -> Tuple[List[int], int]:
+    """
+    A matching with as many pairs as possible, with Edmonds' blossom algorithm
+    pairs are the (idx1, idx2) edges, tried in order for the initial greedy matching, and mate
+    can be a matching to start from instead. Stops early once the matching has target pairs, or
+    once it can't reach them
+    Returns mate, where mate[v] is the vertex matched to v, or -1 if v is unmatched, and the
+    number of pairs
+    """
+    adjacency = _adjacency(num_vertices, pairs)
+    if mate is None:
+        mate = [-1] * num_vertices
+        for idx1, idx2 in pairs.tolist():
+            if mate[idx1] == -1 and mate[idx2] == -1:
+                mate[idx1], mate[idx2] = idx2, idx1
+    size = sum(partner != -1 for partner in mate) // 2
+
+    def augmenting_path(root: int) -> Tuple[int, List[int]]:
+        """
+        The free vertex at the end of an augmenting path from root, -1 if there is none, and
+        the parent of each vertex along the path
+        """
+        used = [False] * num_vertices
+        parent = [-1] * num_vertices
+        base = list(range(num_vertices))
+        # The vertices of each contracted blossom, by its base, the others are their own
+        members = {}
+        used[root] = True
+        queue = [root]
+
+        def lowest_common_ancestor(a: int, b: int) -> int:
+            seen = set()
+            while True:
+                a = base[a]
+                seen.add(a)
+                if mate[a] == -1:
+                    break
+                a = parent[mate[a]]
+            while True:
+                b = base[b]
+                if b in seen:
+                    return b
+                b = parent[mate[b]]
+
+        def mark_path(v: int, blossom_base: int, child: int, blossom: List[int]):
+            while base[v] != blossom_base:
+                blossom += (base[v], base[mate[v]])
+                parent[v] = child
+                child = mate[v]
+                v = parent[mate[v]]
+
+        head = 0
+        while head < len(queue):
+            v = queue[head]
+            head += 1
+            for to in adjacency[v]:
+                if base[v] == base[to] or mate[v] == to:
+                    continue
+                if to == root or (mate[to] != -1 and parent[mate[to]] != -1):
+                    # An odd cycle, contracted into a blossom
+                    blossom_base = lowest_common_ancestor(v, to)
+                    blossom = []
+                    mark_path(v, blossom_base, to, blossom)
+                    mark_path(to, blossom_base, v, blossom)
+                    # Only the vertices of the blossoms along the cycle are relabelled
+                    for inner in dict.fromkeys(blossom):
+                        vertices = members.get(inner, [inner])
+                        for u in vertices:
+                            base[u] = blossom_base
+                            if not used[u]:
+                                used[u] = True
+                                queue.append(u)
+                        if inner != blossom_base:
+                            members.pop(inner, None)
+                            members.setdefault(blossom_base, [blossom_base]).extend(
+                                vertices
+                            )
+                elif parent[to] == -1:
+                    parent[to] = v
+                    if mate[to] == -1:
+                        return to, parent
+                    used[mate[to]] = True
+                    queue.append(mate[to])
+        return -1, parent
+
+    # A vertex without an augmenting path never gets one, so each free vertex is tried once
+    free = [v for v in range(num_vertices) if mate[v] == -1 and adjacency[v]]
+    for tried, root in enumerate(free):
+        if target is not None and (
+            size >= target or 2 * (target - size) > len(free) - tried
+        ):
+            break
+        if mate[root] != -1:
+            continue
+        v, parent = augmenting_path(root)
+        if v == -1:
+            continue
+        # Flip the matched and unmatched edges along the path
+        while v != -1:
+            previous = mate[parent[v]]
+            mate[v], mate[parent[v]] = parent[v], v
+            v = previous
+        size += 1
+    return mate, size
+
+
+def _restrict(mate: List[int], pairs: np.ndarray) -> List[int]:
+    """The matching, less the pairs that aren't amongst the given pairs"""
+    num_vertices = len(mate)
+    partners = np.array(mate)
+    people = np.flatnonzero(partners > np.arange(num_vertices))
+    matched = people * num_vertices + partners[people]
+    kept = np.isin(matched, pairs.min(axis=1) * num_vertices + pairs.max(axis=1))
+    restricted = np.full(num_vertices, -1)
+    restricted[people[kept]] = partners[people[kept]]
+    restricted[partners[people[kept]]] = people[kept]
+    return restricted.tolist()
+
+
+def bottleneck_floor(
+    num_vertices: int, pairs: np.ndarray, scores: np.ndarray
+) -> Tuple[float, int]:
+    """
+    The highest floor such that the pairs scoring at least the floor match as many people as
+    all the pairs do, and the number of pairs they match
+    """
+    if not len(pairs):
+        return 0.0, 0
+    order = np.argsort(-scores, kind="stable")
+    pairs, scores = pairs[order], scores[order]
+    mate, size = max_cardinality_matching(num_vertices, pairs)
+    floors = np.unique(scores)
+
+    # floors[low] is feasible, floors[high] isn't, or is past the end
+    low, high = 0, len(floors)
+    while high - low > 1:
+        middle = (low + high) // 2
+        kept = np.searchsorted(-scores, -floors[middle], side="right")
+        above = pairs[:kept]
+        # Each pair of the matching needs two people with a pair at or above the floor
+        if np.count_nonzero(np.bincount(above.ravel())) < 2 * size:
+            high = middle
+            continue
+        candidate, found = max_cardinality_matching(
+            num_vertices, above, _restrict(mate, above), target=size
+        )
+        if found >= size:
+            low, mate = middle, candidate
+        else:
+            high = middle
+    return float(floors[low]), size
+
+
+def fair_weights(
+    objective: str,
+    num_vertices: int,
+    pairs: np.ndarray,
+    weights: np.ndarray,
+    scores: np.ndarray,
+    floor: float = SCORE_FLOOR,
+) -> Tuple[np.ndarray, float]:
+    """
+    The weights of the possible matches (idx1, idx2) re-weighted for the objective, where
+    scores are their compatibility, and the floor. The floor of "bottleneck" is found here
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}, choose one of {OBJECTIVES}")
+    weights = np.array(weights, dtype=np.float64)
+    if objective == "total":
+        return weights, 0.0
+
+    positive = (pairs[:, 0] != pairs[:, 1]) & (weights > 0)
+    if objective == "bottleneck":
+        floor, _ = bottleneck_floor(num_vertices, pairs[positive], scores[positive])
+    above = positive & (scores >= floor)
+
+    # More than the weight of any matching: half the sum of the best pair of every person
+    best = np.zeros(num_vertices)
+    for column in pairs[positive].T:
+        np.maximum.at(best, column, weights[positive])
+    bonus = 1.0 + best.sum() / 2
+
+    # Never matched, as leaving both people unmatched is better
+    weights[positive & ~above] = -1.0
+    weights[above] += bonus
+    return weights, float(floor)
@@ -0,0 +1,346 @@
+"""
+Formation of group dates, such as double dates, amongst the people who chose them
+
+A group of group_size people is valid if everyone in it can meet on the same day, and it can be
+split into couples that satisfy the hard constraints, so group_size must be even. The score of
+a group is the sum of the compatibility of every two people in it, and the formation maximises
+the total score of the groups
+
+Exact set partitioning is intractable at scale, so the groups are formed with a heuristic:
+
+    1. Seeded clustering: spread out seed couples are picked at random (like k-means++), and
+       each group is grown from its seed with the couples most compatible with the group so
+       far, so every group starts valid
+    2. Local search: people are swapped between groups (or with the people left over) while
+       this improves the total score and keeps the groups valid. The change of every possible
+       swap is evaluated at once from the score matrix, and the best few of each person tried
+
+The total is reported with an upper bound, where everyone is in a group with the people they
+are most compatible with, so the quality of the heuristic is known for each run
+"""
+
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from date_matching.matching.masks import day_preference_mask, pairable_mask
+from date_matching.participants import ParticipantTable
+
+# Improvements smaller than this are rounding errors
+TOLERANCE = 1e-9
+# Number of swaps checked for each person in each pass of the local search
+SWAP_CANDIDATES = 4
+# Number of partners each person is considered in a couple with, when growing the groups
+COUPLE_CANDIDATES = 10
+# Entries of the (people x people) matrices of the heuristic computed at once, such as the change
+# of every swap, so that only a block of rows of each is held at a time
+BLOCK_SIZE = 2**22
+
+
+def _blocks(n: int):
+    """Slices of rows of a (n x n) matrix, of about BLOCK_SIZE entries each"""
+    height = max(1, BLOCK_SIZE // max(1, n))
+    for start in range(0, n, height):
+        yield slice(start, min(n, start + height))
+
+
+class GroupFormation:
+    """
+    The groups formed, as indices of the people in the full problem
+    couples are the couples each group splits into, unassigned the people left without a group
+    """
+
+    def __init__(
+        self,
+        groups: List[List[int]],
+        couples: List[List[Tuple[int, int]]],
+        scores: List[float],
+        unassigned: List[int],
+        upper_bound: float,
+    ) -> None:
+        self.groups = groups
+        self.couples = couples
+        self.scores = scores
+        self.unassigned = unassigned
+        self.upper_bound = upper_bound
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    @property
+    def total(self) -> float:
+        return float(sum(self.scores))
+
+    @property
+    def quality(self) -> float:
+        """The total as a fraction of the upper bound, the optimum is at least this close"""
+        return self.total / self.upper_bound if self.upper_bound > 0 else 1.0
+
+
+class _GroupSearch:
+    """State of the heuristic, with every index relative to the people being grouped"""
+
+    def __init__(
+        self,
+        table: ParticipantTable,
+        members: np.ndarray,
+        scores: np.ndarray,
+        size: int,
+    ) -> None:
+        self.size = size
+        pairs = members[:, None], members[None, :]
+        self.scores = np.asarray(scores[np.ix_(members, members)], dtype=np.float64)
+        np.fill_diagonal(self.scores, 0.0)
+        self.same_day = day_preference_mask(table, *pairs)
+        np.fill_diagonal(self.same_day, True)
+        self.couple = pairable_mask(table, *pairs)
+        np.fill_diagonal(self.couple, False)
+
+    def couples(self, group: List[int]) -> Optional[List[Tuple[int, int]]]:
+        """
+        The most compatible split of the group into couples, None if the group isn't valid
+        Groups are small, so every split is tried
+        """
+        if not self.same_day[group][:, group].all():
+            return None
+
+        best, best_score = None, -np.inf
+
+        def split(remaining: List[int], couples: List[Tuple[int, int]], score: float):
+            nonlocal best, best_score
+            if not remaining:
+                if score > best_score:
+                    best, best_score = list(couples), score
+                return
+            first, rest = remaining[0], remaining[1:]
+            for partner in rest:
+                if self.couple[first, partner]:
+                    couples.append((first, partner))
+                    others = [idx for idx in rest if idx != partner]
+                    split(others, couples, score + self.scores[first, partner])
+                    couples.pop()
+
+        split(sorted(group), [], 0.0)
+        return best
+
+    def group_score(self, group: List[int]) -> float:
+        return float(self.scores[np.ix_(group, group)].sum() / 2)
+
+    def candidate_couples(self, free: np.ndarray) -> np.ndarray:
+        """The couples each free person could form with their most compatible free partners"""
+        n = len(self.scores)
+        partners = min(COUPLE_CANDIDATES, n - 1)
+        couples = [np.empty((0, 2), dtype=np.int64)]
+        for rows in _blocks(n):
+            scores = np.where(
+                self.couple[rows] & free[rows, None] & free[None, :],
+                self.scores[rows],
+                -np.inf,
+            )
+            best = np.argpartition(-scores, partners - 1, axis=1)[:, :partners]
+            keep = np.take_along_axis(scores, best, axis=1).ravel() > -np.inf
+            people = np.repeat(np.arange(rows.start, rows.stop), partners)
+            couples.append(np.stack([people[keep], best.ravel()[keep]], axis=1))
+        return np.unique(np.sort(np.concatenate(couples), axis=1), axis=0)
+
+    def seed(
+        self, num_groups: int, rng: np.random.Generator, free: np.ndarray
+    ) -> List[List[int]]:
+        """
+        Grow up to num_groups groups amongst the free people, couple by couple, so that every
+        group starts valid. Each group is grown from a seed couple, with the couples most
+        compatible with it that can meet on the same day as everyone in the group
+        """
+        couples = self.candidate_couples(free)
+        if not len(couples):
+            return []
+        first, second = couples[:, 0], couples[:, 1]
+        weight = self.scores[first, second]
+        free = free.copy()
+
+        # Groups are grown one at a time, each from a spread out seed couple, picked at random
+        # with a probability growing with the distance to the closest group so far, like k-means++
+        groups = []
+        closest = np.zeros(len(free))
+        failed = np.zeros(len(couples), dtype=bool)
+        while len(groups) < num_groups:
+            available = free[first] & free[second] & ~failed
+            if not available.any():
+                break
+            distance = np.clip(1.0 - (closest[first] + closest[second]) / 2, 0.0, None)
+            distance = np.where(available, distance**2, 0.0)
+            if groups and distance.sum() > 0:
+                seed = int(rng.choice(len(couples), p=distance / distance.sum()))
+            else:
+                seed = int(rng.choice(np.flatnonzero(available)))
+
+            group = couples[seed].tolist()
+            remaining = free.copy()
+            remaining[group] = False
+            affinity = self.scores[:, group].sum(axis=1)
+            same_day = self.same_day[:, group].all(axis=1)
+            while len(group) < self.size:
+                available = (
+                    remaining[first]
+                    & remaining[second]
+                    & same_day[first]
+                    & same_day[second]
+                )
+                if not available.any():
+                    break
+                gain = affinity[first] + affinity[second] + weight
+                couple = couples[np.argmax(np.where(available, gain, -np.inf))]
+                group.extend(couple.tolist())
+                remaining[couple] = False
+                affinity += self.scores[:, couple].sum(axis=1)
+                same_day &= self.same_day[:, couple].all(axis=1)
+
+            # A seed that can't be grown into a full group isn't tried again
+            if len(group) < self.size:
+                failed[seed] = True
+                continue
+            groups.append(group)
+            free = remaining
+            np.maximum(closest, self.scores[:, group].max(axis=1), out=closest)
+        return groups
+
+    def improve(self, groups: List[List[int]], max_passes: int) -> List[List[int]]:
+        """
+        Swap people between groups, and with the people left over, while it improves the total
+        Only the most promising swaps of each person are checked, and groups are kept valid
+        """
+        n, num_groups = len(self.scores), len(groups)
+        if not num_groups:
+            return groups
+
+        # group_of is the group of each person, num_groups for the people left over
+        group_of = np.full(n, num_groups)
+        for g, group in enumerate(groups):
+            group_of[group] = g
+        # affinity[i, g] is the sum of the scores of person i with the people of group g
+        affinity = np.zeros((n, num_groups + 1))
+        for g, group in enumerate(groups):
+            affinity[:, g] = self.scores[:, group].sum(axis=1)
+
+        candidates = min(SWAP_CANDIDATES, n - 1)
+        for _ in range(max_passes):
+            in_group = (group_of < num_groups).astype(np.float64)
+            own = affinity[np.arange(n), group_of]
+            a_idx, b_idx, gains = [], [], []
+            for rows in _blocks(n):
+                # Change of the total score when a and b swap groups, for the a of the block
+                # and every b: the affinity of b with the group of a, and of a with that of b
+                delta = affinity[:, group_of[rows]].T - own[rows, None]
+                delta += affinity[rows][:, group_of] - own[None, :]
+                delta -= self.scores[rows] * (in_group[rows, None] + in_group[None, :])
+                delta[group_of[rows, None] == group_of[None, :]] = -np.inf
+
+                best = np.argpartition(-delta, candidates - 1, axis=1)[:, :candidates]
+                a_idx.append(np.repeat(np.arange(rows.start, rows.stop), candidates))
+                b_idx.append(best.ravel())
+                gains.append(np.take_along_axis(delta, best, axis=1).ravel())
+            a_idx, b_idx, gains = (np.concatenate(x) for x in (a_idx, b_idx, gains))
+            keep = gains > TOLERANCE
+            a_idx, b_idx, gains = a_idx[keep], b_idx[keep], gains[keep]
+            order = np.argsort(-gains, kind="stable")
+
+            # The deltas are only valid for groups and people that haven't changed this pass
+            touched, moved = set(), set()
+            for a, b in zip(a_idx[order].tolist(), b_idx[order].tolist()):
+                ga, gb = int(group_of[a]), int(group_of[b])
+                if ga in touched or gb in touched or a in moved or b in moved:
+                    continue
+                swapped = []
+                for g, leaving, joining in ((ga, a, b), (gb, b, a)):
+                    if g < num_groups:
+                        group = [
+                            joining if idx == leaving else idx for idx in groups[g]
+                        ]
+                        if self.couples(group) is None:
+                            break
+                        swapped.append((g, group, leaving, joining))
+                else:
+                    for g, group, leaving, joining in swapped:
+                        groups[g] = group
+                        affinity[:, g] += (
+                            self.scores[:, joining] - self.scores[:, leaving]
+                        )
+                        touched.add(g)
+                    group_of[a], group_of[b] = gb, ga
+                    moved.update((a, b))
+            if not moved:
+                break
+        return groups
+
+    def upper_bound(self, num_groups: int) -> float:
+        """
+        Everyone in a group with the size - 1 people they are most compatible with, amongst
+        those they can meet on the same day, for the num_groups * size people that do best
+        """
+        if not num_groups:
+            return 0.0
+        totals = np.empty(len(self.scores))
+        for rows in _blocks(len(self.scores)):
+            # The diagonal is zero already
+            scores = np.where(self.same_day[rows], self.scores[rows], 0.0)
+            top = -np.partition(-scores, self.size - 2, axis=1)[:, : self.size - 1]
+            totals[rows] = top.sum(axis=1)
+        best = np.sort(totals)[::-1][: num_groups * self.size]
+        return float(best.sum() / 2)
+
+
+def form_groups(
+    table: ParticipantTable,
+    scores: np.ndarray,
+    members: np.ndarray,
+    group_size: int,
+    seed: int = 0,
+    max_passes: int = 100,
+) -> GroupFormation:
+    """
+    Form groups of group_size amongst the given people (indices into the table)
+    scores are the compatibility scores of everyone in the table
+    """
+    if group_size < 2 or group_size % 2:
+        raise ValueError(f"Groups are made of couples, {group_size} isn't an even size")
+    members = np.asarray(members, dtype=np.int64)
+    num_groups = len(members) // group_size
+    if not num_groups:
+        return GroupFormation([], [], [], members.tolist(), 0.0)
+
+    search = _GroupSearch(table, members, scores, group_size)
+    rng = np.random.default_rng(seed)
+    groups = []
+    free = np.ones(len(members), dtype=bool)
+    # The people left over after the local search may still form more groups
+    while len(groups) < num_groups:
+        new_groups = search.seed(num_groups - len(groups), rng, free)
+        if not new_groups:
+            break
+        groups = search.improve(groups + new_groups, max_passes)
+        free[:] = True
+        free[np.concatenate(groups)] = False
+
+    formed, couples, group_scores = [], [], []
+    grouped = set()
+    for group in groups:
+        group_couples = search.couples(group)
+        formed.append(sorted(int(members[idx]) for idx in group))
+        couples.append(
+            [(int(members[idx1]), int(members[idx2])) for idx1, idx2 in group_couples]
+        )
+        group_scores.append(search.group_score(group))
+        grouped.update(group)
+
+    unassigned = [
+        int(members[idx]) for idx in range(len(members)) if idx not in grouped
+    ]
+    formation = GroupFormation(
+        formed, couples, group_scores, unassigned, search.upper_bound(num_groups)
+    )
+    logging.info(
+        f"Formed {len(formation)} groups of {group_size}, total score {formation.total:.2f}, "
+        f"at least {formation.quality:.1%} of the optimum."
+    )
+    return formation
@@ -0,0 +1,210 @@
+"""
+History of the runs of the matching, so that people aren't matched again at a later event
+
+Each recorded run keeps its parameters, the student IDs of its participants, and its pairs with
+their compatibility and day, in a SQLite database. The pairs are indexed by their pair key, the
+two student IDs in order, and by each student ID. Published matches_<timestamp>.txt files can
+be imported too, with the pairs they list (the unmatched participants aren't in them)
+
+MatchMaker reads the past pairs of its participants once, in a single query, and then looks up
+every possible match at once in a sorted array of pair keys, so the history adds no query or
+Python lookup per pair, see past_pairs()
+"""
+
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from date_matching.matching.incremental import MATCH_LINE
+from date_matching.matching.results import Results
+
+# The timestamp in the name of a matches_<timestamp>.txt file written by main.py
+MATCHES_FILE_TIMESTAMP = re.compile(r"matches_(?P<timestamp>\d{8}_\d{6})")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    source TEXT UNIQUE,
+    parameters TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS participants (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    student_id TEXT NOT NULL,
+    PRIMARY KEY (run_id, student_id)
+);
+CREATE INDEX IF NOT EXISTS participants_student_id ON participants(student_id);
+CREATE TABLE IF NOT EXISTS pairs (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    pair_key TEXT NOT NULL,
+    student_id1 TEXT NOT NULL,
+    student_id2 TEXT NOT NULL,
+    score REAL,
+    day TEXT
+);
+CREATE INDEX IF NOT EXISTS pairs_pair_key ON pairs(pair_key);
+CREATE INDEX IF NOT EXISTS pairs_student_id1 ON pairs(student_id1);
+CREATE INDEX IF NOT EXISTS pairs_student_id2 ON pairs(student_id2);
+"""
+
+
+def pair_key(id1: str, id2: str) -> Tuple[str, str, str]:
+    """The key of a pair of student IDs, whichever way round, and the two IDs in order"""
+    id1, id2 = sorted((str(id1), str(id2)))
+    return f"{id1}|{id2}", id1, id2
+
+
+class MatchHistory:
+    """The runs recorded in the SQLite database at path, created if it doesn't exist"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "MatchHistory":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _add_run(
+        self,
+        timestamp: str,
+        source: Optional[str],
+        parameters: Dict,
+        student_ids: Sequence[str],
+        pairs: Sequence[Tuple[str, str, Optional[float], Optional[str]]],
+    ) -> int:
+        with self.connection:
+            run_id = self.connection.execute(
+                "INSERT INTO runs (timestamp, source, parameters) VALUES (?, ?, ?)",
+                (timestamp, source, json.dumps(parameters, default=str)),
+            ).lastrowid
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO participants VALUES (?, ?)",
+                ((run_id, str(student_id)) for student_id in student_ids),
+            )
+            self.connection.executemany(
+                "INSERT INTO pairs VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (run_id, *pair_key(id1, id2), score, day)
+                    for id1, id2, score, day in pairs
+                ),
+            )
+        return run_id
+
+    def record_run(
+        self, results: Results, parameters: Dict = None, source: str = None
+    ) -> int:
+        """
+        Record the participants and pairs of a run, with the parameters it was solved with
+        source names the run, e.g. the path of its results, and a source is only recorded once
+        Returns the ID of the run
+        """
+        ids = results.table.student_ids
+        pairs = [
+            (ids[idx1], ids[idx2], score, day)
+            for (idx1, idx2), score, day in zip(
+                results.pairs.tolist(), results.scores.tolist(), results.days
+            )
+        ]
+        return self._add_run(
+            datetime.now().isoformat(timespec="seconds"),
+            source,
+            {**(parameters or {}), "solver": results.solver},
+            [str(student_id) for student_id in ids],
+            pairs,
+        )
+
+    def import_matches_file(self, path: str) -> Optional[int]:
+        """
+        Record the pairs of a published matches_<timestamp>.txt file, with their compatibility
+        and day. Returns the ID of the run, or None if the file was already imported
+        """
+        source = os.path.abspath(path)
+        if self.connection.execute(
+            "SELECT 1 FROM runs WHERE source = ?", (source,)
+        ).fetchone():
+            return None
+
+        pairs, day = [], None
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("==="):
+                    # Only the pairs listed by day are read, not the groups
+                    day = None
+                    continue
+                match = MATCH_LINE.match(line)
+                if match is None and line.endswith(":"):
+                    day = line[:-1]
+                elif match is not None and day is not None:
+                    score = float(re.search(r"([\d.]+)%", line)[1]) / 100
+                    pairs.append((match["id1"], match["id2"], score, day))
+
+        name = MATCHES_FILE_TIMESTAMP.search(os.path.basename(path))
+        if name is not None:
+            timestamp = datetime.strptime(name["timestamp"], "%Y%m%d_%H%M%S")
+        else:
+            timestamp = datetime.fromtimestamp(os.path.getmtime(path))
+        student_ids = [
+            student_id for id1, id2, _, _ in pairs for student_id in (id1, id2)
+        ]
+        return self._add_run(
+            timestamp.isoformat(timespec="seconds"),
+            source,
+            {"imported_from": path},
+            student_ids,
+            pairs,
+        )
+
+    def runs(self) -> List[Dict]:
+        """Every recorded run, oldest first, with its number of participants and pairs"""
+        rows = self.connection.execute("""
+            SELECT runs.id, runs.timestamp, runs.source,
+                (SELECT COUNT(*) FROM participants WHERE run_id = runs.id),
+                (SELECT COUNT(*) FROM pairs WHERE run_id = runs.id)
+            FROM runs ORDER BY runs.timestamp, runs.id
+            """).fetchall()
+        return [
+            dict(zip(("id", "timestamp", "source", "participants", "pairs"), row))
+            for row in rows
+        ]
+
+    def past_pairs(self, student_ids: Sequence[str]) -> Set[Tuple[int, int]]:
+        """
+        The pairs (idx1 < idx2) of the given people that were matched in any recorded run,
+        where idx is the position of their student ID. Read in a single query
+        """
+        index = {str(student_id): idx for idx, student_id in enumerate(student_ids)}
+        with self.connection:
+            self.connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS current (student_id TEXT PRIMARY KEY)"
+            )
+            self.connection.execute("DELETE FROM current")
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO current VALUES (?)",
+                ((student_id,) for student_id in index),
+            )
+            rows = self.connection.execute("""
+                SELECT DISTINCT pairs.student_id1, pairs.student_id2 FROM pairs
+                JOIN current AS current1 ON pairs.student_id1 = current1.student_id
+                JOIN current AS current2 ON pairs.student_id2 = current2.student_id
+                """).fetchall()
+        past = set()
+        for id1, id2 in rows:
+            idx1, idx2 = index[id1], index[id2]
+            if idx1 != idx2:
+                past.add((min(idx1, idx2), max(idx1, idx2)))
+        return past
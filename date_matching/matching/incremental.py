@@ -0,0 +1,63 @@
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+from date_matching.matching.masks import pairable_mask
+from date_matching.participants import ParticipantTable
+
+# A pair in the "BY DAY" section of a matches_<timestamp>.txt file written by main.py
+MATCH_LINE = re.compile(r"^(?P<id1>\S+) - (?P<id2>\S+) \(Compatibility: [\d.]+%\)$")
+
+
+def load_previous_matches(path: str) -> List[Tuple[str, str]]:
+    """Read the student IDs of the pairs from a published matches file"""
+    matches = []
+    with open(path) as f:
+        for line in f:
+            match = MATCH_LINE.match(line.strip())
+            if match:
+                matches.append((match["id1"], match["id2"]))
+    return matches
+
+
+def plan_rematch(
+    table: ParticipantTable,
+    previous_matches: List[Tuple[str, str]],
+    eligible: np.ndarray = None,
+) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+    """
+    Split the participants into the previous pairs that still hold and everyone else
+    A previous pair holds if both people are still signed up, still eligible for a one-on-one
+    date, and can still be paired, whether or not the pair is amongst the possible matches
+    (e.g. outside the top k candidates of each person)
+    Everyone else (partners of drop-outs, late sign-ups and the previously unmatched)
+    is returned as the neighbourhood that needs to be re-matched
+    """
+    index = {str(student_id): idx for idx, student_id in enumerate(table.student_ids)}
+    if eligible is None:
+        eligible = np.ones(len(table), dtype=bool)
+
+    signed_up = [
+        (index[id1], index[id2])
+        for id1, id2 in previous_matches
+        if id1 in index and id2 in index
+    ]
+    pairs = np.array(signed_up, dtype=np.int64).reshape(-1, 2)
+    holds = pairable_mask(table, pairs[:, 0], pairs[:, 1])
+    holds &= (
+        eligible[pairs[:, 0]] & eligible[pairs[:, 1]] & (pairs[:, 0] != pairs[:, 1])
+    )
+
+    kept = []
+    matched = set()
+    for (idx1, idx2), pair_holds in zip(pairs.tolist(), holds.tolist()):
+        if not pair_holds or idx1 in matched or idx2 in matched:
+            continue
+        kept.append((min(idx1, idx2), max(idx1, idx2)))
+        matched.update((idx1, idx2))
+
+    affected = np.array(
+        [idx for idx in range(len(table)) if idx not in matched], dtype=np.int64
+    )
+    return kept, affected
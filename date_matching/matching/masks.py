@@ -0,0 +1,95 @@
+"""
+Vectorised versions of the constraints in Person, evaluated for many pairs at once
+
+Each function takes the ParticipantTable and optionally two arrays of indices
+If both are given, the rule is evaluated for the pairs (idx1[k], idx2[k]), with broadcasting
+Otherwise it is evaluated for every pair, giving a (participants x participants) matrix
+The per-pair methods on Person remain the reference implementation, keep both in sync
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from date_matching.enum_classes import Identity, YearPreference
+from date_matching.participants import IDENTITIES, YEAR_PREFERENCES, ParticipantTable
+
+ANY = IDENTITIES.index(Identity.ANY)
+ANY_YEAR = YEAR_PREFERENCES.index(YearPreference.ANY)
+SAME_YEAR = YEAR_PREFERENCES.index(YearPreference.SAME)
+DIFFERENT_YEAR = YEAR_PREFERENCES.index(YearPreference.DIFFERENT)
+EITHER_DAY = "Either"
+
+
+def _pairs(
+    table: ParticipantTable, idx1: Optional[np.ndarray], idx2: Optional[np.ndarray]
+) -> Tuple[np.ndarray, np.ndarray]:
+    if idx1 is None or idx2 is None:
+        everyone = np.arange(len(table))
+        return everyone[:, None], everyone[None, :]
+    return np.asarray(idx1), np.asarray(idx2)
+
+
+def gender_seeking_mask(
+    table: ParticipantTable, idx1: np.ndarray = None, idx2: np.ndarray = None
+) -> np.ndarray:
+    """True where the two people are seeking each others' gender"""
+    idx1, idx2 = _pairs(table, idx1, idx2)
+    seeking1, seeking2 = table.seeking[idx1], table.seeking[idx2]
+    wanting = (seeking1 == ANY) | (seeking1 == table.gender[idx2])
+    other_wanting = (seeking2 == ANY) | (seeking2 == table.gender[idx1])
+    return wanting & other_wanting
+
+
+def day_preference_mask(
+    table: ParticipantTable, idx1: np.ndarray = None, idx2: np.ndarray = None
+) -> np.ndarray:
+    """True where the two people can meet on the same day"""
+    idx1, idx2 = _pairs(table, idx1, idx2)
+    either = table.days.index(EITHER_DAY) if EITHER_DAY in table.days else -2
+    day1, day2 = table.day[idx1], table.day[idx2]
+    # A missing day (-1) doesn't match anything, like NaN in Person
+    return ((day1 == day2) & (day1 >= 0)) | (day1 == either) | (day2 == either)
+
+
+def year_preference_mask(
+    table: ParticipantTable, idx1: np.ndarray = None, idx2: np.ndarray = None
+) -> np.ndarray:
+    """True where both people are happy with the year of the other"""
+    idx1, idx2 = _pairs(table, idx1, idx2)
+    is_same_year = table.year[idx1] == table.year[idx2]
+
+    def wants_same_year(year_preference):
+        return (
+            (year_preference == ANY_YEAR)
+            | ((year_preference == SAME_YEAR) & is_same_year)
+            | ((year_preference == DIFFERENT_YEAR) & ~is_same_year)
+        )
+
+    wanting = wants_same_year(table.year_preference[idx1])
+    other_wanting = wants_same_year(table.year_preference[idx2])
+    return wanting & other_wanting
+
+
+def pairable_mask(
+    table: ParticipantTable, idx1: np.ndarray = None, idx2: np.ndarray = None
+) -> np.ndarray:
+    """Vectorised Person.is_pairable(), the hard constraints"""
+    pairs = _pairs(table, idx1, idx2)
+    mask = gender_seeking_mask(table, *pairs) & day_preference_mask(table, *pairs)
+    return mask | (pairs[0] == pairs[1])
+
+
+def preferred_mask(
+    table: ParticipantTable, idx1: np.ndarray = None, idx2: np.ndarray = None
+) -> np.ndarray:
+    """Vectorised Person.is_pairing_preferred(), the soft constraints"""
+    pairs = _pairs(table, idx1, idx2)
+    return year_preference_mask(table, *pairs) | (pairs[0] == pairs[1])
+
+
+def penalty_matrix(
+    table: ParticipantTable, idx1: np.ndarray = None, idx2: np.ndarray = None
+) -> np.ndarray:
+    """1 where a soft constraint is violated, to be scaled by the PENALTY_MULTIPLIER"""
+    return (~preferred_mask(table, idx1, idx2)).astype(np.float64)
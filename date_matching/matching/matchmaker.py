@@ -1,131 +1,691 @@
 import logging
+import time
 from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Tuple, Union
 
 import numpy as np
-import pandas as pd
-from pulp import *
 
-from date_matching.config import LOG_LP_FILE_PATH, PENALTY_MULTIPLIER, PROBLEM_NAME
+from date_matching.config import (
+    CANDIDATE_CHECK_LIMIT,
+    CANDIDATE_TOP_K,
+    CANDIDATE_WIDENINGS,
+    EXPORT_MODEL,
+    GROUP_DATES,
+    GROUP_SEED,
+    GROUP_SIZE,
+    HISTORY_PATH,
+    MAX_WORKERS,
+    MODEL_EXPORT_PATH,
+    OBJECTIVE,
+    PAST_PAIR_PENALTY,
+    PAST_PAIRS,
+    PENALTY_MULTIPLIER,
+    QUIET,
+    SCORE_CACHE_DIR,
+    SCORE_THRESHOLD,
+    SOLVE_COMPONENTS_IN_PARALLEL,
+    SOLVER_BACKEND,
+    TILED_SCORING,
+    USE_SCORE_CACHE,
+    VENUE_CAPACITY,
+)
+from date_matching.enum_classes import DateFormat
+from date_matching.matching.backends import (
+    ILPBackend,
+    LocalSearchBackend,
+    get_backend,
+)
+from date_matching.matching.candidates import CandidateGraph, optimal_objective
+from date_matching.matching.compatibility import CompatibilityMatrix, PairScores
+from date_matching.matching.components import (
+    Component,
+    find_components,
+    solve_component,
+    solve_components,
+)
+from date_matching.matching.fairness import fair_weights
+from date_matching.matching.groups import form_groups
+from date_matching.matching.history import MatchHistory
+from date_matching.matching.incremental import plan_rematch
+from date_matching.matching.masks import EITHER_DAY, pairable_mask, penalty_matrix
 from date_matching.matching.matchtracker import MatchTracker
+from date_matching.matching.results import Results
+from date_matching.matching.scheduling import schedule_matches
+from date_matching.matching.score_cache import ScoreCache
 from date_matching.matching.utils import print_terminal_line
-from date_matching.person import Person
+from date_matching.participants import DATE_FORMATS, ParticipantTable
+from date_matching.profiling import profiled, profiler
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class MatchMaker:
-    def __init__(self, rows) -> None:
-        self.persons = []
+    @profiled("matchmaker")
+    def __init__(
+        self,
+        rows,
+        build_model: bool = True,
+        solver_backend: str = SOLVER_BACKEND,
+        use_score_cache: bool = USE_SCORE_CACHE,
+        quiet: bool = QUIET,
+        venue_capacity: Dict[str, Dict[str, int]] = VENUE_CAPACITY,
+        group_dates: bool = GROUP_DATES,
+        top_k: int = CANDIDATE_TOP_K,
+        solver_options: Dict = None,
+        tiled_scoring: bool = TILED_SCORING,
+        score_threshold: float = SCORE_THRESHOLD,
+        objective: str = OBJECTIVE,
+        past_pairs: str = PAST_PAIRS,
+        history_path: str = HISTORY_PATH,
+    ) -> None:
+        """
+        rows are the transformed responses, as a DataFrame or an already loaded ParticipantTable
+        If quiet, the participants and the pairs are counted rather than listed
+        If venue_capacity is given, each match is scheduled to a day and time slot once solved
+        If group_dates, the people who chose a group date are formed into groups instead of pairs
+        If top_k is given, each person only keeps their top_k most compatible partners as
+        possible matches, see matching/candidates.py
+        solver_options are passed to the solver backend, overriding config, e.g.
+        {"solver": "HiGHS", "time_limit": 30, "gap": 0.001, "threads": 4} for the ILP
+        If tiled_scoring, the scores of every pair are never held at once: the possible matches
+        are found a tile of pairs at a time, see matching/tiles.py, and the score cache is unused
+        Only the partners whose weight is above score_threshold are kept then, so tiled_scoring
+        needs a top_k or a positive score_threshold not to keep every pair
+        objective is "total", "bottleneck" or "floor", see matching/fairness.py
+        past_pairs is "exclude" or "penalise" to leave out or penalise the pairs matched in the
+        runs recorded at history_path, see matching/history.py, or None to ignore them
+        """
+        self.solver_backend = solver_backend
+        self.solver_options = solver_options or {}
+        self.status = None
+        self.solver_stats = {}
+        self.results = None
+        self.use_score_cache = use_score_cache
+        self.quiet = quiet
+        self.venue_capacity = venue_capacity
+        self.schedule = None
+        self.group_dates = group_dates
+        self.groups = None
+        self.top_k = top_k
+        self.candidates = None
+        self.tiled_scoring = tiled_scoring
+        self.score_threshold = score_threshold
+        self.objective = objective
+        self.floor = None
+        self.past_pairs_rule = past_pairs
+        self.history_path = history_path
+        # Pairs that must be possible matches, e.g. the previous pairs kept by a re-match
+        self.required_pairs = []
         self._initialise_participants(rows)
+        self._load_past_pairs()
+        self._compute_compatibility()
         self._create_match_variables()
-        self._initialse_problem()
+        self._initialse_problem(build_model)
 
-    def _initialise_participants(self, rows: pd.DataFrame):
+    @profiled("participants")
+    def _initialise_participants(self, rows: Union["pd.DataFrame", ParticipantTable]):
         print_terminal_line("Registered participants")
-        for index, row in rows.iterrows():
-            person = Person.build(row)
-            self.persons.append(person)
-            print(index, person)
+        if isinstance(rows, ParticipantTable):
+            self.participants = rows
+            index = range(len(rows))
+        else:
+            self.participants = ParticipantTable.from_frame(rows)
+            index = rows.index
+        self.persons = self.participants.persons()
+        if not self.quiet:
+            for index, person in zip(index, self.persons):
+                print(index, person)
 
         print_terminal_line("Solution information")
         logging.info(f"Registered {len(self.persons)} persons for matching.")
+        self.group_members = np.empty(0, dtype=np.int64)
+        if self.group_dates:
+            self.group_members = np.flatnonzero(
+                self.participants.date_format == DATE_FORMATS.index(DateFormat.GROUP)
+            )
+        profiler.record(
+            participants=len(self.persons),
+            questions=len(self.participants.questions),
+            group_members=len(self.group_members),
+        )
+
+    @profiled("history")
+    def _load_past_pairs(self):
+        """The pairs of participants matched in a recorded run, read once as a set"""
+        self.past_pairs = set()
+        # Key (idx1 * participants + idx2) of each past pair, sorted, see _matched_before()
+        self.past_pair_keys = np.empty(0, dtype=np.int64)
+        if self.past_pairs_rule is None:
+            return
+        if self.past_pairs_rule not in ("exclude", "penalise"):
+            raise ValueError(
+                f"Unknown past_pairs {self.past_pairs_rule!r}, "
+                'choose "exclude", "penalise" or None'
+            )
+        with MatchHistory(self.history_path) as history:
+            self.past_pairs = history.past_pairs(self.participants.student_ids)
+        self.past_pair_keys = np.sort(
+            self._pair_keys(np.array(list(self.past_pairs), dtype=np.int64))
+        )
+        logging.info(
+            f"{len(self.past_pairs)} pairs of participants were matched before, "
+            f"{'left out' if self.past_pairs_rule == 'exclude' else 'penalised'}."
+        )
+        profiler.record(past_pairs=len(self.past_pairs))
+
+    @profiled("compatibility")
+    def _compute_compatibility(self):
+        self.pairable = None
+        if self.tiled_scoring and self.top_k is None and self.score_threshold <= 0:
+            raise ValueError(
+                "Tiled scoring would keep every pairable pair, "
+                "set a top_k or a positive score_threshold"
+            )
+        if self.tiled_scoring:
+            self.compatibility = CompatibilityMatrix.from_scores(
+                PairScores(self.participants.answers)
+            )
+        elif self.use_score_cache:
+            scores, self.pairable = ScoreCache(SCORE_CACHE_DIR).lookup(
+                self.participants
+            )
+            self.compatibility = CompatibilityMatrix.from_scores(scores)
+        else:
+            self.compatibility = CompatibilityMatrix(self.participants.answers)
+        profiler.record(
+            score_cache=self.use_score_cache and not self.tiled_scoring,
+            tiled_scoring=self.tiled_scoring,
+        )
 
+    @profiled("match_variables")
     def _create_match_variables(self):
-        self.match_tracker = MatchTracker(self.persons)
+        one_on_one = self._one_on_one()
 
-    def _initialse_problem(self):
+        if self.top_k is not None or self.tiled_scoring:
+            if self.candidates is None:
+                self.candidates = CandidateGraph(
+                    self.participants,
+                    self.top_k,
+                    eligible=one_on_one,
+                    threshold=self.score_threshold,
+                )
+            pairs = self.candidates.pairs()
+        else:
+            pairs = self._pairable_pairs(one_on_one)
+        exclude = self.past_pairs and self.past_pairs_rule == "exclude"
+        if pairs is None and (exclude or self.required_pairs):
+            # Otherwise left to MatchTracker, the pairs are needed to filter or extend them
+            self.pairable = pairable_mask(self.participants)
+            pairs = self._pairable_pairs(one_on_one)
+        if exclude:
+            pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+            pairs = [
+                tuple(pair) for pair in pairs[~self._matched_before(pairs)].tolist()
+            ]
+        if self.required_pairs:
+            pairs = sorted(set(map(tuple, pairs)) | set(self.required_pairs))
+        self.match_tracker = MatchTracker(self.persons, pairs)
+        profiler.record(possible_matches=len(self.match_tracker.possible_matches))
+
+    def _one_on_one(self) -> np.ndarray:
+        """Who can be paired, people on a group date are grouped separately"""
+        one_on_one = np.ones(len(self.persons), dtype=bool)
+        one_on_one[self.group_members] = False
+        return one_on_one
+
+    def _pair_keys(self, pairs: np.ndarray) -> np.ndarray:
+        """A key for each pair (idx1, idx2), whichever way round"""
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        return pairs.min(axis=1) * len(self.persons) + pairs.max(axis=1)
+
+    def _matched_before(self, pairs: np.ndarray) -> np.ndarray:
+        """Whether each pair was matched in a recorded run, looked up all at once"""
+        return np.isin(self._pair_keys(pairs), self.past_pair_keys)
+
+    def _pairable_pairs(self, one_on_one: np.ndarray) -> List[Tuple[int, int]]:
+        """Every pairable pair of people on a one-on-one date, None if left to MatchTracker"""
+        if len(self.group_members) and self.pairable is None:
+            self.pairable = pairable_mask(self.participants)
+        if self.pairable is None:
+            return None
+        pairable = np.triu(self.pairable, 1) & one_on_one[:, None] & one_on_one
+        return [tuple(pair) for pair in np.argwhere(pairable).tolist()]
+
+    def _compute_match_weights(self):
         """
-        Initialise the problem and add the objective function
-        Then add each of the constraints to represent the problem
+        Weight of each possible match in the objective function
+        Reward the compatibility score, while penalising for any soft constraints that are violated
         """
-        self.prob = LpProblem(f"{PROBLEM_NAME}_problem".title(), LpMaximize)
+        self.match_weights = self._weights(self.match_tracker.possible_matches)
+        if self.objective != "total":
+            self._reweight_fairly()
 
-        # Scoring function, maximise the sum of the scores while penalising for any soft constraints that are violated
-        score_vars = []
-        for variable, person1, person2 in self.match_tracker.get_variables_to_people():
-            reward = person1.compatibility_score(person2)
-            penalty = 1 - person1.is_pairing_preferred(person2)  # positive penalty
-            score = reward - (PENALTY_MULTIPLIER * penalty)
-            score_vars.append(variable * score)
-        self.prob += lpSum(score_vars)
+    @profiled("fairness")
+    def _reweight_fairly(self):
+        """Put the pairs at or above the floor first, for the fairness objectives"""
+        pairs = np.array(self.match_tracker.possible_matches, dtype=np.int64)
+        scores = np.asarray(
+            self.compatibility.scores[pairs[:, 0], pairs[:, 1]], dtype=np.float64
+        )
+        self.match_weights, self.floor = fair_weights(
+            self.objective, len(self.persons), pairs, self.match_weights, scores
+        )
+        logging.info(f"Objective: {self.objective}, floor {self.floor:.4f}")
+        profiler.record(objective=self.objective, floor=self.floor)
 
-        # Ensure that each person is matched with one other person
-        for idx, _ in enumerate(self.persons):
-            variables_for_person = self.match_tracker.get_variables_for_person(idx)
-            self.prob += lpSum(variables_for_person) == 1
+    def _weights(self, pairs: List[Tuple[int, int]]) -> np.ndarray:
+        pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+        idx1, idx2 = pairs[:, 0], pairs[:, 1]
+        reward = self.compatibility.scores[idx1, idx2]
+        penalty = penalty_matrix(self.participants, idx1, idx2)  # positive penalty
+        weights = reward - (PENALTY_MULTIPLIER * penalty)
+        if self.past_pairs and self.past_pairs_rule == "penalise":
+            weights = weights - PAST_PAIR_PENALTY * self._matched_before(pairs)
+        return weights
 
-        # Add constraint that each pair in x is pairable
-        for variable, person1, person2 in self.match_tracker.get_variables_to_people():
-            self.prob += variable <= person1.is_pairable(person2)
+    @profiled("problem")
+    def _initialse_problem(self, build_model: bool = True):
+        """
+        Pick the solver backend, and build the ILP model if the backend solves one
+        If the problem splits into independent components, each is modelled when it is solved
+        If build_model is False, the model is only built if solve() needs it
+        """
+        self._compute_match_weights()
+        self.backend = get_backend(self.solver_backend, **self.solver_options)
+        self.prob = None
 
-        # Log the problem to a file, inspect the file to see the linear function being optimised
-        self.prob.writeLP(LOG_LP_FILE_PATH)
+        self.components = []
+        if SOLVE_COMPONENTS_IN_PARALLEL:
+            self.components = find_components(self.match_tracker)
+            logging.info(f"Split the problem into {len(self.components)} components.")
+        profiler.record(backend=self.solver_backend, components=len(self.components))
 
+        if build_model and self._needs_model():
+            self._build_model()
+
+    def _needs_model(self) -> bool:
+        return isinstance(self.backend, ILPBackend) and not self._solve_by_component()
+
+    @profiled("build_model")
+    def _build_model(self):
+        self.prob = self.backend.build_problem(self.match_tracker, self.match_weights)
+        profiler.record(
+            variables=self.prob.numVariables(), constraints=self.prob.numConstraints()
+        )
+
+        # Optionally log the problem to a file, inspect the file to see the linear function being optimised
+        if EXPORT_MODEL:
+            from date_matching.matching.model_export import export_model
+
+            export_model(self.prob, MODEL_EXPORT_PATH)
+
+    def _solve_by_component(self) -> bool:
+        return len(self.components) > 1
+
+    @profiled("solve")
     def solve(self):
         """Solve the problem and log some critical information"""
-        self.prob.solve(solver=PULP_CBC_CMD(msg=False))
+        start = time.perf_counter()
+        matches, status = self._solve_matches()
+        if self.candidates is not None:
+            matches, status = self._widen_candidates(matches, status)
+            # Without a top k or a positive threshold, only pairs that can't improve the
+            # objective are left out, so nothing is lost
+            prunes = self.candidates.k is not None or self.candidates.threshold > 0
+            if prunes and len(self.persons) <= CANDIDATE_CHECK_LIMIT:
+                self._report_pruning_loss()
+        self.solver_stats["runtime_s"] = time.perf_counter() - start
+        self._finish_solve(matches, status)
+
+    def _widen_candidates(
+        self, matches: List[Tuple[int, int]], status: str
+    ) -> Tuple[List[Tuple[int, int]], str]:
+        """
+        Give the people left unmatched more candidate partners, and solve again, while
+        they have partners they haven't been given yet
+        """
+        for _ in range(CANDIDATE_WIDENINGS):
+            matched = np.zeros(len(self.persons), dtype=bool)
+            matched[[idx for match in matches for idx in match]] = True
+            unmatched = np.flatnonzero(self.candidates.eligible & ~matched)
+            if not len(self.candidates.widen(unmatched)):
+                break
+            self._create_match_variables()
+            self._initialse_problem(build_model=False)
+            matches, status = self._solve_matches()
+        profiler.record(
+            candidate_pairs=len(self.match_tracker.possible_matches) - len(self.persons)
+        )
+        return matches, status
 
-        logging.info(f"Status: {LpStatus[self.prob.status]}")
+    @profiled("pruning_loss")
+    def _report_pruning_loss(self):
+        """Compare the optimum over the candidate pairs with the optimum over every pair"""
+        if self.pairable is None:
+            self.pairable = pairable_mask(self.participants)
+        pairs = self._pairable_pairs(self._one_on_one())
+        exact, _ = optimal_objective(pairs, self._weights(pairs))
+        pruned, _ = optimal_objective(
+            self.match_tracker.possible_matches,
+            self._weights(self.match_tracker.possible_matches),
+        )
+
+        lost = exact - pruned
+        kept = (len(self.match_tracker.possible_matches) - len(self.persons)) / max(
+            len(pairs), 1
+        )
         logging.info(
-            f"Mean Score per person: {2*value(self.prob.objective) / len(self.persons)}"
+            f"Candidate pruning kept {kept:.1%} of the {len(pairs)} pairable pairs, "
+            f"and lost {lost:.4f} of the optimal objective {exact:.4f} "
+            f"({lost / exact if exact > 0 else 0.0:.2%})."
+        )
+        profiler.record(
+            pairable_pairs=len(pairs),
+            exact_objective=exact,
+            pruned_objective=pruned,
+            objective_lost=lost,
         )
 
-        scores = []
-        num_matches = 0
+    @profiled("preview")
+    def preview(self) -> Dict:
+        """
+        Quick estimate of the matching, e.g. while sign-ups are still open, using the local search
+        backend whatever the configured one. The matches are recorded in the MatchTracker
+        Returns the people matched, the pairs on each day and the objective, along with an upper
+        bound of the optimal objective, so the preview is known to be within quality of it
+        """
+        backend = LocalSearchBackend()
+        matches = backend.solve(self.match_tracker, self.match_weights)
+        self.match_tracker.record_solution(matches)
 
-        for person1, person2 in self.match_tracker.get_matches():
-            scores.append(person1.compatibility_score(person2))
-            if person1 != person2:
-                num_matches += 2
+        days = defaultdict(int)
+        for idx1, idx2 in matches:
+            day1, day2 = self.persons[idx1].day_choice, self.persons[idx2].day_choice
+            days[day1 if day1 != EITHER_DAY else day2] += 1
+        summary = {
+            "participants": len(self.persons),
+            "matched": 2 * len(matches),
+            "days": dict(days),
+            "objective": backend.stats["objective"],
+            "upper_bound": backend.stats["upper_bound"],
+            "quality": backend.stats["quality"],
+        }
 
-        logging.info(f"Scores: {np.round(scores, 2)}")
-        logging.info(f"Number of people matched: {num_matches}/{len(self.persons)}")
+        logging.info(
+            f"Preview: {summary['matched']}/{summary['participants']} people matched, "
+            + ", ".join(f"{pairs} pairs on {day}" for day, pairs in days.items())
+        )
+        logging.info(
+            f"Preview objective {summary['objective']:.4f}, at least "
+            f"{summary['quality']:.1%} of the optimum (at most {summary['upper_bound']:.4f})"
+        )
+        profiler.record(backend=backend.name, **backend.stats)
+        return summary
+
+    @profiled("solve_incremental")
+    def solve_incremental(
+        self, previous_matches: List[Tuple[str, str]], fix_existing: bool = True
+    ):
+        """
+        Re-match after people dropped out or signed up late, starting from a previous matching
+        previous_matches are pairs of student IDs, see incremental.load_previous_matches()
+
+        If fix_existing, previous pairs that still hold are kept as they are, and only the
+        people left without a partner are re-matched amongst themselves
+        Otherwise, everyone is re-matched, with the ILP warm-started from the previous pairs
+        """
+        start = time.perf_counter()
+        kept, affected = plan_rematch(
+            self.participants, previous_matches, eligible=self._one_on_one()
+        )
+        logging.info(
+            f"Keeping {len(kept)} previous pairs, re-matching {len(affected)} persons."
+        )
+        # Pairs that still hold may not be possible matches, e.g. outside the top k candidates
+        # or matched in a recorded run, so they are added before solving
+        missing = [pair for pair in kept if not self._is_possible_match(*pair)]
+        if missing:
+            self.required_pairs = kept
+            self._create_match_variables()
+            self._initialse_problem(build_model=False)
+
+        if fix_existing:
+            neighbourhood = Component.from_members(self.match_tracker, affected)
+            persons, pairs, weights = neighbourhood.subproblem(
+                self.match_tracker, self.match_weights
+            )
+            matches, status, self.solver_stats = solve_component(
+                self.backend.name, persons, pairs, weights, self.solver_options
+            )
+            matches = kept + neighbourhood.to_global(matches)
+            profiler.record(
+                backend=self.backend.name, status=status, **self.solver_stats
+            )
+        elif isinstance(self.backend, ILPBackend):
+            if self.prob is None:
+                self._build_model()
+            matches = self.backend.solve(
+                self.match_tracker, self.match_weights, self.prob, initial_matches=kept
+            )
+            status, self.solver_stats = self.backend.status, dict(self.backend.stats)
+            profiler.record(
+                backend=self.backend.name, status=status, **self.solver_stats
+            )
+        else:
+            matches, status = self._solve_matches()
+
+        self.solver_stats["runtime_s"] = time.perf_counter() - start
+        self._finish_solve(matches, status)
+
+    def _is_possible_match(self, idx1: int, idx2: int) -> bool:
+        try:
+            self.match_tracker.get_match_id(idx1, idx2)
+        except KeyError:
+            return False
+        return True
+
+    def _solve_matches(self) -> Tuple[List[Tuple[int, int]], str]:
+        if self._solve_by_component():
+            matches, statuses, stats = solve_components(
+                self.match_tracker,
+                self.match_weights,
+                self.backend.name,
+                self.components,
+                max_workers=MAX_WORKERS,
+                backend_options=self.solver_options,
+            )
+            status = ", ".join(sorted(set(statuses)))
+            stats = dict(components=len(self.components), **stats)
+        elif isinstance(self.backend, ILPBackend):
+            if self.prob is None:
+                self._build_model()
+            matches = self.backend.solve(
+                self.match_tracker, self.match_weights, prob=self.prob
+            )
+            status, stats = self.backend.status, self.backend.stats
+        else:
+            matches = self.backend.solve(self.match_tracker, self.match_weights)
+            status, stats = self.backend.status, self.backend.stats
+        profiler.record(backend=self.backend.name, status=status, **stats)
+        self.solver_stats = dict(stats)
+        return matches, status
+
+    def _finish_solve(self, matches: List[Tuple[int, int]], status: str):
+        """Record the matches and log some critical information"""
+        self.match_tracker.record_solution(matches)
+        if len(self.group_members):
+            self._form_groups()
+
+        self.status = status
+        logging.info(f"Solved with the {self.backend.description} backend")
+        logging.info(f"Status: {status}")
+        if "gap" in self.solver_stats:
+            logging.info(f"Gap: {self.solver_stats['gap']:.4%}")
+        logging.info(f"Runtime: {self.solver_stats['runtime_s']:.2f}s")
+
+        if self.venue_capacity is not None:
+            self._schedule_matches()
+
+        # Everything logged and written about the matches is computed once, here
+        solution = self.match_tracker.get_true_possible_matches()
+        self.results = Results.from_solution(
+            self.participants,
+            solution,
+            self.compatibility.scores,
+            schedule=self.schedule,
+            groups=self.groups,
+            group_members=self.group_members,
+            solver={
+                "backend": self.backend.description,
+                "status": status,
+                **self.solver_stats,
+                **self._fairness_stats(),
+                **self._history_stats(),
+            },
+        )
+        objective = self.results.objective
+        logging.info(f"Mean Score per person: {2*objective / len(self.persons)}")
+
+        if not self.quiet:
+            # Unmatched people score 0
+            scores = np.zeros(len(solution))
+            scores[: len(self.results)] = self.results.scores
+            logging.info(f"Scores: {np.round(scores, 2)}")
+        logging.info(
+            f"Number of people matched: {self.results.matched}/{len(self.persons)}"
+        )
+        profiler.record(objective=objective, matched=self.results.matched)
+        if self.floor is not None:
+            stats = self.results.solver
+            logging.info(
+                f"Lowest compatibility of a pair: {stats['lowest_score']:.4f}, "
+                f"{stats['pairs_at_floor']}/{len(self.results)} pairs at or above "
+                f"the floor {self.floor:.4f}"
+            )
 
         print_terminal_line("Logging")
         self.log_matches()
         print_terminal_line()
 
+    def _fairness_stats(self) -> Dict:
+        """The floor of the fairness objective, and how the matches compare to it"""
+        if self.floor is None:
+            return {}
+        matches = np.array(
+            self.match_tracker.get_true_possible_matches(), dtype=np.int64
+        ).reshape(-1, 2)
+        matches = matches[matches[:, 0] != matches[:, 1]]
+        scores = self.compatibility.scores[matches[:, 0], matches[:, 1]]
+        return {
+            "fairness": self.objective,
+            "floor": self.floor,
+            "lowest_score": float(scores.min()) if len(scores) else 0.0,
+            "pairs_at_floor": int(np.count_nonzero(scores >= self.floor)),
+        }
+
+    def _history_stats(self) -> Dict:
+        """How many of the matches were matched before, see _load_past_pairs()"""
+        if self.past_pairs_rule is None:
+            return {}
+        matches = self.match_tracker.get_true_possible_matches()
+        return {
+            "past_pairs": self.past_pairs_rule,
+            "repeated_pairs": int(self._matched_before(matches).sum()),
+        }
+
+    @profiled("groups")
+    def _form_groups(self):
+        """Form the people who chose a group date into groups"""
+        self.groups = form_groups(
+            self.participants,
+            self.compatibility.scores,
+            self.group_members,
+            GROUP_SIZE,
+            seed=GROUP_SEED,
+        )
+        profiler.record(
+            groups=len(self.groups),
+            ungrouped=len(self.groups.unassigned),
+            score=self.groups.total,
+            upper_bound=self.groups.upper_bound,
+        )
+
+    def _schedule_matches(self):
+        """Assign each match to a day and time slot of the venue"""
+        matches = [
+            (idx1, idx2)
+            for idx1, idx2 in self.match_tracker.get_true_possible_matches()
+            if idx1 != idx2
+        ]
+        weights = self._weights(matches)
+        self.schedule = schedule_matches(
+            self.participants, matches, weights, self.venue_capacity
+        )
+
+        for (day, time), load in self.schedule.load().items():
+            capacity = self.schedule.capacity[day, time]
+            logging.info(f"{day}, {time}: {load}/{capacity} pairs")
+        if self.schedule.unscheduled:
+            logging.warning(
+                f"{len(self.schedule.unscheduled)} pairs don't fit the venue capacity."
+            )
+        profiler.record(
+            scheduled=len(self.schedule.slots),
+            unscheduled=len(self.schedule.unscheduled),
+        )
+
     def log_matches(self):
         """
         Perform any additional logging of the matches
         Use this section to retrieve the matches and write to console or a file
-        All necessary information is stored in the MatchTracker object
+        All necessary information is stored in self.results, see matching/results.py
         Two examples are provided below
         """
         self.log_scheduling_info()
         self.log_gender_pairing_stats()
 
     def log_scheduling_info(self):
-        def get_day_or_either(day1: str, day2: str):
-            return day1 if day1 != "Either" else day2
-
-        day_dict = defaultdict(list)
-        for idx1, idx2 in self.match_tracker.get_true_possible_matches():
-            if idx1 == idx2:
-                day_dict["Unmatched"].append((idx1, idx2))
-            else:
-                day_dict[
-                    get_day_or_either(
-                        self.persons[idx1].day_choice, self.persons[idx2].day_choice
-                    )
-                ].append((idx1, idx2))
-
-        for k, matches in day_dict.items():
-            print(f"------ {k} ------ [{len(matches)} pairs]")
-            for idx1, idx2 in matches:
-                person1, person2 = self.persons[idx1], self.persons[idx2]
-                out = f"({idx1}) {person1.name}"
-                if idx1 != idx2:
-                    out += f" - ({idx2}) {person2.name}"
-                print(out)
+        names = self.participants.names
+        by_day = {
+            day if day is not None else "Unscheduled": positions
+            for day, positions in self.results.by_day.items()
+        }
+        for k, positions in by_day.items():
+            print(f"------ {k} ------ [{len(positions)} pairs]")
+            if self.quiet:
+                continue
+            for idx1, idx2 in self.results.pairs[positions].tolist():
+                print(f"({idx1}) {names[idx1]} - ({idx2}) {names[idx2]}")
             print()
 
+        if self.results.unmatched:
+            print(f"------ Unmatched ------ [{len(self.results.unmatched)} pairs]")
+            if not self.quiet:
+                for idx in self.results.unmatched:
+                    print(f"({idx}) {names[idx]}")
+                print()
+
+        if self.groups is not None:
+            self.log_groups()
+
+    def log_groups(self):
+        print(f"------ Groups ------ [{len(self.groups)} groups]")
+        if not self.quiet:
+            for couples in self.groups.couples:
+                print(
+                    " + ".join(
+                        f"({idx1}) {self.persons[idx1].name} & ({idx2}) {self.persons[idx2].name}"
+                        for idx1, idx2 in couples
+                    )
+                )
+        print(f"------ Ungrouped ------ [{len(self.groups.unassigned)} persons]")
+        if not self.quiet:
+            for idx in self.groups.unassigned:
+                print(f"({idx}) {self.persons[idx].name}")
+        print()
+
     def log_gender_pairing_stats(self):
         # Count and log how many man/woman man/man and woman/woman pairs
-        num = defaultdict(int)
-        for person1, person2 in self.match_tracker.get_matches():
-            if person1 != person2:
-                g1, g2 = person1.gender.value.title(), person2.gender.value.title()
-                g1, g2 = min(g1, g2), max(g1, g2)
-                num[f"{g1}/{g2}"] += 1
-
-        for k, v in num.items():
+        for k, v in self.results.gender_pairings().items():
             print(f"{k}: {v}")
@@ -1,34 +1,127 @@
-from typing import Dict, List, Set, Tuple
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Set, Tuple
 
-from pulp import *
+import numpy as np
 
 from date_matching.person import Person
 
+if TYPE_CHECKING:
+    from pulp import LpVariable
+
 
 # Class that stores possible match variables and actual matches
 class MatchTracker:
-    def __init__(self, persons):
+    def __init__(self, persons, pairs: List[Tuple[int, int]] = None):
         self.persons = persons
-        self.possible_matches = [
-            tuple(c)
-            for c in allcombinations(range(len(self.persons)), k=2)
-            if len(set(c)) == 2
-        ]
+        # Pairs (idx1 < idx2) can be given directly when they are already known to be pairable
+        self.possible_matches = (
+            self._pairable_matches() if pairs is None else list(pairs)
+        )
         self.possible_matches += [(idx, idx) for idx in range(len(self.persons))]
-        self.variables = LpVariable.dicts(
-            "match", self.possible_matches, lowBound=0, upBound=1, cat=LpInteger
+        self._build_adjacency()
+        self._variables = None
+        self.solution = None
+
+    # Only pairs that satisfy the hard constraints are possible matches
+    # Pairability is checked once per pair of groups of people with the same pairing key
+    def _pairable_matches(self) -> List[Tuple[int, int]]:
+        groups = defaultdict(list)
+        for idx, person in enumerate(self.persons):
+            groups[person.pairing_key()].append(idx)
+        groups = list(groups.values())
+
+        pairs = [np.empty((0, 2), dtype=np.int64)]
+        for group_idx, group1 in enumerate(groups):
+            for group2 in groups[group_idx:]:
+                if group1 is group2:
+                    if len(group1) < 2:
+                        continue
+                    person1, person2 = self.persons[group1[0]], self.persons[group1[1]]
+                else:
+                    person1, person2 = self.persons[group1[0]], self.persons[group2[0]]
+                if not person1.is_pairable(person2):
+                    continue
+
+                if group1 is group2:
+                    upper1, upper2 = np.triu_indices(len(group1), k=1)
+                    idx1, idx2 = np.array(group1)[upper1], np.array(group1)[upper2]
+                else:
+                    idx1, idx2 = np.meshgrid(group1, group2, indexing="ij")
+                pairs.append(
+                    np.column_stack(
+                        (np.minimum(idx1, idx2).ravel(), np.maximum(idx1, idx2).ravel())
+                    )
+                )
+
+        pairs = np.concatenate(pairs)
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+        return [(idx1, idx2) for idx1, idx2 in pairs.tolist()]
+
+    # CSR-style index of the possible matches of each person
+    # The ids of the possible matches of person idx are adjacency[offsets[idx]:offsets[idx + 1]]
+    def _build_adjacency(self) -> None:
+        pairs = np.array(self.possible_matches, dtype=np.int64).reshape(-1, 2)
+        match_ids = np.arange(len(pairs))
+        is_pair = pairs[:, 0] != pairs[:, 1]
+
+        people = np.concatenate((pairs[:, 0], pairs[is_pair, 1]))
+        match_ids = np.concatenate((match_ids, match_ids[is_pair]))
+        order = np.lexsort((match_ids, people))
+
+        self.adjacency = match_ids[order]
+        self.offsets = np.zeros(len(self.persons) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(people, minlength=len(self.persons)), out=self.offsets[1:]
+        )
+
+    # Get the ids (positions in possible_matches) of the possible matches of a person
+    def get_match_ids_for_person(self, idx) -> np.ndarray:
+        return self.adjacency[self.offsets[idx] : self.offsets[idx + 1]]
+
+    # Get the id of the possible match between two people, searching only the first person's matches
+    def get_match_id(self, idx1, idx2) -> int:
+        possible_match = (min(idx1, idx2), max(idx1, idx2))
+        for match_id in self.get_match_ids_for_person(idx1):
+            if self.possible_matches[match_id] == possible_match:
+                return int(match_id)
+        raise KeyError(f"{possible_match} is not a possible match")
+
+    # The variables are only created when needed, so solvers that don't build an ILP skip them
+    # (and never import PuLP)
+    @property
+    def variables(self) -> Dict[Tuple[int, int], "LpVariable"]:
+        if self._variables is None:
+            from pulp import LpInteger, LpVariable
+
+            self._variables = LpVariable.dicts(
+                "match", self.possible_matches, lowBound=0, upBound=1, cat=LpInteger
+            )
+        return self._variables
+
+    # Store the pairs matched by a solver, anyone not in a pair is matched with themselves
+    def record_solution(self, matches: List[Tuple[int, int]]) -> None:
+        matched = set()
+        for idx1, idx2 in matches:
+            matched.update((idx1, idx2))
+        solution = list(matches)
+        solution += [
+            (idx, idx) for idx in range(len(self.persons)) if idx not in matched
+        ]
+
+        # Keep the order of possible_matches, pairs sorted by index followed by the unmatched
+        self.solution = sorted(
+            solution, key=lambda match: (match[0] == match[1], match)
         )
 
     # Get all the variables that a person is tracked by, each variable is linked to 2 participants
-    def get_variables_for_person(self, idx) -> List[LpVariable]:
+    def get_variables_for_person(self, idx) -> List["LpVariable"]:
         return [
-            self.variables[possible_match]
-            for possible_match in self.possible_matches
-            if idx in possible_match
+            self.variables[self.possible_matches[match_id]]
+            for match_id in self.get_match_ids_for_person(idx)
         ]
 
     # Return list of variables and both people that represent this variable
-    def get_variables_to_people(self) -> List[Tuple[LpVariable, Person, Person]]:
+    def get_variables_to_people(self) -> List[Tuple["LpVariable", Person, Person]]:
         return [
             (
                 self.variables[possible_match],
@@ -38,8 +131,15 @@ class MatchTracker:
             for possible_match in self.possible_matches
         ]
 
+    # Return list of variables and the indices of both people that represent this variable
+    def get_variables_to_indices(self) -> List[Tuple["LpVariable", int, int]]:
+        return [
+            (self.variables[possible_match], possible_match[0], possible_match[1])
+            for possible_match in self.possible_matches
+        ]
+
     # Get variables which are set to True
-    def get_true_variables(self) -> List[LpVariable]:
+    def get_true_variables(self) -> List["LpVariable"]:
         return [
             self.variables[possible_match]
             for possible_match in self.get_true_possible_matches()
@@ -53,9 +153,12 @@ class MatchTracker:
         ]
 
     # Same as get_matches but returns the indices of the persons instead
+    # The matches are cached once solved, read from the variables if the model was solved directly
     def get_true_possible_matches(self) -> List[Tuple[int, int]]:
-        return [
-            possible_match
-            for possible_match in self.possible_matches
-            if self.variables[possible_match].varValue > 0
-        ]
+        if self.solution is None:
+            self.solution = [
+                possible_match
+                for possible_match in self.possible_matches
+                if self.variables[possible_match].varValue > 0
+            ]
+        return self.solution
@@ -0,0 +1,122 @@
+"""
+Streaming writers for the ILP model, to inspect the problem being optimised when debugging
+
+The model is written a line at a time, so the text of the file is never held in memory
+Paths ending in .gz are compressed, and the format follows the extension: .mps or .lp
+"""
+
+import gzip
+from collections import defaultdict
+from typing import IO, Iterable
+
+from pulp import LpConstraintEQ, LpConstraintGE, LpConstraintLE, LpMaximize, LpProblem
+
+TERMS_PER_LINE = 8
+LP_SENSES = {LpConstraintEQ: "=", LpConstraintLE: "<=", LpConstraintGE: ">="}
+MPS_SENSES = {LpConstraintEQ: "E", LpConstraintLE: "L", LpConstraintGE: "G"}
+
+
+def export_model(prob: LpProblem, path: str) -> None:
+    """Write the model to path, as MPS or LP depending on its extension"""
+    extension = path[: -len(".gz")] if path.endswith(".gz") else path
+    if extension.endswith(".mps"):
+        writer = _write_mps
+    elif extension.endswith(".lp"):
+        writer = _write_lp
+    else:
+        raise ValueError(f"Can't tell the model format of {path}, use .mps or .lp")
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt") as f:
+        writer(prob, f)
+
+
+def _format_terms(terms: Iterable) -> Iterable[str]:
+    line = []
+    for variable, coefficient in terms:
+        line.append(
+            f"{'-' if coefficient < 0 else '+'} {abs(coefficient):.12g} {variable.name}"
+        )
+        if len(line) == TERMS_PER_LINE:
+            yield " ".join(line)
+            line = []
+    if line:
+        yield " ".join(line)
+
+
+def _write_lp(prob: LpProblem, f: IO[str]) -> None:
+    f.write(f"\\* {prob.name} *\\\n")
+    f.write("Maximize\n" if prob.sense == LpMaximize else "Minimize\n")
+    f.write("OBJ:")
+    for line in _format_terms(prob.objective.items()):
+        f.write(f" {line}\n")
+    f.write("\nSubject To\n")
+    for name, constraint in prob.constraints.items():
+        f.write(f"{name}:")
+        for line in _format_terms(constraint.items()):
+            f.write(f" {line}\n")
+        f.write(f" {LP_SENSES[constraint.sense]} {-constraint.constant:.12g}\n")
+
+    f.write("Bounds\n")
+    integers = []
+    for variable in prob.variables():
+        low = "-inf" if variable.lowBound is None else f"{variable.lowBound:.12g}"
+        up = "+inf" if variable.upBound is None else f"{variable.upBound:.12g}"
+        f.write(f" {low} <= {variable.name} <= {up}\n")
+        if variable.cat == "Integer":
+            integers.append(variable.name)
+
+    if integers:
+        f.write("Generals\n")
+        for name in integers:
+            f.write(f" {name}\n")
+    f.write("End\n")
+
+
+def _write_mps(prob: LpProblem, f: IO[str]) -> None:
+    # Free MPS, so that the long variable names PuLP generates are kept
+    # Not every solver reads OBJSENSE (CBC needs -max), so the sense is also noted like PuLP does
+    sense = "MAX" if prob.sense == LpMaximize else "MIN"
+    f.write(f"*SENSE:{'Maximize' if prob.sense == LpMaximize else 'Minimize'}\n")
+    f.write(f"NAME {prob.name}\n")
+    f.write(f"OBJSENSE\n    {sense}\n")
+    f.write("ROWS\n N OBJ\n")
+    for name, constraint in prob.constraints.items():
+        f.write(f" {MPS_SENSES[constraint.sense]} {name}\n")
+
+    # MPS lists the coefficients by column, so index the (sparse) rows of each variable first
+    columns = defaultdict(list)
+    for variable, coefficient in prob.objective.items():
+        columns[variable.name].append(("OBJ", coefficient))
+    for name, constraint in prob.constraints.items():
+        for variable, coefficient in constraint.items():
+            columns[variable.name].append((name, coefficient))
+
+    variables = prob.variables()
+    f.write("COLUMNS\n")
+    in_integers = False
+    for variable in variables:
+        is_integer = variable.cat == "Integer"
+        if is_integer != in_integers:
+            marker = "INTORG" if is_integer else "INTEND"
+            f.write(f"    MARKER 'MARKER' '{marker}'\n")
+            in_integers = is_integer
+        for row, coefficient in columns.pop(variable.name, ()):
+            f.write(f"    {variable.name} {row} {coefficient:.12g}\n")
+    if in_integers:
+        f.write("    MARKER 'MARKER' 'INTEND'\n")
+
+    f.write("RHS\n")
+    for name, constraint in prob.constraints.items():
+        if constraint.constant:
+            f.write(f"    RHS {name} {-constraint.constant:.12g}\n")
+
+    f.write("BOUNDS\n")
+    for variable in variables:
+        if variable.lowBound is None:
+            f.write(f" MI BND {variable.name}\n")
+        elif variable.lowBound:
+            f.write(f" LO BND {variable.name} {variable.lowBound:.12g}\n")
+        if variable.upBound is not None:
+            f.write(f" UP BND {variable.name} {variable.upBound:.12g}\n")
+    f.write("ENDATA\n")
@@ -0,0 +1,149 @@
+"""
+Approximate nearest neighbour index over the answers, for the candidate partners of very large
+events
+
+An exact search scores every pair of people, which grows quadratically with the event even a
+tile at a time (see matching/tiles.py). The index is an inverted file instead: the normalised
+answers are clustered into about sqrt(participants) cells with spherical k-means, and the
+people of each cell are only scored against the people of the `probes` cells whose centroids
+are the most similar to their own. With cells of about sqrt(participants) people, that is
+probes x participants^1.5 pairs rather than participants^2, e.g. 28 times fewer at 50k
+
+The people of a cell are searched together, with the same tiles, masks and penalty as the exact
+search, so only the pairs that are never scored can be missed: partners in a cell that wasn't
+probed. CandidateGraph searches the people it widens exactly, so nobody is left without a
+partner they could have had
+"""
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from date_matching.config import (
+    CANDIDATE_INDEX_PROBES,
+    PENALTY_MULTIPLIER,
+    SCORING_MEMORY_BUDGET,
+    SCORING_WORKERS,
+)
+from date_matching.matching.tiles import TileScorer, search_block, tile_shape
+from date_matching.participants import ParticipantTable
+
+# Rounds of k-means, the cells only need to be roughly right as several are probed
+KMEANS_ROUNDS = 10
+# People assigned to the cells at once while clustering
+ASSIGN_CHUNK = 2**14
+
+
+class CosineIndex:
+    """
+    The cells of the people, and the cells probed for the people of each cell
+    cells is the number of cells, about sqrt(participants) if None
+    """
+
+    def __init__(
+        self,
+        scorer: TileScorer,
+        cells: int = None,
+        probes: int = CANDIDATE_INDEX_PROBES,
+        seed: int = 0,
+    ) -> None:
+        self.scorer = scorer
+        vectors = np.nan_to_num(scorer.answers)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+        num_cells = cells or max(1, math.isqrt(len(vectors)))
+        num_cells = min(num_cells, len(vectors))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), num_cells, replace=False)]
+        for _ in range(KMEANS_ROUNDS):
+            cell = self._assign(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, cell, vectors)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # An empty cell keeps its centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        self.cell = self._assign(vectors, centroids)
+        self.members = [
+            np.flatnonzero(self.cell == idx) for idx in range(len(centroids))
+        ]
+
+        # The cells probed for the people of each cell, their own first
+        similarity = centroids @ centroids.T
+        np.fill_diagonal(similarity, np.inf)
+        self.probes = min(probes, len(centroids))
+        self.probed = np.argsort(-similarity, axis=1)[:, : self.probes]
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """The cell of each vector, the one with the most similar centroid"""
+        return np.concatenate(
+            [
+                np.argmax(vectors[start : start + ASSIGN_CHUNK] @ centroids.T, axis=1)
+                for start in range(0, len(vectors), ASSIGN_CHUNK)
+            ]
+        )
+
+    def columns(self, cell: int) -> np.ndarray:
+        """The people the people of the cell are scored against"""
+        return np.sort(np.concatenate([self.members[idx] for idx in self.probed[cell]]))
+
+    def search(
+        self,
+        table: ParticipantTable,
+        people: np.ndarray,
+        k: Optional[np.ndarray],
+        eligible: np.ndarray,
+        penalty_multiplier: float = PENALTY_MULTIPLIER,
+        threshold: float = 0.0,
+        memory_budget: int = SCORING_MEMORY_BUDGET,
+        workers: int = SCORING_WORKERS,
+    ) -> Tuple[List[np.ndarray], np.ndarray]:
+        """
+        Like tiles.search_partners(), but only amongst the probed cells of each person
+        The counts are of the partners found in those cells, not of every partner
+        """
+        people = np.asarray(people, dtype=np.int64)
+        if not len(people):
+            return [], np.zeros(0, dtype=np.int64)
+        workers = workers or os.cpu_count() or 1
+        k = None if k is None else np.asarray(k)
+
+        # Blocks of the people of each cell, each searched against the same columns
+        jobs = []
+        for cell in np.unique(self.cell[people]).tolist():
+            positions = np.flatnonzero(self.cell[people] == cell)
+            columns = self.columns(cell)
+            height, width = tile_shape(
+                len(positions), len(columns), memory_budget, workers
+            )
+            for start in range(0, len(positions), height):
+                jobs.append((positions[start : start + height], columns, width))
+
+        def search(job) -> Tuple[List[np.ndarray], np.ndarray]:
+            positions, columns, width = job
+            return search_block(
+                self.scorer,
+                table,
+                people[positions],
+                None if k is None else k[positions],
+                eligible,
+                penalty_multiplier,
+                threshold,
+                width,
+                columns,
+            )
+
+        partners = [None] * len(people)
+        counts = np.zeros(len(people), dtype=np.int64)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for (positions, _, _), (block_partners, block_counts) in zip(
+                jobs, pool.map(search, jobs)
+            ):
+                for position, neighbours in zip(positions.tolist(), block_partners):
+                    partners[position] = neighbours
+                counts[positions] = block_counts
+        return partners, counts
@@ -0,0 +1,368 @@
+"""
+The results of a matching, built once from the solution, and the writers of each output format
+
+Results holds every pair with its day (and time slot, if scheduled), compatibility score, soft
+constraint penalty and weight in the objective, computed in one vectorised pass over the
+solution, along with the unmatched people, the groups and how the matching was solved.
+The console logs of MatchMaker and every writer read from it:
+
+    text     the matches by day and the gender pairings, as published
+    csv      one row per person with their partner and date, e.g. for a mail merge
+    json     everything in Results, for other tools
+    summary  the counts, scores and solver statistics of the run
+"""
+
+import csv
+import json
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from date_matching.config import PENALTY_MULTIPLIER
+from date_matching.matching.groups import GroupFormation
+from date_matching.matching.masks import EITHER_DAY, penalty_matrix
+from date_matching.matching.scheduling import Schedule
+from date_matching.participants import IDENTITIES, ParticipantTable
+from date_matching.profiling import profiled
+
+# Label of each day, or (day, time slot), that the pairs are listed under
+DayLabel = str
+
+
+class Results:
+    """
+    The pairs (idx1 < idx2) of a matching and everything written about them
+    scores, penalties and weights are arrays with one entry per pair, days the label of the
+    day (or time slot) of each pair, None if it couldn't be scheduled
+    by_day holds the positions of the pairs of each day, in the order they are listed
+    """
+
+    def __init__(
+        self,
+        table: ParticipantTable,
+        pairs: np.ndarray,
+        scores: np.ndarray,
+        penalties: np.ndarray,
+        days: List[Optional[DayLabel]],
+        unmatched: List[int],
+        groups: GroupFormation = None,
+        solver: Dict = None,
+        by_day: Dict[Optional[DayLabel], List[int]] = None,
+        penalty_multiplier: float = PENALTY_MULTIPLIER,
+    ) -> None:
+        self.table = table
+        self.pairs = pairs
+        self.scores = scores
+        self.penalties = penalties
+        self.weights = scores - penalty_multiplier * penalties
+        self.days = days
+        self.unmatched = unmatched
+        self.groups = groups
+        self.solver = solver or {}
+        if by_day is None:
+            by_day = defaultdict(list)
+            for position, day in enumerate(days):
+                by_day[day].append(position)
+        self.by_day = dict(by_day)
+
+    @classmethod
+    def from_solution(
+        cls,
+        table: ParticipantTable,
+        solution: List[Tuple[int, int]],
+        scores: np.ndarray,
+        schedule: Schedule = None,
+        groups: GroupFormation = None,
+        group_members: np.ndarray = (),
+        solver: Dict = None,
+        penalty_multiplier: float = PENALTY_MULTIPLIER,
+    ) -> "Results":
+        """
+        Build the results from the solution of the MatchTracker, in a single pass
+        scores are the compatibility scores of every pair of people
+        """
+        solution = np.array(solution, dtype=np.int64).reshape(-1, 2)
+        is_pair = solution[:, 0] != solution[:, 1]
+        pairs = solution[is_pair]
+        idx1, idx2 = pairs[:, 0], pairs[:, 1]
+        pair_scores = np.asarray(scores[idx1, idx2], dtype=np.float64)
+        penalties = penalty_matrix(table, idx1, idx2)
+
+        # People on a group date are listed with the groups
+        in_group = np.zeros(len(table), dtype=bool)
+        in_group[np.asarray(group_members, dtype=np.int64)] = True
+        unmatched = [idx for idx in solution[~is_pair, 0].tolist() if not in_group[idx]]
+
+        by_day = None
+        if schedule is not None:
+            # Matches assigned to a time slot, within the venue capacity, in the order
+            # they were scheduled, followed by the pairs that didn't fit
+            position = {pair: k for k, pair in enumerate(map(tuple, pairs.tolist()))}
+            days = [None] * len(pairs)
+            by_day = {}
+            for (day, time), slot_pairs in schedule.by_slot().items():
+                label = f"{day}, {time}"
+                by_day[label] = [position[tuple(sorted(pair))] for pair in slot_pairs]
+                for k in by_day[label]:
+                    days[k] = label
+            by_day[None] = [
+                position[tuple(sorted(pair))] for pair in schedule.unscheduled
+            ]
+        else:
+            # The day of the person who chose one, a pair of "Either" meets on either day
+            either = table.days.index(EITHER_DAY) if EITHER_DAY in table.days else -2
+            day1, day2 = table.day[idx1], table.day[idx2]
+            codes = np.where(day1 != either, day1, day2).tolist()
+            days = [table.days[code] if code >= 0 else None for code in codes]
+
+        return cls(
+            table,
+            pairs,
+            pair_scores,
+            penalties,
+            days,
+            unmatched,
+            groups,
+            solver,
+            by_day,
+            penalty_multiplier,
+        )
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    @property
+    def matched(self) -> int:
+        return 2 * len(self.pairs)
+
+    @property
+    def objective(self) -> float:
+        return float(self.weights.sum())
+
+    def gender_pairings(self) -> Dict[str, int]:
+        """Number of pairs of each combination of genders, e.g. Man/Woman"""
+        labels = [identity.value.title() for identity in IDENTITIES]
+        counts = defaultdict(int)
+        genders = self.table.gender[self.pairs].tolist() if len(self.pairs) else []
+        for gender1, gender2 in genders:
+            g1, g2 = sorted((labels[gender1], labels[gender2]))
+            counts[f"{g1}/{g2}"] += 1
+        return dict(counts)
+
+    def person(self, idx: int) -> Dict:
+        return {
+            "student_id": str(self.table.student_ids[idx]),
+            "name": str(self.table.names[idx]),
+        }
+
+    def to_dict(self) -> Dict:
+        pairs = [
+            {
+                "person1": self.person(idx1),
+                "person2": self.person(idx2),
+                "day": day,
+                "compatibility": score,
+                "penalty": penalty,
+                "weight": weight,
+            }
+            for (idx1, idx2), day, score, penalty, weight in zip(
+                self.pairs.tolist(),
+                self.days,
+                self.scores.tolist(),
+                self.penalties.tolist(),
+                self.weights.tolist(),
+            )
+        ]
+        results = {
+            "participants": len(self.table),
+            "matched": self.matched,
+            "objective": self.objective,
+            "pairs": pairs,
+            "unmatched": [self.person(idx) for idx in self.unmatched],
+            "gender_pairings": self.gender_pairings(),
+            "solver": self.solver,
+        }
+        if self.groups is not None:
+            results["groups"] = [
+                {
+                    "couples": [
+                        [self.person(idx1), self.person(idx2)] for idx1, idx2 in couples
+                    ],
+                    "compatibility": _mean_group_score(couples, score),
+                }
+                for couples, score in zip(self.groups.couples, self.groups.scores)
+            ]
+            results["ungrouped"] = [self.person(idx) for idx in self.groups.unassigned]
+        return results
+
+
+def _mean_group_score(couples: List[Tuple[int, int]], score: float) -> float:
+    # Mean compatibility of every two people in the group
+    size = 2 * len(couples)
+    return score / (size * (size - 1) / 2)
+
+
+def write_text(results: Results, path: str):
+    """The matches, grouped by day, the groups and the gender pairing stats"""
+    ids = results.table.student_ids
+    lines = ["=== MATCHES ===", "", "=== BY DAY ==="]
+    for day, positions in results.by_day.items():
+        lines.append(f"\n{day if day is not None else 'Unscheduled'}:")
+        lines.extend(
+            f"{ids[idx1]} - {ids[idx2]} (Compatibility: {score:.2%})"
+            for idx1, idx2, score in (
+                (*results.pairs[position].tolist(), results.scores[position])
+                for position in positions
+            )
+        )
+
+    if results.groups is not None:
+        lines.append("\n=== GROUPS ===")
+        for couples, score in zip(results.groups.couples, results.groups.scores):
+            members = " + ".join(f"{ids[idx1]} & {ids[idx2]}" for idx1, idx2 in couples)
+            lines.append(
+                f"{members} (Compatibility: {_mean_group_score(couples, score):.2%})"
+            )
+        if results.groups.unassigned:
+            ungrouped = ", ".join(str(ids[idx]) for idx in results.groups.unassigned)
+            lines.append(f"Ungrouped: {ungrouped}")
+
+    lines.append("\n=== GENDER PAIRINGS ===")
+    lines.extend(
+        f"{pair}: {count}" for pair, count in results.gender_pairings().items()
+    )
+
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+CSV_COLUMNS = [
+    "student_id",
+    "name",
+    "partner_student_id",
+    "partner_name",
+    "day",
+    "compatibility",
+    "group",
+]
+
+
+def write_csv(results: Results, path: str):
+    """One row per person, with their partner (or group) and day, sorted by student ID"""
+    ids, names = results.table.student_ids, results.table.names
+    rows = []
+    for (idx1, idx2), day, score in zip(
+        results.pairs.tolist(), results.days, results.scores.tolist()
+    ):
+        for idx, partner in ((idx1, idx2), (idx2, idx1)):
+            rows.append(
+                [ids[idx], names[idx], ids[partner], names[partner], day, score, ""]
+            )
+    if results.groups is not None:
+        for couples, score in zip(results.groups.couples, results.groups.scores):
+            members = [idx for couple in couples for idx in couple]
+            mean_score = _mean_group_score(couples, score)
+            for idx1, idx2 in couples:
+                for idx, partner in ((idx1, idx2), (idx2, idx1)):
+                    others = " ".join(
+                        str(ids[other]) for other in members if other != idx
+                    )
+                    rows.append(
+                        [
+                            ids[idx],
+                            names[idx],
+                            ids[partner],
+                            names[partner],
+                            None,
+                            mean_score,
+                            others,
+                        ]
+                    )
+        unmatched = results.unmatched + results.groups.unassigned
+    else:
+        unmatched = results.unmatched
+    rows += [[ids[idx], names[idx], None, None, None, None, ""] for idx in unmatched]
+    rows.sort(key=lambda row: str(row[0]))
+
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(rows)
+
+
+def write_json(results: Results, path: str):
+    with open(path, "w") as f:
+        json.dump(results.to_dict(), f, indent=2, default=str)
+
+
+def write_summary(results: Results, path: str):
+    """Counts, scores and solver statistics of the run"""
+    participants = len(results.table)
+    lines = [
+        f"Participants: {participants}",
+        f"Matched: {results.matched}/{participants} "
+        f"({results.matched / participants if participants else 0:.1%})",
+        f"Unmatched: {len(results.unmatched)}",
+        f"Objective: {results.objective:.4f}",
+    ]
+    if len(results):
+        lines += [
+            f"Mean compatibility: {results.scores.mean():.2%}",
+            f"Lowest compatibility: {results.scores.min():.2%}",
+            f"Pairs violating a soft constraint: {int(results.penalties.sum())}",
+        ]
+    lines.append("")
+    lines += [
+        f"{day if day is not None else 'Unscheduled'}: {len(positions)} pairs"
+        for day, positions in results.by_day.items()
+    ]
+    lines.append("")
+    lines += [f"{pair}: {count}" for pair, count in results.gender_pairings().items()]
+    if results.groups is not None:
+        lines += [
+            "",
+            f"Groups: {len(results.groups)}",
+            f"Ungrouped: {len(results.groups.unassigned)}",
+            f"Group score: {results.groups.total:.4f}, "
+            f"at least {results.groups.quality:.1%} of the optimum",
+        ]
+    if results.solver:
+        lines.append("")
+        lines += [f"{name}: {value}" for name, value in results.solver.items()]
+
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+# Writer of each format, and the suffix of its file
+WRITERS = {
+    "text": (write_text, ".txt"),
+    "csv": (write_csv, ".csv"),
+    "json": (write_json, ".json"),
+    "summary": (write_summary, "_summary.txt"),
+}
+
+
+@profiled("write_results")
+def write_results(results: Results, path: str, formats: List[str]) -> List[str]:
+    """
+    Write the results in each format, path is the path of the files without their suffix
+    Returns the paths written
+    """
+    unknown = [name for name in formats if name not in WRITERS]
+    if unknown:
+        raise ValueError(
+            f"Unknown result formats {unknown}, choose from {', '.join(WRITERS)}"
+        )
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    for name in formats:
+        write, suffix = WRITERS[name]
+        write(results, path + suffix)
+        paths.append(path + suffix)
+    return paths
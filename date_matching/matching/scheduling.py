@@ -0,0 +1,156 @@
+"""
+Assignment of the matches to the days and time slots of the event, within venue capacity
+
+This is layered on the matching rather than modelled with it: once the pairs are known, each
+pair is sent to a (day, time slot) of the venue, in two steps:
+
+    1. The pairs that are scheduled are chosen from the highest weight down. A pair is admitted
+       if every admitted pair can still be given a slot, i.e. no day has more admitted pairs
+       that have to meet on it than it has room for, and there are no more admitted pairs
+       than room in total. The sets of pairs that can be scheduled form a transversal matroid
+       (pairs matched to the slots they can take), so this greedy choice has the highest
+       total weight of any schedule
+    2. The admitted pairs with a fixed day fill the slots of their day, then the pairs of
+       "Either" participants go to the least utilised slots of any day, balancing the load
+
+Each pair goes to the slot with the lowest utilisation once it is added, kept in a heap. The
+pairs that aren't admitted are left unscheduled, so that they can be moved to a waiting list
+"""
+
+import heapq
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from date_matching.matching.masks import EITHER_DAY
+from date_matching.participants import ParticipantTable
+
+Slot = Tuple[str, str]
+
+
+class Schedule:
+    """
+    The (day, time slot) of each scheduled pair, and the pairs that didn't fit the venue
+    capacity is the number of pairs each (day, time slot) can host
+    """
+
+    def __init__(
+        self,
+        slots: Dict[Tuple[int, int], Slot],
+        unscheduled: List[Tuple[int, int]],
+        capacity: Dict[Slot, int],
+    ) -> None:
+        self.slots = slots
+        self.unscheduled = unscheduled
+        self.capacity = capacity
+
+    def slot(self, idx1: int, idx2: int) -> Optional[Slot]:
+        """Returns the (day, time slot) of the pair, None if it isn't scheduled"""
+        return self.slots.get((idx1, idx2), self.slots.get((idx2, idx1)))
+
+    def by_slot(self) -> Dict[Slot, List[Tuple[int, int]]]:
+        """The pairs of each (day, time slot), in the order of the venue capacity"""
+        pairs = {slot: [] for slot in self.capacity}
+        for pair, slot in self.slots.items():
+            pairs[slot].append(pair)
+        return pairs
+
+    def load(self) -> Dict[Slot, int]:
+        return {slot: len(pairs) for slot, pairs in self.by_slot().items()}
+
+
+def flatten_capacity(venue_capacity: Dict[str, Dict[str, int]]) -> Dict[Slot, int]:
+    """{day: {time slot: pairs}} as {(day, time slot): pairs}, dropping empty slots"""
+    return {
+        (day, time): int(pairs)
+        for day, times in venue_capacity.items()
+        for time, pairs in times.items()
+        if pairs > 0
+    }
+
+
+def match_days(
+    table: ParticipantTable, matches: Sequence[Tuple[int, int]]
+) -> List[Optional[str]]:
+    """
+    The day each pair has to meet on, None if both are free on either day
+    A person with a missing day can only be paired with someone free on either day
+    """
+    either = table.days.index(EITHER_DAY) if EITHER_DAY in table.days else -2
+    days = []
+    for idx1, idx2 in matches:
+        fixed = [
+            table.day[idx]
+            for idx in (idx1, idx2)
+            if table.day[idx] != either and table.day[idx] >= 0
+        ]
+        days.append(table.days[fixed[0]] if fixed else None)
+    return days
+
+
+def schedule_matches(
+    table: ParticipantTable,
+    matches: Sequence[Tuple[int, int]],
+    weights: Sequence[float],
+    venue_capacity: Dict[str, Dict[str, int]],
+) -> Schedule:
+    """
+    Assign each match (idx1 != idx2) to a (day, time slot) within the venue capacity
+    weights are the weights of the matches, when space runs out the pairs that are scheduled
+    have the highest total weight
+    """
+    capacity = flatten_capacity(venue_capacity)
+    order = np.argsort(-np.asarray(weights, dtype=float), kind="stable")
+    days = match_days(table, matches)
+
+    room = defaultdict(int)
+    for (day, _), pairs in capacity.items():
+        room[day] += pairs
+    total_room = sum(room.values())
+
+    # Admit the pairs from the highest weight down while they can all still be scheduled
+    fixed = defaultdict(list)
+    flexible = []
+    unscheduled = []
+    admitted = 0
+    for k in order.tolist():
+        day = days[k]
+        if admitted == total_room or (day is not None and len(fixed[day]) == room[day]):
+            unscheduled.append(matches[k])
+            continue
+        admitted += 1
+        if day is None:
+            flexible.append(matches[k])
+        else:
+            fixed[day].append(matches[k])
+
+    load = dict.fromkeys(capacity, 0)
+    slots = {}
+
+    def fill(pairs: List[Tuple[int, int]], candidates: List[Slot]):
+        # Heap of the utilisation of each slot once another pair is added to it
+        heap = [
+            ((load[slot] + 1) / capacity[slot], position, slot)
+            for position, slot in enumerate(candidates)
+            if load[slot] < capacity[slot]
+        ]
+        heapq.heapify(heap)
+        for pair in pairs:
+            if not heap:
+                unscheduled.append(pair)
+                continue
+            _, position, slot = heapq.heappop(heap)
+            slots[pair] = slot
+            load[slot] += 1
+            if load[slot] < capacity[slot]:
+                heapq.heappush(
+                    heap, ((load[slot] + 1) / capacity[slot], position, slot)
+                )
+
+    # Pairs that have to meet on a given day come first, as the others can go anywhere
+    for day, pairs in fixed.items():
+        fill(pairs, [slot for slot in capacity if slot[0] == day])
+    fill(flexible, list(capacity))
+
+    return Schedule(slots, unscheduled, capacity)
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Tuple, Union
+
+import numpy as np
+
+from date_matching.matching.compatibility import cosine_similarity
+from date_matching.matching.masks import pairable_mask
+from date_matching.participants import ParticipantTable
+
+KEYS_FILE = "keys.npy"
+SCORES_FILE = "scores.npy"
+PAIRABLE_FILE = "pairable.npy"
+METADATA_FILE = "metadata.json"
+# Bump whenever the format of the files or how scores and pairability are computed changes,
+# so that a cache written by an older version is discarded instead of read
+CACHE_VERSION = 2
+# Number of scores read from the cache or written to it at once, when it is saved
+SAVE_CHUNK = 2**22
+
+
+class CachedMatrix:
+    """
+    A (participants x participants) matrix read from the memory-mapped cache for the pairs of
+    participants found in it, and from the rows computed for the others, without holding it all
+    Indexed like the full matrix, as PairScores: matrix[idx1, idx2] for arrays of pairs, with
+    broadcasting, and np.asarray(matrix) builds it in full
+    """
+
+    def __init__(
+        self,
+        cached: np.ndarray,
+        cache_idx: np.ndarray,
+        misses: np.ndarray,
+        rows: np.ndarray,
+        diagonal,
+    ) -> None:
+        self.cached = cached
+        # Position of each participant in the cache, -1 if it's a miss
+        self.cache_idx = cache_idx
+        # Position of each participant in rows, -1 if it's found in the cache
+        self.row = np.full(len(cache_idx), -1, dtype=np.int64)
+        self.row[misses] = np.arange(len(misses))
+        self.rows = rows
+        self.diagonal = diagonal
+        self.dtype = rows.dtype
+
+    def __len__(self) -> int:
+        return len(self.cache_idx)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self), len(self)
+
+    def block(self, idx1: np.ndarray, idx2: np.ndarray) -> np.ndarray:
+        """The (idx1 x idx2) block of the matrix"""
+        block = np.empty((len(idx1), len(idx2)), dtype=self.dtype)
+        cached1, cached2 = self.cache_idx[idx1], self.cache_idx[idx2]
+        hit1, hit2 = cached1 >= 0, cached2 >= 0
+        if hit1.any() and hit2.any():
+            block[np.ix_(hit1, hit2)] = self.cached[
+                np.ix_(cached1[hit1], cached2[hit2])
+            ]
+        row1, row2 = self.row[idx1], self.row[idx2]
+        block[~hit1, :] = self.rows[np.ix_(row1[~hit1], idx2)]
+        block[:, ~hit2] = self.rows[np.ix_(row2[~hit2], idx1)].T
+        block[idx1[:, None] == idx2[None, :]] = self.diagonal
+        return block
+
+    def __getitem__(self, pairs: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+        idx1, idx2 = (np.asarray(idx) for idx in pairs)
+        if idx1.ndim == idx2.ndim == 2 and idx1.shape[1] == idx2.shape[0] == 1:
+            # Every pair of two groups of people, as indexed by np.ix_()
+            return self.block(idx1[:, 0], idx2[0])
+        idx1, idx2 = np.broadcast_arrays(idx1, idx2)
+        values = np.empty(idx1.shape, dtype=self.dtype)
+        row1, row2 = self.row[idx1], self.row[idx2]
+        new1 = row1 >= 0
+        new2 = ~new1 & (row2 >= 0)
+        cached = ~new1 & ~new2
+        if cached.any():
+            values[cached] = self.cached[
+                self.cache_idx[idx1[cached]], self.cache_idx[idx2[cached]]
+            ]
+        values[new1] = self.rows[row1[new1], idx2[new1]]
+        values[new2] = self.rows[row2[new2], idx1[new2]]
+        values[idx1 == idx2] = self.diagonal
+        return values if values.ndim else values[()]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        everyone = np.arange(len(self))
+        matrix = self.block(everyone, everyone)
+        return matrix if dtype is None else matrix.astype(dtype, copy=False)
+
+
+class ScoreCache:
+    """
+    On-disk cache of the compatibility scores and pairability of every pair of participants
+
+    Each participant is keyed by a hash of their answers and of the fields used by the
+    constraints, so a participant whose response hasn't changed is found again in later runs,
+    even if the rows are in a different order. Only the pairs involving new or changed
+    participants are computed, the rest is read from memory-mapped .npy files
+
+    The cache only keeps the participants of the latest run, anyone who isn't part of it
+    anymore is evicted when the cache is saved. A cache written with another CACHE_VERSION
+    is ignored and replaced
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    @staticmethod
+    def participant_keys(table: ParticipantTable) -> np.ndarray:
+        """Hash of the response of each participant, as 16 bytes"""
+        questions = "\x1f".join(table.questions).encode()
+        keys = []
+        for person in table.persons():
+            fields = (
+                person.gender,
+                person.seeking,
+                person.day_choice,
+                person.year,
+                person.year_preference,
+            )
+            digest = hashlib.blake2b(questions, digest_size=16)
+            digest.update("\x1f".join(map(str, fields)).encode())
+            digest.update(table.answers[person.idx].tobytes())
+            keys.append(digest.digest())
+        return np.array(keys, dtype="S16")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        try:
+            with open(self._path(METADATA_FILE)) as f:
+                version = json.load(f).get("version")
+            if version != CACHE_VERSION:
+                logging.info(
+                    f"Score cache: version {version} is not {CACHE_VERSION}, discarded."
+                )
+                return np.empty(0, dtype="S16"), None, None
+            keys = np.load(self._path(KEYS_FILE))
+            scores = np.load(self._path(SCORES_FILE), mmap_mode="r")
+            pairable = np.load(self._path(PAIRABLE_FILE), mmap_mode="r")
+        except (OSError, ValueError):
+            return np.empty(0, dtype="S16"), None, None
+        if scores.shape != (len(keys), len(keys)) or pairable.shape != scores.shape:
+            return np.empty(0, dtype="S16"), None, None
+        return keys, scores, pairable
+
+    def lookup(
+        self, table: ParticipantTable
+    ) -> Tuple[Union[np.ndarray, CachedMatrix], Union[np.ndarray, CachedMatrix]]:
+        """
+        Returns the (participants x participants) compatibility scores (float64, zero on the
+        diagonal) and pairability mask (True on the diagonal), then updates the cache
+        If nobody changed, these are the memory-mapped cache itself, otherwise CachedMatrix
+        that only compute the rows of the new or changed participants
+        """
+        keys = self.participant_keys(table)
+        cached_keys, cached_scores, cached_pairable = self._load()
+        if cached_scores is not None and np.array_equal(keys, cached_keys):
+            logging.info(f"Score cache: {len(keys)} participants cached, 0 to score.")
+            return cached_scores, cached_pairable
+
+        scores, pairable = self._matrices(
+            table, keys, cached_keys, cached_scores, cached_pairable
+        )
+        hits = np.count_nonzero(scores.cache_idx >= 0)
+        logging.info(
+            f"Score cache: {hits} participants cached, {len(keys) - hits} to score."
+        )
+        # Repeated responses are only stored once
+        _, unique = np.unique(keys, return_index=True)
+        unique.sort()
+        if cached_scores is not None and np.array_equal(keys[unique], cached_keys):
+            # Only repeated responses were scored, everyone else is cached already
+            return scores, pairable
+        self._write(keys, unique, scores, pairable)
+        # Release the memory-mapped files before they are replaced
+        del scores, pairable, cached_scores, cached_pairable
+        self._replace()
+
+        # Read back, so that only repeated responses are held in memory
+        cached_keys, cached_scores, cached_pairable = self._load()
+        return self._matrices(table, keys, cached_keys, cached_scores, cached_pairable)
+
+    @staticmethod
+    def _matrices(
+        table: ParticipantTable,
+        keys: np.ndarray,
+        cached_keys: np.ndarray,
+        cached_scores: np.ndarray,
+        cached_pairable: np.ndarray,
+    ) -> Tuple[CachedMatrix, CachedMatrix]:
+        """The scores and pairability, scoring the participants missing from the cache"""
+        # Position of each participant in the cache, -1 if missing
+        # Repeated responses are only looked up once, so that they are scored against each other
+        position = {key: idx for idx, key in enumerate(cached_keys.tolist())}
+        seen = set()
+        cache_idx = np.full(len(keys), -1, dtype=np.int64)
+        for idx, key in enumerate(keys.tolist()):
+            if key not in seen:
+                cache_idx[idx] = position.get(key, -1)
+                seen.add(key)
+        misses = np.flatnonzero(cache_idx < 0)
+
+        answers = table.answers.astype(np.float64)
+        new_scores = cosine_similarity(answers[misses], answers)
+        new_pairable = pairable_mask(
+            table, misses[:, None], np.arange(len(keys))[None, :]
+        )
+        return (
+            CachedMatrix(cached_scores, cache_idx, misses, new_scores, 0.0),
+            CachedMatrix(cached_pairable, cache_idx, misses, new_pairable, True),
+        )
+
+    def _write(
+        self,
+        keys: np.ndarray,
+        unique: np.ndarray,
+        scores: CachedMatrix,
+        pairable: CachedMatrix,
+    ):
+        """Write the unique participants to temporary files, a block of rows at a time"""
+        os.makedirs(self.directory, exist_ok=True)
+        # Removed first and written last, so the version only describes a complete cache
+        if os.path.exists(self._path(METADATA_FILE)):
+            os.remove(self._path(METADATA_FILE))
+        # Write to temporary files first, so an interrupted run can't corrupt the cache
+        np.save(self._temporary(KEYS_FILE), keys[unique])
+        height = max(1, SAVE_CHUNK // max(1, len(unique)))
+        for name, matrix in ((SCORES_FILE, scores), (PAIRABLE_FILE, pairable)):
+            array = np.lib.format.open_memmap(
+                self._temporary(name),
+                mode="w+",
+                dtype=matrix.dtype,
+                shape=(len(unique), len(unique)),
+            )
+            for start in range(0, len(unique), height):
+                array[start : start + height] = matrix.block(
+                    unique[start : start + height], unique
+                )
+            array.flush()
+            del array
+
+    def _replace(self):
+        """Replace the cache with the temporary files, once nothing maps it anymore"""
+        for name in (KEYS_FILE, SCORES_FILE, PAIRABLE_FILE):
+            os.replace(self._temporary(name), self._path(name))
+        with open(self._path(METADATA_FILE), "w") as f:
+            json.dump({"version": CACHE_VERSION}, f)
+
+    def _temporary(self, name: str) -> str:
+        return self._path(f"{name}.tmp.npy")
@@ -0,0 +1,200 @@
+"""
+Scoring of the pairs of people a tile at a time, for events too large to hold every score
+
+The scores of every pair take 8 * participants^2 bytes as float64, 20 GB for 50k participants.
+Instead, the people being searched are scored against everyone in tiles of rows x columns, in
+float32, and the tiles are sized so that the tiles scored at once fit in a memory budget. Within
+each tile, the pairs that can't be paired are masked out and the soft constraint penalty is taken
+off the scores, and only the partners that survive are kept: the top k of each person, or every
+partner whose weight is above a threshold. The rest of the tile is dropped before the next one
+Without a top k the partners kept grow with the number of pairs above the threshold, so they are
+bounded by the memory budget too, and the search fails rather than exhaust the memory
+
+The blocks of rows are searched by a pool of threads, as numpy releases the GIL for the matrix
+products and the masking, so the tiles are scored on every core while sharing the answers
+"""
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from date_matching.config import (
+    PENALTY_MULTIPLIER,
+    SCORING_MEMORY_BUDGET,
+    SCORING_WORKERS,
+)
+from date_matching.matching.compatibility import cosine_similarity
+from date_matching.matching.masks import pairable_mask, preferred_mask
+from date_matching.participants import ParticipantTable
+
+# Peak memory used to score each pair of a tile, in bytes: the float32 scores, norms and
+# weights, and the masks of the constraints. Measured with tracemalloc at about 22, rounded up
+BYTES_PER_PAIR = 32
+# Memory kept for each partner found without a top k, in bytes: its row and column (int64) and
+# weight (float32), and the copies made to sort them
+BYTES_PER_EDGE = 48
+
+
+class TileScorer:
+    """
+    The answers in float32, ready to be scored a tile at a time
+    With every question answered, the rows are normalised once, so that the cosine similarity
+    of a tile is a single matrix product, otherwise it is masked like cosine_similarity()
+    """
+
+    def __init__(self, answers: np.ndarray) -> None:
+        answers = np.asarray(answers, dtype=np.float32)
+        self.complete = not np.isnan(answers).any()
+        if self.complete:
+            norms = np.linalg.norm(answers, axis=1, keepdims=True)
+            answers = np.divide(
+                answers, norms, out=np.zeros_like(answers), where=norms > 0
+            )
+        self.answers = answers
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def scores(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """The (rows x cols) compatibility scores, zero between a person and themselves"""
+        if self.complete:
+            scores = self.answers[rows] @ self.answers[cols].T
+            np.clip(scores, 0.0, 1.0, out=scores)
+        else:
+            scores = cosine_similarity(self.answers[rows], self.answers[cols])
+        scores[rows[:, None] == cols[None, :]] = 0.0
+        return scores
+
+
+def tile_shape(
+    rows: int, cols: int, memory_budget: int, workers: int
+) -> Tuple[int, int]:
+    """
+    The (rows, columns) of the tiles, so that a tile per worker fits in the memory budget
+    Tiles span every column when they can, and there are enough rows for every worker
+    """
+    pairs = max(1, memory_budget // (BYTES_PER_PAIR * workers))
+    height = max(1, min(math.ceil(rows / workers), math.isqrt(pairs)))
+    return height, max(1, min(cols, pairs // height))
+
+
+def search_block(
+    scorer: TileScorer,
+    table: ParticipantTable,
+    rows: np.ndarray,
+    k: Optional[np.ndarray],
+    eligible: np.ndarray,
+    penalty_multiplier: float,
+    threshold: float,
+    width: int,
+    columns: np.ndarray = None,
+    max_edges: int = None,
+) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    The partners of a block of rows amongst columns (everyone if None), best first, and how
+    many each row has
+    With k None, raises a MemoryError if there are more than max_edges partners in all
+    """
+    if columns is None:
+        columns = np.arange(len(scorer))
+    counts = np.zeros(len(rows), dtype=np.int64)
+    width_k = None if k is None else int(k.max())
+    # The best partners so far of each row, or every partner with k None
+    best_cols = np.empty((len(rows), 0), dtype=np.int64)
+    best_weights = np.empty((len(rows), 0), dtype=np.float32)
+    edges = []
+
+    for start in range(0, len(columns), width):
+        cols = columns[start : start + width]
+        pairs = rows[:, None], cols[None, :]
+        weights = scorer.scores(rows, cols)
+        weights -= np.float32(penalty_multiplier) * ~preferred_mask(table, *pairs)
+
+        valid = pairable_mask(table, *pairs) & eligible[None, cols]
+        valid &= (pairs[0] != pairs[1]) & (weights > threshold)
+        counts += valid.sum(axis=1)
+
+        if k is None:
+            if max_edges is not None and counts.sum() > max_edges:
+                raise MemoryError(
+                    f"More than {max_edges} partners for {len(rows)} persons are above "
+                    f"the threshold of {threshold}, set a top k or raise the threshold"
+                )
+            tile_rows, tile_cols = np.nonzero(valid)
+            edges.append((tile_rows, cols[tile_cols], weights[tile_rows, tile_cols]))
+            continue
+
+        # Merge the best partners of the tile with the best so far
+        weights[~valid] = -np.inf
+        if len(cols) > width_k:
+            top = np.argpartition(-weights, width_k - 1, axis=1)[:, :width_k]
+            weights = np.take_along_axis(weights, top, axis=1)
+            tile_cols = cols[top]
+        else:
+            tile_cols = np.broadcast_to(cols, weights.shape)
+        best_cols = np.concatenate((best_cols, tile_cols), axis=1)
+        best_weights = np.concatenate((best_weights, weights), axis=1)
+        if best_cols.shape[1] > width_k:
+            top = np.argpartition(-best_weights, width_k - 1, axis=1)[:, :width_k]
+            best_cols = np.take_along_axis(best_cols, top, axis=1)
+            best_weights = np.take_along_axis(best_weights, top, axis=1)
+
+    if k is None:
+        tile_rows, tile_cols, weights = (np.concatenate(edge) for edge in zip(*edges))
+        order = np.lexsort((-weights, tile_rows))
+        splits = np.cumsum(counts)[:-1]
+        return np.split(tile_cols[order], splits), counts
+
+    order = np.argsort(-best_weights, axis=1, kind="stable")
+    best_cols = np.take_along_axis(best_cols, order, axis=1)
+    sizes = np.minimum(k, counts)
+    return [best_cols[row, :size] for row, size in enumerate(sizes.tolist())], counts
+
+
+def search_partners(
+    table: ParticipantTable,
+    people: np.ndarray,
+    k: Optional[np.ndarray],
+    eligible: np.ndarray,
+    penalty_multiplier: float = PENALTY_MULTIPLIER,
+    threshold: float = 0.0,
+    memory_budget: int = SCORING_MEMORY_BUDGET,
+    workers: int = SCORING_WORKERS,
+    scorer: TileScorer = None,
+) -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    The partners of each of the given people, best first: the eligible people they can be
+    paired with whose weight (compatibility, less the penalty) is above threshold, up to k[i]
+    of them for people[i], or all of them if k is None
+    Also returns the number of such partners each person has, whether kept or not
+    With k None, the partners of each block of people may use its share of the memory budget
+    """
+    people = np.asarray(people, dtype=np.int64)
+    if not len(people):
+        return [], np.zeros(0, dtype=np.int64)
+    scorer = scorer or TileScorer(table.answers)
+    workers = workers or os.cpu_count() or 1
+    height, width = tile_shape(len(people), len(table), memory_budget, workers)
+    max_edges = memory_budget // BYTES_PER_EDGE
+
+    def search(start: int) -> Tuple[List[np.ndarray], np.ndarray]:
+        block = slice(start, start + height)
+        return search_block(
+            scorer,
+            table,
+            people[block],
+            None if k is None else np.asarray(k)[block],
+            eligible,
+            penalty_multiplier,
+            threshold,
+            width,
+            max_edges=max_edges * len(people[block]) // len(people),
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        blocks = list(pool.map(search, range(0, len(people), height)))
+    partners = [row for block_partners, _ in blocks for row in block_partners]
+    return partners, np.concatenate([counts for _, counts in blocks])
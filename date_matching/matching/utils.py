@@ -1,5 +1,6 @@
 import os
 import math
+import shutil
 
 # def print_terminal_line():
 #     t_size = os.get_terminal_size().columns-1
@@ -8,7 +9,8 @@ import math
 
 def print_terminal_line(title=""):
     title = title.upper()
-    t_size = os.get_terminal_size().columns - 1
+    # Falls back to 80 columns when the output isn't a terminal
+    t_size = shutil.get_terminal_size().columns - 1
     string_length = len(title)
     padding = (t_size - string_length) // 2
     print("=" * padding + title + "=" * padding)
@@ -0,0 +1,305 @@
+from enum import Enum
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from date_matching.enum_classes import DateFormat, Identity, Year, YearPreference
+from date_matching.person import Person
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# TODO: move to configs
+NAME_COLUMN = "Name (Full Name)"
+STUDENT_ID_COLUMN = "Student ID"
+GENDER_COLUMN = "I identify as..."
+SEEKING_COLUMN = "I am interested in..."
+DAY_COLUMN = "Which day would you prefer the date to be on?"
+YEAR_COLUMN = "Which year are you in?"
+YEAR_PREFERENCE_COLUMN = "I would like to go on a date with someone who is..."
+DATE_FORMAT_COLUMN = "I want a..."
+
+IDENTITIES = list(Identity)
+YEARS = list(Year)
+YEAR_PREFERENCES = list(YearPreference)
+DATE_FORMATS = list(DateFormat)
+
+
+class ParticipantTable:
+    """
+    Columnar store of every participant, built from the responses with vectorised operations
+
+    The categorical fields are stored as small integer codes, indexing into IDENTITIES, YEARS,
+    YEAR_PREFERENCES, DATE_FORMATS and days (-1 when missing), and the answers as a
+    contiguous float32 matrix of (participants x questions)
+    Use person(idx) or persons() to get Person-like views for code that works with a Person
+    """
+
+    def __init__(
+        self,
+        names: np.ndarray,
+        student_ids: np.ndarray,
+        gender: np.ndarray,
+        seeking: np.ndarray,
+        day: np.ndarray,
+        days: List[str],
+        year: np.ndarray,
+        year_preference: np.ndarray,
+        questions: List[str],
+        answers: np.ndarray,
+        date_format: np.ndarray = None,
+    ) -> None:
+        self.names = names
+        self.student_ids = student_ids
+        self.gender = gender
+        self.seeking = seeking
+        self.day = day
+        self.days = days
+        self.year = year
+        self.year_preference = year_preference
+        self.questions = questions
+        self.answers = answers
+        # Older inputs don't ask for the date format, everyone is then on a one-on-one date
+        if date_format is None:
+            date_format = np.full(len(names), DATE_FORMATS.index(DateFormat.ONE_ON_ONE))
+        self.date_format = np.asarray(date_format, dtype=np.int8)
+
+    @classmethod
+    def from_frame(cls, rows: "pd.DataFrame") -> "ParticipantTable":
+        # Imported here, so that loading participants saved as .npz doesn't import pandas
+        import pandas as pd
+
+        # The questionnaire answers are the columns of type float
+        answers = rows.select_dtypes(include="floating")
+        day, days = pd.factorize(rows[DAY_COLUMN])
+        date_format = None
+        if DATE_FORMAT_COLUMN in rows:
+            date_format = _encode(
+                rows[DATE_FORMAT_COLUMN], DateFormat.from_string, DATE_FORMATS
+            )
+
+        return cls(
+            names=rows[NAME_COLUMN].to_numpy(dtype=object),
+            student_ids=rows[STUDENT_ID_COLUMN].to_numpy(dtype=object),
+            gender=_encode(rows[GENDER_COLUMN], Identity.from_string, IDENTITIES),
+            seeking=_encode(rows[SEEKING_COLUMN], Identity.from_string, IDENTITIES),
+            day=day.astype(np.int16),
+            days=list(days),
+            year=_encode(rows[YEAR_COLUMN], Year.from_string, YEARS),
+            year_preference=_encode(
+                rows[YEAR_PREFERENCE_COLUMN],
+                YearPreference.from_string,
+                YEAR_PREFERENCES,
+            ),
+            questions=list(answers.columns),
+            answers=np.ascontiguousarray(answers.to_numpy(dtype=np.float32)),
+            date_format=date_format,
+        )
+
+    @classmethod
+    def concatenate(cls, tables: List["ParticipantTable"]) -> "ParticipantTable":
+        """
+        Stack tables with the same questions, e.g. built from successive chunks of responses
+        The days are recoded in order of first appearance, as from_frame() would have coded them
+        """
+        days = []
+        day_codes = []
+        for table in tables:
+            if table.questions != tables[0].questions:
+                raise ValueError("Can't concatenate tables with different questions")
+            for day in table.days:
+                if day not in days:
+                    days.append(day)
+            recode = np.array([days.index(day) for day in table.days] + [-1])
+            day_codes.append(recode[table.day].astype(np.int16))
+
+        def stack(column: str) -> np.ndarray:
+            return np.concatenate([getattr(table, column) for table in tables])
+
+        return cls(
+            names=stack("names"),
+            student_ids=stack("student_ids"),
+            gender=stack("gender"),
+            seeking=stack("seeking"),
+            day=np.concatenate(day_codes),
+            days=days,
+            year=stack("year"),
+            year_preference=stack("year_preference"),
+            questions=list(tables[0].questions),
+            answers=np.ascontiguousarray(stack("answers")),
+            date_format=stack("date_format"),
+        )
+
+    def subset(self, indices) -> "ParticipantTable":
+        """The participants at the given indices (or slice), in that order"""
+        return ParticipantTable(
+            names=self.names[indices],
+            student_ids=self.student_ids[indices],
+            gender=self.gender[indices],
+            seeking=self.seeking[indices],
+            day=self.day[indices],
+            days=list(self.days),
+            year=self.year[indices],
+            year_preference=self.year_preference[indices],
+            questions=list(self.questions),
+            answers=np.ascontiguousarray(self.answers[indices]),
+            date_format=self.date_format[indices],
+        )
+
+    def save(self, path: str):
+        """Write the table as an uncompressed .npz of typed arrays, read it with load()"""
+        np.savez(
+            path,
+            names=self.names.astype(str),
+            student_ids=self.student_ids.astype(str),
+            gender=self.gender,
+            seeking=self.seeking,
+            day=self.day,
+            days=np.array(self.days, dtype=str),
+            year=self.year,
+            year_preference=self.year_preference,
+            questions=np.array(self.questions, dtype=str),
+            answers=self.answers,
+            date_format=self.date_format,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ParticipantTable":
+        with np.load(path) as arrays:
+            return cls(
+                names=arrays["names"].astype(object),
+                student_ids=arrays["student_ids"].astype(object),
+                gender=arrays["gender"],
+                seeking=arrays["seeking"],
+                day=arrays["day"],
+                days=arrays["days"].tolist(),
+                year=arrays["year"],
+                year_preference=arrays["year_preference"],
+                questions=arrays["questions"].tolist(),
+                answers=arrays["answers"],
+                date_format=arrays["date_format"] if "date_format" in arrays else None,
+            )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def person(self, idx: int) -> "PersonView":
+        return PersonView(self, idx)
+
+    def persons(self) -> List["PersonView"]:
+        return [PersonView(self, idx) for idx in range(len(self))]
+
+
+def _encode(
+    column: "pd.Series", parse: Callable[[str], Optional[Enum]], members: list
+) -> np.ndarray:
+    """Parse each distinct value of the column once, and code every row by its enum's position"""
+    import pandas as pd
+
+    codes, uniques = pd.factorize(column)
+    lookup = [
+        members.index(member) if member is not None else -1
+        for member in map(parse, uniques)
+    ]
+    lookup = np.array(lookup + [-1], dtype=np.int8)
+    return lookup[codes]
+
+
+def _decode(members: list, code: int):
+    return members[code] if code >= 0 else None
+
+
+class PersonView:
+    """
+    Read-only view of one row of a ParticipantTable with the same interface as Person
+    It only holds a reference to the table and its row, so it is cheap to create
+    """
+
+    __slots__ = ("table", "idx")
+
+    def __init__(self, table: ParticipantTable, idx: int) -> None:
+        self.table = table
+        self.idx = idx
+
+    @property
+    def name(self) -> str:
+        return self.table.names[self.idx]
+
+    @property
+    def student_id(self) -> str:
+        return self.table.student_ids[self.idx]
+
+    @property
+    def gender(self) -> Identity:
+        return _decode(IDENTITIES, self.table.gender[self.idx])
+
+    @property
+    def seeking(self) -> Identity:
+        return _decode(IDENTITIES, self.table.seeking[self.idx])
+
+    @property
+    def matrix(self) -> Dict[str, Union[int, float]]:
+        return dict(zip(self.table.questions, self.table.answers[self.idx].tolist()))
+
+    @property
+    def day_choice(self) -> str:
+        code = self.table.day[self.idx]
+        return self.table.days[code] if code >= 0 else np.nan
+
+    @property
+    def year(self) -> Year:
+        return _decode(YEARS, self.table.year[self.idx])
+
+    @property
+    def year_preference(self) -> YearPreference:
+        return _decode(YEAR_PREFERENCES, self.table.year_preference[self.idx])
+
+    @property
+    def date_format(self) -> DateFormat:
+        # A missing answer means a one-on-one date, like in Person.build()
+        return _decode(DATE_FORMATS, self.table.date_format[self.idx]) or (
+            DateFormat.ONE_ON_ONE
+        )
+
+    compatibility_score = Person.compatibility_score
+    pairing_key = Person.pairing_key
+    is_pairable = Person.is_pairable
+    is_pairing_preferred = Person.is_pairing_preferred
+    _year_preference_constraint = Person._year_preference_constraint
+    _gender_seeking_constraint = Person._gender_seeking_constraint
+    _day_preference_constraint = Person._day_preference_constraint
+    _evaluate_constraints = Person._evaluate_constraints
+
+    def to_person(self) -> Person:
+        return Person(
+            self.name,
+            self.student_id,
+            self.gender,
+            self.seeking,
+            self.matrix,
+            self.day_choice,
+            self.year,
+            self.year_preference,
+            self.date_format,
+        )
+
+    def __reduce__(self):
+        # Pickle as a standalone Person, rather than with the whole table
+        return Person, tuple(self.to_person().__dict__.values())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PersonView):
+            return self.table is other.table and self.idx == other.idx
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((id(self.table), self.idx))
+
+    def __repr__(self) -> str:
+        return (
+            f"Person(name={self.name!r}, student_id={self.student_id!r}, "
+            f"gender={self.gender!r}, seeking={self.seeking!r}, "
+            f"day_choice={self.day_choice!r}, year={self.year!r}, "
+            f"year_preference={self.year_preference!r}, "
+            f"date_format={self.date_format!r})"
+        )
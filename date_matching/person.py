@@ -1,11 +1,12 @@
 from dataclasses import dataclass, field
-from typing import Dict, List, Tuple, Union
+from typing import TYPE_CHECKING, Dict, List, Tuple, Union
 
 import numpy as np
-import pandas as pd
-from scipy.spatial.distance import cosine
 
-from date_matching.enum_classes import Identity, Year, YearPreference
+from date_matching.enum_classes import DateFormat, Identity, Year, YearPreference
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 @dataclass
@@ -18,9 +19,10 @@ class Person:
     day_choice: str
     year: Year
     year_preference: YearPreference
+    date_format: DateFormat = DateFormat.ONE_ON_ONE
 
     @classmethod
-    def build(cls: "Person", row: pd.Series) -> "Person":
+    def build(cls: "Person", row: "pd.Series") -> "Person":
         # TODO: move to configs
         name = row["Name (Full Name)"]
         student_id = row["Student ID"]
@@ -31,6 +33,12 @@ class Person:
         year_preference = YearPreference.from_string(
             row["I would like to go on a date with someone who is..."]
         )
+        date_format = row.get("I want a...")
+        date_format = (
+            DateFormat.from_string(date_format)
+            if isinstance(date_format, str)
+            else DateFormat.ONE_ON_ONE
+        )
 
         # identify columns that are of type float64
         matrix_cols = {k: v for k, v in row.items() if isinstance(v, float)}
@@ -44,6 +52,7 @@ class Person:
             which_day,
             year,
             year_preference,
+            date_format,
         )
 
     def compatibility_score(self, other: "Person") -> float:
@@ -61,10 +70,22 @@ class Person:
         vector2 = np.array([other.matrix[k] for k in common_keys])
 
         # return np.linalg.norm(vector1 - vector2)
-        score = 1 - cosine(vector1, vector2)
+        # Cosine similarity, capped at 1 against rounding, like 1 - scipy's cosine distance
+        score = min(
+            float(np.dot(vector1, vector2))
+            / np.sqrt(np.dot(vector1, vector1) * np.dot(vector2, vector2)),
+            1.0,
+        )
         assert 0 <= score <= 1
         return score
 
+    def pairing_key(self) -> Tuple[Identity, Identity, str]:
+        """
+        Returns the fields that the hard constraints in is_pairable() depend on
+        People with the same key are interchangeable when checking pairability
+        """
+        return self.gender, self.seeking, self.day_choice
+
     def is_pairable(self, other: "Person") -> bool:
         """
         Returns True if the two people are pairable
@@ -0,0 +1,160 @@
+"""
+Instrumentation of the stages of the matching pipeline
+
+Each stage records its wall time, CPU time (including finished child processes, such as the
+component workers and CBC) and the peak memory of the process, along with any statistics the
+stage reports, such as the number of variables of the model or the nodes explored by the solver.
+Stages run within another stage are named after it, e.g. matchmaker/compatibility
+
+    with profiler.stage("load"):
+        ...
+        profiler.record(rows=len(rows))
+
+The records can be written as JSON, and each outermost stage can be profiled with cProfile
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from typing import Dict, List
+
+from date_matching.config import CPROFILE_DIR, PROFILE_MAX_RECORDS
+
+
+def _cpu_time() -> float:
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _max_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows, where psutil has the peak working set if it's installed
+        try:
+            import psutil
+        except ImportError:
+            return 0.0
+        memory = psutil.Process().memory_info()
+        return getattr(memory, "peak_wset", memory.rss) / 2**20
+    # ru_maxrss is the high-water mark of the process so far, in bytes on macOS, KiB elsewhere
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 1024
+
+
+class Profiler:
+    """
+    Records of the stages run so far, in the order they finished
+    If cprofile_dir is set, each outermost stage is profiled and dumped to <stage>.prof there
+    If trace_memory is set, the peak Python allocations of each stage are also traced (slower)
+    If max_records is set, only the latest max_records stages are kept
+    """
+
+    def __init__(
+        self,
+        cprofile_dir: str = None,
+        trace_memory: bool = False,
+        max_records: int = None,
+    ) -> None:
+        self.cprofile_dir = cprofile_dir
+        self.trace_memory = trace_memory
+        self.max_records = max_records
+        self.records: List[Dict] = []
+        self._open: List[Dict] = []
+
+    def reset(self):
+        self.records = []
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        parent = self._open[-1] if self._open else None
+        record = {"stage": f"{parent['stage']}/{name}" if parent else name, "stats": {}}
+
+        profile = None
+        if parent is None and self.cprofile_dir is not None:
+            profile = cProfile.Profile()
+        if self.trace_memory:
+            if parent is None:
+                tracemalloc.start()
+            else:
+                # Keep the peak of the parent so far, as the peak is reset for this stage
+                parent["_traced_peak"] = max(
+                    parent["_traced_peak"], tracemalloc.get_traced_memory()[1]
+                )
+            tracemalloc.reset_peak()
+            record["_traced_peak"] = 0
+
+        self._open.append(record)
+        rss, wall, cpu = _max_rss_mb(), time.perf_counter(), _cpu_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record["stats"]
+        finally:
+            if profile is not None:
+                profile.disable()
+            record["wall_s"] = time.perf_counter() - wall
+            record["cpu_s"] = _cpu_time() - cpu
+            record["max_rss_mb"] = _max_rss_mb()
+            record["rss_growth_mb"] = record["max_rss_mb"] - rss
+            self._open.pop()
+
+            if self.trace_memory:
+                peak = max(
+                    record.pop("_traced_peak"), tracemalloc.get_traced_memory()[1]
+                )
+                record["traced_peak_mb"] = peak / 2**20
+                if parent is None:
+                    tracemalloc.stop()
+                else:
+                    parent["_traced_peak"] = max(parent["_traced_peak"], peak)
+
+            if profile is not None:
+                os.makedirs(self.cprofile_dir, exist_ok=True)
+                profile.dump_stats(os.path.join(self.cprofile_dir, f"{name}.prof"))
+
+            # Keep the keys in a readable order, the statistics last
+            record["stats"] = record.pop("stats")
+            self.records.append(record)
+            if self.max_records is not None and len(self.records) > self.max_records:
+                del self.records[: len(self.records) - self.max_records]
+            logging.info(
+                f"Stage {record['stage']}: {record['wall_s']:.3f}s wall, "
+                f"{record['cpu_s']:.3f}s CPU, {record['max_rss_mb']:.0f} MiB peak RSS"
+            )
+
+    def record(self, **stats):
+        """Add statistics to the innermost stage being run, if any"""
+        if self._open:
+            self._open[-1]["stats"].update(stats)
+
+    def write_json(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.records, f, indent=2, default=str)
+
+
+# Shared by the whole pipeline, main.py writes it out at the end of the run
+profiler = Profiler(cprofile_dir=CPROFILE_DIR, max_records=PROFILE_MAX_RECORDS)
+
+
+def profiled(name: str):
+    """Decorator running the function as a stage of the shared profiler"""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with profiler.stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
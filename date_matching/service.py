@@ -0,0 +1,462 @@
+"""
+Long-lived local matching service, for repeated what-if runs on the same participants
+
+The service loads the participants once and keeps them in memory, along with their
+compatibility scores, the pairs that can be matched and the soft constraint penalty of each
+pair, as built by MatchMaker. A run then only re-weights and re-solves the matching, on a pool
+of worker processes. Each worker keeps the pairs too, and the ILP model once it has built it,
+so later ILP runs only replace its objective
+
+Requests and responses are JSON objects, one per line, over a Unix socket, e.g.
+
+    {"command": "solve", "penalty": 0.3, "exclude": ["u123"], "fix": [["u1", "u2"]]}
+    {"command": "status"}
+    {"command": "stop"}
+
+People are given by student ID. Excluded people are left out of the matching, and fixed pairs
+are matched together whatever their score or constraints, everyone else being matched around them
+
+Runs always maximise the total weight of one-on-one pairs, without the match history. The
+service refuses to start if config.OBJECTIVE, config.GROUP_DATES or config.PAST_PAIRS ask for
+anything else, and requests can't set them, rather than ignoring them
+
+    python -m date_matching.service serve --input date_matching/data/romantic_dates.csv
+    python -m date_matching.service solve --penalty 0.3 --exclude u123 --fix u1 u2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from date_matching.config import (
+    DATA_DIR,
+    GROUP_DATES,
+    OBJECTIVE,
+    PAST_PAIRS,
+    PENALTY_MULTIPLIER,
+    SERVICE_SOCKET,
+    SERVICE_WORKERS,
+    SOLVER_BACKEND,
+)
+from date_matching.matching.backends import ILPBackend, get_backend
+from date_matching.matching.masks import penalty_matrix
+from date_matching.matching.matchmaker import MatchMaker
+from date_matching.matching.matchtracker import MatchTracker
+from date_matching.matching.results import Results
+from date_matching.matching.scheduling import schedule_matches
+from date_matching.participants import ParticipantTable
+from date_matching.profiling import profiler
+
+# Read by the worker processes, see _init_worker()
+_worker = None
+
+# The parameters of a solve request
+SOLVE_PARAMETERS = {
+    "command",
+    "penalty",
+    "backend",
+    "exclude",
+    "fix",
+    "solver_options",
+    "details",
+}
+# The only value of these settings of config.py the service solves with
+SUPPORTED_SETTINGS = {"OBJECTIVE": "total", "GROUP_DATES": False, "PAST_PAIRS": None}
+
+
+class _WorkerState:
+    """The pairs, and the ILP model once built, kept by each worker between jobs"""
+
+    def __init__(
+        self,
+        table: ParticipantTable,
+        pairs: np.ndarray,
+        scores: np.ndarray,
+        penalties: np.ndarray,
+    ) -> None:
+        self.pairs = pairs
+        self.scores = scores
+        self.penalties = penalties
+        self.match_tracker = MatchTracker(
+            table.persons(), [(idx1, idx2) for idx1, idx2 in pairs.tolist()]
+        )
+        self.prob = None
+
+
+def _init_worker(table, pairs, scores, penalties):
+    global _worker
+    _worker = _WorkerState(table, pairs, scores, penalties)
+
+
+def _solve_job(
+    penalty: float, blocked: np.ndarray, backend_name: str, backend_options: Dict
+) -> Tuple[List[Tuple[int, int]], str, Dict]:
+    """Solve the matching with the given penalty multiplier, leaving out the blocked people"""
+    state = _worker
+    # Each job is independent, so the worker doesn't keep the stages of earlier jobs
+    profiler.reset()
+    weights = state.scores - penalty * state.penalties
+    if len(blocked):
+        # Pairs with a negative weight are never matched, the person is unmatched instead
+        is_blocked = np.zeros(len(state.match_tracker.persons), dtype=bool)
+        is_blocked[blocked] = True
+        weights[is_blocked[state.pairs[:, 0]] | is_blocked[state.pairs[:, 1]]] = -1.0
+    # Weights of the possible matches, each person being matched with themselves last
+    weights = np.concatenate((weights, np.zeros(len(state.match_tracker.persons))))
+
+    backend = get_backend(backend_name, **backend_options)
+    if isinstance(backend, ILPBackend):
+        if state.prob is None:
+            state.prob = backend.build_problem(state.match_tracker, weights)
+        else:
+            backend.set_objective(state.prob, state.match_tracker, weights)
+        matches = backend.solve(state.match_tracker, weights, prob=state.prob)
+    else:
+        matches = backend.solve(state.match_tracker, weights)
+    return matches, backend.status, backend.stats
+
+
+class MatchingService:
+    """
+    The warm state of the service and the pool of workers solving its jobs
+    backend is the solver backend used when a request doesn't name one
+    """
+
+    def __init__(
+        self,
+        table: ParticipantTable,
+        workers: int = SERVICE_WORKERS,
+        backend: str = SOLVER_BACKEND,
+    ) -> None:
+        settings = {
+            "OBJECTIVE": OBJECTIVE,
+            "GROUP_DATES": GROUP_DATES,
+            "PAST_PAIRS": PAST_PAIRS,
+        }
+        unsupported = [
+            f"{name} = {settings[name]!r} (only {value!r})"
+            for name, value in SUPPORTED_SETTINGS.items()
+            if settings[name] != value
+        ]
+        if unsupported:
+            raise ValueError(
+                f"The matching service doesn't support {', '.join(unsupported)}"
+            )
+        # MatchMaker filters the pairs with the hard constraints (and the score cache)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.mm = MatchMaker(table, build_model=False, quiet=True)
+        self.table = self.mm.participants
+        self.backend = backend
+
+        pairs = np.array(self.mm.match_tracker.possible_matches, dtype=np.int64)
+        self.pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        idx1, idx2 = self.pairs[:, 0], self.pairs[:, 1]
+        self.scores = np.asarray(self.mm.compatibility.scores[idx1, idx2], np.float64)
+        self.penalties = penalty_matrix(self.table, idx1, idx2)
+        self.index = {
+            str(student_id): idx
+            for idx, student_id in enumerate(self.table.student_ids)
+        }
+
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.table, self.pairs, self.scores, self.penalties),
+        )
+        self.started = time.time()
+        self.jobs = 0
+        self.stopped = asyncio.Event()
+        # The task answering each open connection
+        self.connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    def _indices(self, student_ids: Sequence[str]) -> List[int]:
+        unknown = [
+            student_id
+            for student_id in student_ids
+            if str(student_id) not in self.index
+        ]
+        if unknown:
+            raise ValueError(f"Unknown student IDs: {unknown}")
+        return [self.index[str(student_id)] for student_id in student_ids]
+
+    def status(self) -> Dict:
+        return {
+            "participants": len(self.table),
+            "possible_matches": len(self.pairs),
+            "backend": self.backend,
+            "jobs": self.jobs,
+            "uptime_s": time.time() - self.started,
+        }
+
+    async def solve(self, request: Dict) -> Dict:
+        # Only the stages of the latest request are kept
+        profiler.reset()
+        unknown = sorted(set(request) - SOLVE_PARAMETERS)
+        if unknown:
+            raise ValueError(
+                f"Unsupported parameters {unknown}, "
+                f"a solve request takes {sorted(SOLVE_PARAMETERS - {'command'})}"
+            )
+        penalty = float(request.get("penalty", PENALTY_MULTIPLIER))
+        backend = request.get("backend", self.backend)
+        solver_options = request.get("solver_options", {})
+        # Checked here, so that an unknown backend or option is reported as an invalid request
+        get_backend(backend, **solver_options)
+        excluded = self._indices(request.get("exclude", []))
+        fixed = []
+        for pair in request.get("fix", []):
+            idx1, idx2 = self._indices(pair)
+            if idx1 == idx2:
+                raise ValueError(f"Can't pair {pair[0]} with themselves")
+            fixed.append((min(idx1, idx2), max(idx1, idx2)))
+        blocked = excluded + [idx for pair in fixed for idx in pair]
+        if len(set(blocked)) < len(blocked):
+            raise ValueError("A person is excluded or fixed more than once")
+
+        start = time.perf_counter()
+        matches, status, stats = await asyncio.get_running_loop().run_in_executor(
+            self.pool,
+            _solve_job,
+            penalty,
+            np.array(blocked, dtype=np.int64),
+            backend,
+            solver_options,
+        )
+        self.jobs += 1
+
+        # Everyone but the excluded people, the unmatched being matched with themselves
+        matched = set(blocked) | {idx for match in matches for idx in match}
+        solution = matches + fixed
+        solution += [(idx, idx) for idx in range(len(self.table)) if idx not in matched]
+        schedule = None
+        if self.mm.venue_capacity:
+            pairs = np.array(matches + fixed, dtype=np.int64).reshape(-1, 2)
+            idx1, idx2 = pairs[:, 0], pairs[:, 1]
+            weights = self.mm.compatibility.scores[idx1, idx2] - penalty * (
+                penalty_matrix(self.table, idx1, idx2)
+            )
+            schedule = schedule_matches(
+                self.table, matches + fixed, weights, self.mm.venue_capacity
+            )
+        results = Results.from_solution(
+            self.table,
+            solution,
+            self.mm.compatibility.scores,
+            schedule,
+            solver={
+                "backend": backend,
+                "status": status,
+                **stats,
+                "runtime_s": time.perf_counter() - start,
+            },
+            penalty_multiplier=penalty,
+        )
+
+        ids = self.table.student_ids
+        response = {
+            "participants": len(self.table) - len(excluded),
+            "matched": results.matched,
+            "objective": results.objective,
+            # Without venue scheduling, pairs of "Either" participants are listed under
+            # "Either" as in Results, and so are pairs of someone who didn't give a day (None)
+            # With it, None holds the pairs that didn't fit the venue
+            "days": {
+                day or ("Unscheduled" if schedule else "Either"): len(positions)
+                for day, positions in results.by_day.items()
+            },
+            "gender_pairings": results.gender_pairings(),
+            "unmatched": [str(ids[idx]) for idx in results.unmatched],
+            "excluded": [str(ids[idx]) for idx in excluded],
+            "fixed": [[str(ids[idx1]), str(ids[idx2])] for idx1, idx2 in fixed],
+            "solver": results.solver,
+        }
+        if request.get("details"):
+            response["pairs"] = results.to_dict()["pairs"]
+        return response
+
+    async def dispatch(self, request: Dict) -> Dict:
+        command = request.get("command")
+        if command == "solve":
+            return await self.solve(request)
+        if command == "status":
+            return self.status()
+        if command == "stop":
+            self.stopped.set()
+            return {}
+        raise ValueError(f"Unknown command {command!r}, send solve, status or stop")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer each request of a connection in turn"""
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while not self.stopped.is_set() and (line := await reader.readline()):
+                try:
+                    response = {"ok": True, **await self.dispatch(json.loads(line))}
+                except ValueError as e:
+                    logging.warning(f"Invalid request: {e}")
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                except Exception as e:
+                    logging.exception("Request failed")
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                writer.write((json.dumps(response, default=str) + "\n").encode())
+                await writer.drain()
+        finally:
+            del self.connections[writer]
+            writer.close()
+
+    async def serve(self, path: str = SERVICE_SOCKET):
+        """Listen on the Unix socket at path until a stop request"""
+        if os.path.exists(path):
+            # Left over by a service that didn't stop cleanly, unless one is still running
+            with contextlib.suppress(ConnectionRefusedError), socket.socket(
+                socket.AF_UNIX
+            ) as probe:
+                probe.connect(path)
+                raise RuntimeError(f"A matching service is already listening on {path}")
+            os.remove(path)
+
+        server = await asyncio.start_unix_server(self.handle, path=path)
+        logging.info(
+            f"Matching service listening on {path}, "
+            f"{len(self.table)} participants, {len(self.pairs)} possible matches."
+        )
+        try:
+            async with server:
+                await self.stopped.wait()
+                # Clients still connected see the connection close
+                handlers = list(self.connections.values())
+                for writer in list(self.connections):
+                    writer.close()
+                await asyncio.gather(*handlers, return_exceptions=True)
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+
+class MatchingClient:
+    """Sends requests to a running service, and waits for each response"""
+
+    def __init__(self, path: str = SERVICE_SOCKET) -> None:
+        self.socket = socket.socket(socket.AF_UNIX)
+        self.socket.connect(path)
+        self.file = self.socket.makefile("rwb")
+
+    def request(self, command: str, **params) -> Dict:
+        self.file.write((json.dumps({"command": command, **params}) + "\n").encode())
+        self.file.flush()
+        response = json.loads(self.file.readline())
+        if not response.pop("ok"):
+            raise RuntimeError(response["error"])
+        return response
+
+    def solve(
+        self,
+        penalty: float = None,
+        exclude: Sequence[str] = (),
+        fix: Sequence[Tuple[str, str]] = (),
+        backend: str = None,
+        solver_options: Dict = None,
+        details: bool = False,
+    ) -> Dict:
+        params = {"exclude": list(exclude), "fix": [list(pair) for pair in fix]}
+        if penalty is not None:
+            params["penalty"] = penalty
+        if backend is not None:
+            params["backend"] = backend
+        if solver_options:
+            params["solver_options"] = solver_options
+        return self.request("solve", details=details, **params)
+
+    def status(self) -> Dict:
+        return self.request("status")
+
+    def stop(self) -> Dict:
+        return self.request("stop")
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+    def __enter__(self) -> "MatchingClient":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the matching service, or send it a request"
+    )
+    parser.add_argument("--socket", default=SERVICE_SOCKET)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser(
+        "serve", help="load the participants and serve requests"
+    )
+    serve.add_argument(
+        "--input",
+        default=f"date_matching/{DATA_DIR}/questionnaire-responses-2024-11-21.csv",
+        help="raw export, transformed CSV or .npz participants",
+    )
+    serve.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    serve.add_argument("--backend", default=SOLVER_BACKEND)
+
+    solve = commands.add_parser("solve", help="re-solve the matching")
+    solve.add_argument("--penalty", type=float, help="the PENALTY_MULTIPLIER")
+    solve.add_argument("--exclude", nargs="+", default=[], metavar="ID")
+    solve.add_argument(
+        "--fix", nargs=2, action="append", default=[], metavar=("ID1", "ID2")
+    )
+    solve.add_argument("--backend")
+    solve.add_argument("--time-limit", type=float, help="of the ILP solver, in seconds")
+    solve.add_argument("--gap", type=float, help="relative gap of the ILP solver")
+    solve.add_argument("--details", action="store_true", help="also list the pairs")
+
+    commands.add_parser("status", help="describe the running service")
+    commands.add_parser("stop", help="stop the running service")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        from data_transformer import load_table
+
+        logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
+
+        async def run():
+            service = MatchingService(
+                load_table(args.input), args.workers, args.backend
+            )
+            await service.serve(args.socket)
+
+        asyncio.run(run())
+        return
+
+    with MatchingClient(args.socket) as client:
+        if args.command == "solve":
+            options = {"time_limit": args.time_limit, "gap": args.gap}
+            response = client.solve(
+                args.penalty,
+                args.exclude,
+                args.fix,
+                args.backend,
+                {name: value for name, value in options.items() if value is not None},
+                args.details,
+            )
+        else:
+            response = client.request(args.command)
+    print(json.dumps(response, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Parameter sweep, solving the matching for a grid of settings in one run to compare them
+
+Each setting is a penalty multiplier (see config.PENALTY_MULTIPLIER), a day rule and an
+objective (see matching/fairness.py). With the day rule "enforce", people who chose different
+days can't be paired, as in MatchMaker. With "relax", they can, but their pair is penalised like
+a year preference violation, so the penalty multiplier sets how much a clash of days costs
+
+The compatibility scores and the masks of the constraints are computed once, and shared with
+the worker processes through shared memory rather than pickled for every setting. Each worker
+keeps the pairs of each day rule, and the ILP model once it has built it, so later settings
+with the same day rule only replace its objective
+
+Group dates and the venue capacity are left out, everyone is paired on a one-on-one date
+
+    python -m date_matching.sweep --penalties 0 0.1 0.3 0.5 --day-rules enforce relax
+"""
+
+import argparse
+import csv
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from date_matching.config import (
+    DATA_DIR,
+    SOLVER_BACKEND,
+    SWEEP_DAY_RULES,
+    SWEEP_OBJECTIVES,
+    SWEEP_PENALTIES,
+    SWEEP_WORKERS,
+)
+from date_matching.matching.backends import ILPBackend, get_backend
+from date_matching.matching.compatibility import CompatibilityMatrix
+from date_matching.matching.fairness import fair_weights
+from date_matching.matching.masks import (
+    day_preference_mask,
+    gender_seeking_mask,
+    preferred_mask,
+)
+from date_matching.matching.matchtracker import MatchTracker
+from date_matching.participants import ParticipantTable
+from date_matching.profiling import profiler
+
+DAY_RULES = ("enforce", "relax")
+# Columns of the comparison table
+COLUMNS = [
+    "penalty",
+    "day_rule",
+    "objective",
+    "status",
+    "matched",
+    "total_weight",
+    "mean_score",
+    "lowest_score",
+    "year_violations",
+    "day_clashes",
+    "runtime_s",
+]
+
+# Read by the worker processes, see _init_worker()
+_worker = None
+
+
+class Setting(NamedTuple):
+    penalty: float
+    day_rule: str
+    objective: str
+
+
+class SharedArrays:
+    """
+    Arrays copied once into shared memory, for processes to map without copying them
+    spec describes the blocks, to attach to them in another process with attach()
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]) -> None:
+        self.blocks = []
+        self.spec = {}
+        for name, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            self.blocks.append(block)
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self) -> None:
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @staticmethod
+    def attach(spec: Dict) -> Tuple[Dict[str, np.ndarray], List]:
+        """The arrays described by spec, and the blocks holding them, to keep open"""
+        arrays, blocks = {}, []
+        for name, (block_name, shape, dtype) in spec.items():
+            # Workers share the resource tracker of the process that created the block, which
+            # unlinks it once, however many processes attached to it
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            arrays[name] = np.ndarray(shape, dtype, buffer=block.buf)
+        return arrays, blocks
+
+
+class _WorkerState:
+    """The shared arrays, and the pairs and ILP model of each day rule, kept by each worker"""
+
+    def __init__(self, table: ParticipantTable, spec: Dict) -> None:
+        self.persons = table.persons()
+        self.arrays, self.blocks = SharedArrays.attach(spec)
+        # day rule -> (pairs, match tracker, ILP model or None)
+        self.problems = {}
+
+    def problem(self, day_rule: str) -> Tuple[np.ndarray, MatchTracker]:
+        if day_rule not in self.problems:
+            pairable = self.arrays["gender"]
+            if day_rule == "enforce":
+                pairable = pairable & self.arrays["day"]
+            pairs = np.argwhere(np.triu(pairable, 1))
+            match_tracker = MatchTracker(
+                self.persons, [(idx1, idx2) for idx1, idx2 in pairs.tolist()]
+            )
+            self.problems[day_rule] = [pairs, match_tracker, None]
+        pairs, match_tracker, _ = self.problems[day_rule]
+        return pairs, match_tracker
+
+
+def _init_worker(table: ParticipantTable, spec: Dict):
+    global _worker
+    _worker = _WorkerState(table, spec)
+
+
+def _run_setting(setting: Setting, backend_name: str) -> Dict:
+    """Solve the matching for one setting, and measure it for the comparison table"""
+    state = _worker
+    # Each setting is independent, so the worker doesn't keep the stages of earlier settings
+    profiler.reset()
+    start = time.perf_counter()
+    pairs, match_tracker = state.problem(setting.day_rule)
+    idx1, idx2 = pairs[:, 0], pairs[:, 1]
+    scores = state.arrays["scores"][idx1, idx2]
+    year_violations = ~state.arrays["preferred"][idx1, idx2]
+    day_clashes = ~state.arrays["day"][idx1, idx2]
+    penalties = year_violations.astype(np.float64)
+    if setting.day_rule == "relax":
+        penalties += day_clashes
+
+    # Weights of the possible matches, each person being matched with themselves last
+    num_persons = len(state.persons)
+    self_pairs = np.repeat(np.arange(num_persons), 2).reshape(-1, 2)
+    true_weights = scores - setting.penalty * penalties
+    weights, _ = fair_weights(
+        setting.objective,
+        num_persons,
+        np.concatenate((pairs, self_pairs)),
+        np.concatenate((true_weights, np.zeros(num_persons))),
+        np.concatenate((scores, np.zeros(num_persons))),
+    )
+
+    backend = get_backend(backend_name)
+    if isinstance(backend, ILPBackend):
+        problem = state.problems[setting.day_rule]
+        if problem[2] is None:
+            problem[2] = backend.build_problem(match_tracker, weights)
+        else:
+            backend.set_objective(problem[2], match_tracker, weights)
+        matches = backend.solve(match_tracker, weights, prob=problem[2])
+    else:
+        matches = backend.solve(match_tracker, weights)
+
+    # Positions of the matched pairs amongst the possible matches
+    matches = np.array(matches, dtype=np.int64).reshape(-1, 2)
+    key = idx1 * num_persons + idx2
+    order = np.argsort(key)
+    matched_keys = matches.min(axis=1) * num_persons + matches.max(axis=1)
+    positions = order[np.searchsorted(key, matched_keys, sorter=order)]
+    return {
+        **setting._asdict(),
+        "status": backend.status,
+        "matched": 2 * len(matches),
+        "total_weight": float(true_weights[positions].sum()),
+        "mean_score": float(scores[positions].mean()) if len(matches) else 0.0,
+        "lowest_score": float(scores[positions].min()) if len(matches) else 0.0,
+        "year_violations": int(year_violations[positions].sum()),
+        "day_clashes": int(day_clashes[positions].sum()),
+        "runtime_s": time.perf_counter() - start,
+    }
+
+
+def sweep(
+    table: ParticipantTable,
+    penalties: List[float] = SWEEP_PENALTIES,
+    day_rules: List[str] = SWEEP_DAY_RULES,
+    objectives: List[str] = SWEEP_OBJECTIVES,
+    backend: str = SOLVER_BACKEND,
+    workers: int = SWEEP_WORKERS,
+) -> List[Dict]:
+    """
+    Solve the matching for every combination of the penalties, day rules and objectives
+    Returns a row of the comparison table for each setting, in the order of the grid
+    """
+    unknown = [day_rule for day_rule in day_rules if day_rule not in DAY_RULES]
+    if unknown:
+        raise ValueError(f"Unknown day rules {unknown}, choose from {DAY_RULES}")
+    settings = [
+        Setting(float(penalty), day_rule, objective)
+        for penalty, day_rule, objective in itertools.product(
+            penalties, day_rules, objectives
+        )
+    ]
+    scores = CompatibilityMatrix(table.answers).scores
+    arrays = {
+        "scores": scores,
+        "gender": gender_seeking_mask(table),
+        "day": day_preference_mask(table),
+        "preferred": preferred_mask(table),
+    }
+    logging.info(
+        f"Sweeping {len(settings)} settings of {len(table)} participants, sharing "
+        f"{sum(array.nbytes for array in arrays.values()) / 2**20:.1f} MiB"
+    )
+
+    with SharedArrays(arrays) as shared, ProcessPoolExecutor(
+        max_workers=min(workers or os.cpu_count() or 1, len(settings)),
+        initializer=_init_worker,
+        initargs=(table, shared.spec),
+    ) as pool:
+        runs = [pool.submit(_run_setting, setting, backend) for setting in settings]
+        return [run.result() for run in runs]
+
+
+def format_table(rows: List[Dict]) -> str:
+    """The comparison table, aligned as text"""
+    cells = [COLUMNS] + [
+        [
+            f"{row[column]:.4f}" if isinstance(row[column], float) else str(row[column])
+            for column in COLUMNS
+        ]
+        for row in rows
+    ]
+    widths = [max(len(line[k]) for line in cells) for k in range(len(COLUMNS))]
+    return "\n".join(
+        "  ".join(cell.rjust(width) for cell, width in zip(line, widths))
+        for line in cells
+    )
+
+
+def write_csv(rows: List[Dict], path: str):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--input",
+        default=f"date_matching/{DATA_DIR}/questionnaire-responses-2024-11-21.csv",
+        help="the raw export, transformed responses, or participants saved as .npz",
+    )
+    parser.add_argument("--penalties", type=float, nargs="+", default=SWEEP_PENALTIES)
+    parser.add_argument(
+        "--day-rules", nargs="+", choices=DAY_RULES, default=SWEEP_DAY_RULES
+    )
+    parser.add_argument("--objectives", nargs="+", default=SWEEP_OBJECTIVES)
+    parser.add_argument("--backend", default=SOLVER_BACKEND)
+    parser.add_argument("--workers", type=int, default=SWEEP_WORKERS)
+    parser.add_argument("--output", help="also write the comparison table as CSV")
+    args = parser.parse_args()
+
+    from data_transformer import load_table
+
+    logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
+    table = load_table(args.input)
+    rows = sweep(
+        table,
+        args.penalties,
+        args.day_rules,
+        args.objectives,
+        args.backend,
+        args.workers,
+    )
+    print(format_table(rows))
+    if args.output is not None:
+        write_csv(rows, args.output)
+        logging.info(f"Comparison table saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
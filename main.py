@@ -1,94 +1,266 @@
+"""
+Run the date matching, or one of its stages, from the command line
 
+    python main.py transform --output date_matching/data/participants.npz
+    python main.py validate
+    python main.py solve --formats text summary
+    python main.py report date_matching/data/matches_20241121_152543.txt
+    python main.py history --import date_matching/data/matches_*.txt
+
+Without a command, the matching is solved with the settings in date_matching/config.py
+Each command only imports what its stage needs (pandas, PuLP, SciPy), so that --help and
+validate start quickly, see benchmarks/startup.py
+"""
+
+import argparse
 import logging
-import pandas as pd
+import os
 from datetime import datetime
 
-from date_matching.config import DATA_DIR
-from date_matching.matching.matchmaker import MatchMaker
-from data_transformer import transform_csv_for_matching
+from date_matching.config import (
+    DATA_DIR,
+    HISTORY_PATH,
+    PENALTY_MULTIPLIER,
+    PROFILE_OUTPUT_PATH,
+    RECORD_HISTORY,
+    RESULT_FORMATS,
+    TRANSFORMED_OUTPUT_PATH,
+)
+from date_matching.profiling import profiled, profiler
 
 logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def main():
-    # Step 1: Transform the raw responses data
+# The raw questionnaire export, or participants saved as .npz
+INPUT_PATH = f"date_matching/{DATA_DIR}/questionnaire-responses-2024-11-21.csv"
+
+
+def transform(args: argparse.Namespace):
+    """Transform the raw export to the romantic_dates.csv format, or to typed arrays (.npz)"""
+    from data_transformer import load_participants, transform_csv_for_matching
+
+    if args.output.endswith(".npz"):
+        load_participants(input_csv=args.input, output_path=args.output)
+    else:
+        transform_csv_for_matching(input_csv=args.input, output_csv=args.output)
+
+
+def validate(args: argparse.Namespace):
+    """Check the raw export, without transforming it"""
+    from data_transformer import validate_export
+
+    report = validate_export(args.input)
+    logger.info(
+        f"{args.input}: {report['responses']} responses, "
+        f"{report['purchased']} with a ticket"
+    )
+    if report["invalid_rows"]:
+        raise SystemExit(
+            f"Non-numeric answers in the rows {report['invalid_rows']} of {args.input}"
+        )
+    logger.info("The export is valid.")
+
+
+@profiled("main")
+def solve(args: argparse.Namespace):
+    from data_transformer import load_table
+    from date_matching.matching.incremental import load_previous_matches
+    from date_matching.matching.matchmaker import MatchMaker
+    from date_matching.matching.results import write_results
+
+    # Step 1: Read and transform the raw responses, in chunks, straight into the matcher's format
     try:
         logger.info("Starting data transformation...")
-        transform_csv_for_matching(
-            input_csv=f"date_matching/{DATA_DIR}/questionnaire-responses-2024-11-21.csv",
-            output_csv=f"date_matching/{DATA_DIR}/transformed_romantic_dates.csv"
-        )
+        participants = load_table(args.input, output_path=TRANSFORMED_OUTPUT_PATH)
         logger.info("Data transformation complete.")
     except Exception as e:
         logger.error(f"Error during data transformation: {e}")
         raise
 
-    # Step 2: Read the transformed data
-    try:
-        logger.info("Reading transformed data...")
-        data = pd.read_csv(f"date_matching/{DATA_DIR}/transformed_romantic_dates.csv", header=0)
-        logger.info(f"Loaded {len(data)} responses.")
-    except Exception as e:
-        logger.error(f"Error reading transformed data: {e}")
-        raise
-
     # Optional: Limit the number of entries for testing
-    LIMIT = None  # Or set a number for testing
-    if LIMIT is not None:
-        logger.info(f"Limiting to {LIMIT} entries for testing")
-        data = data[:LIMIT]
+    if args.limit is not None:
+        logger.info(f"Limiting to {args.limit} entries for testing")
+        participants = participants.subset(slice(args.limit))
 
-    # Step 3: Generate matches
+    # Step 2: Generate matches
     try:
         logger.info("Initializing matching algorithm...")
-        mm = MatchMaker(data)
-        
-        logger.info("Solving for optimal matches...")
-        mm.solve()
-        
-        # Step 4: Save the results (optional)
+        mm = MatchMaker(
+            participants, build_model=not args.preview and args.previous is None
+        )
+
+        # Optional: Only preview how many people would be matched, e.g. while sign-ups are open
+        if args.preview:
+            logger.info("Previewing the matches...")
+            mm.preview()
+            return
+        # Optional: Re-match around a previously published matches file, keeping the pairs that still hold
+        if args.previous is not None:
+            logger.info(f"Re-matching from {args.previous}...")
+            mm.solve_incremental(load_previous_matches(args.previous))
+        else:
+            logger.info("Solving for optimal matches...")
+            mm.solve()
+
+        # Step 3: Save the results (optional)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        results_file = f"date_matching/{DATA_DIR}/matches_{timestamp}.txt"
-        
-        logger.info(f"Saving results to {results_file}")
-        with open(results_file, "w") as f:
-            f.write("=== MATCHES ===\n\n")
-            # Write scheduling info
-            f.write("=== BY DAY ===\n")
-            day_dict = {}
-            for idx1, idx2 in mm.match_tracker.get_true_possible_matches():
-                if idx1 == idx2:
-                    continue
-                person1, person2 = mm.persons[idx1], mm.persons[idx2]
-                day = person1.day_choice if person1.day_choice != "Either" else person2.day_choice
-                if day not in day_dict:
-                    day_dict[day] = []
-                day_dict[day].append((person1, person2))
-            
-            for day, pairs in day_dict.items():
-                f.write(f"\n{day}:\n")
-                for person1, person2 in pairs:
-                    compatibility = person1.compatibility_score(person2)
-                    f.write(f"{person1.student_id} - {person2.student_id} (Compatibility: {compatibility:.2%})\n")
-            
-            # Write gender pairing stats
-            f.write("\n=== GENDER PAIRINGS ===\n")
-            gender_stats = {}
-            for person1, person2 in mm.match_tracker.get_matches():
-                if person1 != person2:
-                    g1, g2 = person1.gender.value.title(), person2.gender.value.title()
-                    g1, g2 = min(g1, g2), max(g1, g2)
-                    pair = f"{g1}/{g2}"
-                    gender_stats[pair] = gender_stats.get(pair, 0) + 1
-            
-            for pair, count in gender_stats.items():
-                f.write(f"{pair}: {count}\n")
+        results_path = f"date_matching/{DATA_DIR}/matches_{timestamp}"
+
+        for path in write_results(mm.results, results_path, args.formats):
+            logger.info(f"Results saved to {path}")
+
+        # Optional: Record the run, so that its pairs aren't matched again at a later event
+        if args.record:
+            from date_matching.matching.history import MatchHistory
+
+            parameters = {
+                "input": args.input,
+                "penalty_multiplier": PENALTY_MULTIPLIER,
+                "objective": mm.objective,
+                "past_pairs": mm.past_pairs_rule,
+                "top_k": mm.top_k,
+            }
+            # Named after the matches file, so that importing it later doesn't record it again
+            source = os.path.abspath(f"{results_path}.txt")
+            with MatchHistory(HISTORY_PATH) as history:
+                history.record_run(mm.results, parameters, source=source)
+            logger.info(f"Run recorded in {HISTORY_PATH}")
 
         logger.info("Matching process complete!")
-        
+
     except Exception as e:
         logger.error(f"Error during matching process: {e}")
         raise
 
+
+def report(args: argparse.Namespace):
+    """Write the results of a published matches file again, e.g. as a summary or as JSON"""
+    import numpy as np
+
+    from data_transformer import load_table
+    from date_matching.matching.compatibility import PairScores
+    from date_matching.matching.incremental import load_previous_matches
+    from date_matching.matching.results import Results, write_results
+
+    participants = load_table(args.input)
+    index = {
+        str(student_id): idx for idx, student_id in enumerate(participants.student_ids)
+    }
+    pairs = []
+    for id1, id2 in load_previous_matches(args.matches):
+        if id1 not in index or id2 not in index:
+            logger.warning(f"{id1} or {id2} isn't amongst the participants, skipped")
+            continue
+        pairs.append(tuple(sorted((index[id1], index[id2]))))
+
+    # Anyone not in a pair is matched with themselves, as in the solution of the MatchTracker
+    matched = {idx for pair in pairs for idx in pair}
+    solution = pairs + [
+        (idx, idx) for idx in range(len(participants)) if idx not in matched
+    ]
+    results = Results.from_solution(
+        participants,
+        np.array(solution, dtype=np.int64),
+        PairScores(participants.answers),
+    )
+    stem, _ = os.path.splitext(args.matches)
+    for path in write_results(results, f"{stem}_report", args.formats):
+        logger.info(f"Report saved to {path}")
+
+
+def history(args: argparse.Namespace):
+    """Import published matches files into the history, and list the recorded runs"""
+    from date_matching.matching.history import MatchHistory
+
+    with MatchHistory(HISTORY_PATH) as match_history:
+        for path in args.import_files:
+            if match_history.import_matches_file(path) is None:
+                logger.info(f"{path} was already imported")
+            else:
+                logger.info(f"Imported {path}")
+        for run in match_history.runs():
+            print(
+                f"{run['id']}: {run['timestamp']}, {run['participants']} participants, "
+                f"{run['pairs']} pairs ({run['source'] or 'no source'})"
+            )
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    def add_command(name: str, run, summary: str) -> argparse.ArgumentParser:
+        command = commands.add_parser(name, help=summary)
+        command.add_argument(
+            "--input",
+            default=INPUT_PATH,
+            help="the raw export, transformed responses, or participants saved as .npz",
+        )
+        command.set_defaults(run=run)
+        return command
+
+    command = add_command("transform", transform, "transform the raw export")
+    command.add_argument(
+        "--output",
+        required=True,
+        help="path of the transformed responses, a CSV, or .npz for typed arrays",
+    )
+    add_command("validate", validate, "check the raw export, without transforming it")
+    command = add_command("solve", solve, "match the participants")
+    command.add_argument(
+        "--preview",
+        action="store_true",
+        help="only estimate how many people would be matched",
+    )
+    command.add_argument(
+        "--previous", help="re-match around a previously published matches file"
+    )
+    command.add_argument("--formats", nargs="+", default=RESULT_FORMATS)
+    command.add_argument(
+        "--limit", type=int, help="only match the first participants, for testing"
+    )
+    command.add_argument(
+        "--record",
+        action=argparse.BooleanOptionalAction,
+        default=RECORD_HISTORY,
+        help=f"record the run in {HISTORY_PATH}, once its matches are final",
+    )
+    command = add_command("report", report, "write the results of a matches file")
+    command.add_argument("matches", help="a published matches_<timestamp>.txt file")
+    command.add_argument("--formats", nargs="+", default=["summary"])
+    command = commands.add_parser(
+        "history", help="import matches files into the history of the runs"
+    )
+    command.add_argument(
+        "--import",
+        dest="import_files",
+        metavar="FILE",
+        nargs="+",
+        default=[],
+        help="published matches_<timestamp>.txt files",
+    )
+    command.set_defaults(run=history)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        # Solve with the defaults
+        args = parser.parse_args(["solve"])
+    return args
+
+
+def main(argv=None):
+    """Run the command given in argv (the command line if None), solving if there is none"""
+    args = parse_args(argv)
+    try:
+        args.run(args)
+    finally:
+        # Optional: Save the time, memory and statistics of each stage of the run
+        if PROFILE_OUTPUT_PATH is not None:
+            profiler.write_json(PROFILE_OUTPUT_PATH)
+            logger.info(f"Profile saved to {PROFILE_OUTPUT_PATH}")
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,66 @@
+"""Participants shared by the tests: small hand-made tables, and synthetic events"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_responses
+from data_transformer import transform_chunk
+from date_matching.enum_classes import Identity, Year, YearPreference
+from date_matching.participants import (
+    IDENTITIES,
+    YEAR_PREFERENCES,
+    YEARS,
+    ParticipantTable,
+)
+
+
+def build_table(
+    answers,
+    gender=Identity.WOMAN,
+    seeking=Identity.ANY,
+    day=0,
+    days=("Either",),
+    year=Year.FIRST,
+    year_preference=YearPreference.ANY,
+) -> ParticipantTable:
+    """
+    A table of people with the given answers, everyone alike but for the fields given per person
+    Each field is a value for everyone, or a list with a value per person
+    """
+    answers = np.asarray(answers, dtype=np.float32)
+    size = len(answers)
+
+    def codes(values, options):
+        values = values if isinstance(values, (list, tuple)) else [values] * size
+        return np.array([options.index(value) for value in values], dtype=np.int8)
+
+    return ParticipantTable(
+        names=np.array([f"p{idx}" for idx in range(size)], dtype=object),
+        student_ids=np.array([f"u{idx}" for idx in range(size)], dtype=object),
+        gender=codes(gender, IDENTITIES),
+        seeking=codes(seeking, IDENTITIES),
+        day=np.broadcast_to(np.asarray(day, dtype=np.int16), size).copy(),
+        days=list(days),
+        year=codes(year, YEARS),
+        year_preference=codes(year_preference, YEAR_PREFERENCES),
+        questions=[f"q{idx}" for idx in range(answers.shape[1])],
+        answers=answers,
+    )
+
+
+@pytest.fixture
+def make_table():
+    return build_table
+
+
+@pytest.fixture(scope="session")
+def synthetic_table(tmp_path_factory):
+    """Builds the table of a synthetic event of the given size, as the benchmarks generate it"""
+
+    def synthetic(num_participants: int, seed: int = 0) -> ParticipantTable:
+        path = tmp_path_factory.mktemp("synthetic") / "responses.csv"
+        write_responses(str(path), num_participants, seed=seed)
+        return ParticipantTable.from_frame(transform_chunk(pd.read_csv(path)))
+
+    return synthetic
@@ -0,0 +1,81 @@
+"""
+The exact backends (blossom and the ILP) find the best matching, as found by trying every
+matching of small random graphs, and the local search stays within its reported bound
+
+    python -m pytest tests/test_backends.py
+"""
+
+import numpy as np
+import pytest
+
+from date_matching.matching.backends import get_backend
+from date_matching.matching.matchtracker import MatchTracker
+
+
+def random_problem(seed: int, max_people: int = 9):
+    """A MatchTracker over a random graph of a few people, and the weight of each match"""
+    rng = np.random.default_rng(seed)
+    size = int(rng.integers(2, max_people))
+    pairs = [
+        (idx1, idx2)
+        for idx1 in range(size)
+        for idx2 in range(idx1 + 1, size)
+        if rng.random() < 0.6
+    ]
+    # Some pairs weigh less than nothing, as a penalty can outweigh their score
+    weights = rng.uniform(-0.3, 1.0, size=len(pairs)).round(3).tolist()
+    match_tracker = MatchTracker(list(range(size)), pairs)
+    return match_tracker, weights + [0.0] * size
+
+
+def objective(match_tracker, weights, matches) -> float:
+    people = [idx for match in matches for idx in match]
+    assert len(people) == len(set(people))
+    return sum(weights[match_tracker.get_match_id(*match)] for match in matches)
+
+
+def brute_force(match_tracker, weights) -> float:
+    """The best objective over every matching of the graph"""
+    weight = {
+        pair: w
+        for pair, w in zip(match_tracker.possible_matches, weights)
+        if pair[0] != pair[1]
+    }
+
+    def best(free) -> float:
+        if not free:
+            return 0.0
+        first, others = free[0], free[1:]
+        # first is left unmatched, or matched with anyone free they can be paired with
+        options = [best(others)]
+        for partner in others:
+            pair = (first, partner)
+            if pair in weight:
+                rest = tuple(idx for idx in others if idx != partner)
+                options.append(weight[pair] + best(rest))
+        return max(options)
+
+    return best(tuple(range(len(match_tracker.persons))))
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_exact_backends_find_the_best_matching(seed):
+    match_tracker, weights = random_problem(seed)
+    best = brute_force(match_tracker, weights)
+    for name in ("blossom", "ilp"):
+        backend = get_backend(name)
+        matches = backend.solve(match_tracker, weights)
+        assert objective(match_tracker, weights, matches) == pytest.approx(best), name
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_local_search_is_within_its_bound(seed):
+    match_tracker, weights = random_problem(seed, max_people=14)
+    backend = get_backend("local_search")
+    found = objective(match_tracker, weights, backend.solve(match_tracker, weights))
+    best = objective(
+        match_tracker, weights, get_backend("blossom").solve(match_tracker, weights)
+    )
+    assert found == pytest.approx(backend.stats["objective"])
+    assert found <= best + 1e-9
+    assert best <= backend.stats["upper_bound"] + 1e-9
@@ -0,0 +1,160 @@
+"""
+Candidate pruning: widening the partners of the people left unmatched, the approximate index,
+the report of the objective lost to the pruning, and the bounds of tiled scoring
+
+    python -m pytest tests/test_candidates.py
+"""
+
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from date_matching.matching.candidates import CandidateGraph, optimal_objective
+from date_matching.matching.compatibility import PairScores
+from date_matching.matching.masks import pairable_mask, penalty_matrix
+from date_matching.matching.matchmaker import MatchMaker
+from date_matching.matching.neighbours import CosineIndex
+from date_matching.matching.tiles import BYTES_PER_EDGE, search_partners
+from date_matching.profiling import profiler
+
+# A and B are each other's best partner, and the best partner of both C and D is A. With a
+# single candidate each, C and D are left unmatched, but each is the other's second best
+WIDEN_ANSWERS = [
+    [1.0, 0.0, 0.0],
+    [1.0, 0.15, 0.0],
+    [1.0, -0.2, 0.2],
+    [1.0, -0.2, -0.2],
+]
+A, B, C, D = range(4)
+
+
+def weights(table, pairs):
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    idx1, idx2 = pairs[:, 0], pairs[:, 1]
+    return PairScores(table.answers)[idx1, idx2] - 0.1 * penalty_matrix(
+        table, idx1, idx2
+    )
+
+
+def test_widen_finds_a_partner_once_the_top_k_are_taken(make_table):
+    table = make_table(WIDEN_ANSWERS)
+    graph = CandidateGraph(table, top_k=1)
+    neighbours = [partners.tolist() for partners in graph.neighbours]
+    assert neighbours == [[B], [A], [A], [A]]
+
+    pairs = graph.pairs()
+    _, matches = optimal_objective(pairs, weights(table, pairs))
+    assert matches == [(A, B)]
+
+    widened = graph.widen(np.array([C, D]))
+    assert widened.tolist() == [C, D]
+    assert graph.neighbours[C].tolist() == [A, D]
+    pairs = graph.pairs()
+    _, matches = optimal_objective(pairs, weights(table, pairs))
+    assert sorted(matches) == [(A, B), (C, D)]
+
+
+def test_widen_stops_once_every_partner_is_known(make_table):
+    table = make_table(WIDEN_ANSWERS)
+    graph = CandidateGraph(table, top_k=3)
+    assert graph.exhausted.all()
+    assert not len(graph.widen(np.arange(4)))
+
+
+def test_index_probing_every_cell_is_exact(synthetic_table):
+    table = synthetic_table(300, seed=4)
+    exact = CandidateGraph(table, top_k=5, index_min_participants=len(table) + 1)
+    approximate = CandidateGraph(table, top_k=5, index_min_participants=0)
+    approximate.index = CosineIndex(approximate.scorer, cells=6, probes=6)
+    approximate._search(np.arange(len(table)), approximate=True)
+
+    for idx in range(len(table)):
+        found, best = approximate.neighbours[idx], exact.neighbours[idx]
+        assert len(found) == len(best)
+        np.testing.assert_allclose(
+            np.sort(weights(table, [(idx, partner) for partner in found])),
+            np.sort(weights(table, [(idx, partner) for partner in best])),
+            rtol=1e-6,
+        )
+
+
+def test_index_only_finds_valid_partners(synthetic_table):
+    table = synthetic_table(600, seed=5)
+    graph = CandidateGraph(table, top_k=8, index_min_participants=0)
+    assert graph.index is not None
+    assert not graph.exhausted.any()
+    pairs = np.array(graph.pairs())
+    assert pairable_mask(table, pairs[:, 0], pairs[:, 1]).all()
+    assert (pairs[:, 0] < pairs[:, 1]).all()
+    assert all(len(neighbours) <= 8 for neighbours in graph.neighbours)
+
+
+def pruning_report(table, top_k):
+    """The statistics of the pruning loss report of a solve with the given top k"""
+    profiler.reset()
+    with contextlib.redirect_stdout(io.StringIO()):
+        mm = MatchMaker(
+            table, solver_backend="blossom", top_k=top_k, quiet=True, group_dates=False
+        )
+        mm.solve()
+    (report,) = [
+        record["stats"]
+        for record in profiler.records
+        if record["stage"].endswith("pruning_loss")
+    ]
+    return mm, report
+
+
+@pytest.mark.parametrize("top_k", [1, 3])
+def test_pruning_loss_report(synthetic_table, top_k):
+    table = synthetic_table(200, seed=6)
+    mm, report = pruning_report(table, top_k)
+
+    pairs = np.argwhere(np.triu(pairable_mask(table), 1))
+    exact, _ = optimal_objective([tuple(pair) for pair in pairs], weights(table, pairs))
+    assert report["pairable_pairs"] == len(pairs)
+    assert report["exact_objective"] == pytest.approx(exact)
+    assert report["pruned_objective"] <= report["exact_objective"] + 1e-9
+    assert report["objective_lost"] == pytest.approx(
+        report["exact_objective"] - report["pruned_objective"]
+    )
+    assert report["objective_lost"] >= -1e-9
+    # The candidates the run was solved with give the pruned objective
+    assert mm.results.objective == pytest.approx(report["pruned_objective"])
+
+
+def test_tiled_scoring_needs_a_top_k_or_a_threshold(synthetic_table):
+    table = synthetic_table(50, seed=7)
+    with pytest.raises(ValueError, match="every pairable pair"):
+        MatchMaker(
+            table, tiled_scoring=True, top_k=None, score_threshold=0.0, quiet=True
+        )
+    with contextlib.redirect_stdout(io.StringIO()):
+        mm = MatchMaker(
+            table, tiled_scoring=True, top_k=None, score_threshold=0.5, quiet=True
+        )
+    assert all(weight > 0.5 for weight in weights(table, mm.candidates.pairs()))
+
+
+def test_partners_without_a_top_k_fit_the_memory_budget(synthetic_table):
+    table = synthetic_table(200, seed=8)
+    people, eligible = np.arange(len(table)), np.ones(len(table), dtype=bool)
+    partners, counts = search_partners(
+        table, people, None, eligible, threshold=-1.0, workers=2
+    )
+    assert [len(row) for row in partners] == counts.tolist()
+
+    # Half the memory the partners need
+    memory_budget = counts.sum() * BYTES_PER_EDGE // 2
+    with pytest.raises(MemoryError, match="above the threshold"):
+        search_partners(
+            table,
+            people,
+            None,
+            eligible,
+            threshold=-1.0,
+            memory_budget=memory_budget,
+            workers=2,
+        )
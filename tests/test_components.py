@@ -0,0 +1,62 @@
+"""
+Solving the independent components of the problem, one after the other or on a process pool,
+gives the same objective as solving the whole problem at once
+
+    python -m pytest tests/test_components.py
+"""
+
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from date_matching.matching.backends import get_backend
+from date_matching.matching.components import solve_components
+from date_matching.matching.matchmaker import MatchMaker
+
+
+def objective(mm, matches) -> float:
+    weights = mm.match_weights
+    return sum(weights[mm.match_tracker.get_match_id(*match)] for match in matches)
+
+
+@pytest.fixture(scope="module", params=["blossom", "ilp"])
+def split_problem(request, synthetic_table):
+    """A problem that splits into several components, and its objective solved at once"""
+    table = synthetic_table(120, seed=11)
+    with contextlib.redirect_stdout(io.StringIO()):
+        mm = MatchMaker(
+            table,
+            build_model=False,
+            solver_backend=request.param,
+            quiet=True,
+            group_dates=False,
+        )
+    assert len(mm.components) > 1
+    backend = get_backend(request.param)
+    whole = objective(mm, backend.solve(mm.match_tracker, mm.match_weights))
+    return mm, whole
+
+
+@pytest.mark.parametrize("min_parallel_pairs", [np.inf, 0], ids=["serial", "pool"])
+def test_components_have_the_objective_of_the_whole(split_problem, min_parallel_pairs):
+    mm, whole = split_problem
+    matches, statuses, stats = solve_components(
+        mm.match_tracker,
+        mm.match_weights,
+        mm.backend.name,
+        mm.components,
+        max_workers=2,
+        min_parallel_pairs=min_parallel_pairs,
+    )
+    assert len(statuses) == len(mm.components)
+    assert objective(mm, matches) == pytest.approx(whole)
+    # Everyone is matched at most once
+    people = np.array(matches).ravel()
+    assert len(people) == len(np.unique(people))
+
+    # The sizes of the models solved are labelled as summed, not as those of one model
+    if mm.backend.name == "ilp":
+        assert "constraints" not in stats and "variables" not in stats
+        assert stats["constraints_summed"] > 0
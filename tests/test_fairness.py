@@ -0,0 +1,120 @@
+"""
+The fairness objectives, checked against every matching of small random graphs: "bottleneck"
+makes the lowest compatibility as high as it can be at the largest number of pairs, and "floor"
+never pairs anyone below the floor
+
+    python -m pytest tests/test_fairness.py
+"""
+
+import numpy as np
+import pytest
+
+from date_matching.matching.backends import get_backend
+from date_matching.matching.blossom import max_weight_matching
+from date_matching.matching.fairness import (
+    bottleneck_floor,
+    fair_weights,
+    max_cardinality_matching,
+)
+from date_matching.matching.matchtracker import MatchTracker
+
+
+def random_graph(seed: int, max_vertices: int = 10):
+    """The pairs of a random graph, with their compatibility and weight in the objective"""
+    rng = np.random.default_rng(seed)
+    size = int(rng.integers(2, max_vertices))
+    pairs = np.array(
+        [
+            (idx1, idx2)
+            for idx1 in range(size)
+            for idx2 in range(idx1 + 1, size)
+            if rng.random() < 0.4
+        ],
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    scores = rng.random(len(pairs)).round(2)
+    # A penalty takes some pairs below nothing
+    weights = scores - 0.3 * (rng.random(len(pairs)) < 0.2)
+    return size, pairs, scores, weights
+
+
+def matchings(pairs: np.ndarray, used=frozenset(), start: int = 0):
+    """Every matching of the pairs, as the positions of its pairs"""
+    yield []
+    for position in range(start, len(pairs)):
+        idx1, idx2 = pairs[position].tolist()
+        if idx1 not in used and idx2 not in used:
+            for rest in matchings(pairs, used | {idx1, idx2}, position + 1):
+                yield [position] + rest
+
+
+def solve(size, pairs, weights):
+    """The matches of the best matching for the weights, as positions in pairs"""
+    match_tracker = MatchTracker(list(range(size)), [tuple(pair) for pair in pairs])
+    all_weights = list(weights) + [0.0] * size
+    matches = get_backend("blossom").solve(match_tracker, all_weights)
+    return [match_tracker.get_match_id(*match) for match in matches]
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_max_cardinality_matching(seed):
+    size, pairs, _, _ = random_graph(seed, max_vertices=12)
+    best = max(len(matching) for matching in matchings(pairs))
+    for mate in (None, [-1] * size):
+        mate, found = max_cardinality_matching(size, pairs, mate)
+        assert found == best
+        assert all(mate[mate[v]] == v for v in range(size) if mate[v] != -1)
+        edges = set(map(tuple, pairs.tolist()))
+        assert all((v, mate[v]) in edges for v in range(size) if v < mate[v])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_max_cardinality_matching_of_larger_graphs(seed):
+    # Sparse enough to leave people unmatched, and to contract blossoms along the way
+    rng = np.random.default_rng(seed)
+    pairs = np.unique(np.sort(rng.integers(0, 300, size=(400, 2)), axis=1), axis=0)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    mate = max_weight_matching(
+        [(idx1, idx2, 1.0) for idx1, idx2 in pairs.tolist()], maxcardinality=True
+    )
+    best = sum(partner != -1 for partner in mate) // 2
+    _, found = max_cardinality_matching(300, pairs, [-1] * 300)
+    assert found == best
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_bottleneck_maximises_the_lowest_score(seed):
+    size, pairs, scores, weights = random_graph(seed)
+    positive = weights > 0
+    candidates = [
+        matching for matching in matchings(pairs[positive]) if len(matching) > 0
+    ]
+    if not candidates:
+        return
+    most = max(len(matching) for matching in candidates)
+    lowest = max(
+        scores[positive][matching].min()
+        for matching in candidates
+        if len(matching) == most
+    )
+    floor, found = bottleneck_floor(size, pairs[positive], scores[positive])
+    assert (floor, found) == (pytest.approx(lowest), most)
+
+    fair, fair_floor = fair_weights("bottleneck", size, pairs, weights, scores)
+    assert fair_floor == pytest.approx(lowest)
+    matches = solve(size, pairs, fair)
+    assert len(matches) == most
+    assert scores[matches].min() == pytest.approx(lowest)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_floor_never_pairs_below_the_floor(seed):
+    size, pairs, scores, weights = random_graph(seed)
+    fair, _ = fair_weights("floor", size, pairs, weights, scores, floor=0.5)
+    matches = solve(size, pairs, fair)
+    assert (scores[matches] >= 0.5).all()
+
+    # As many pairs as can be made at or above the floor
+    allowed = (scores >= 0.5) & (weights > 0)
+    most = max(len(matching) for matching in matchings(pairs[allowed]))
+    assert len(matches) == most
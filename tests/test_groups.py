@@ -0,0 +1,91 @@
+"""
+Every group formed is the right size, meets on a day everyone in it can make and splits into
+couples that can be paired, and the total score is within the reported upper bound, which holds
+for the best partition found by brute force on small events
+
+    python -m pytest tests/test_groups.py
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from date_matching.enum_classes import Identity
+from date_matching.matching import groups as groups_module
+from date_matching.matching.compatibility import CompatibilityMatrix
+from date_matching.matching.groups import form_groups
+from date_matching.matching.masks import day_preference_mask, pairable_mask
+
+
+def check_formation(table, scores, members, group_size, formation):
+    grouped = [idx for group in formation.groups for idx in group]
+    assert sorted(grouped + formation.unassigned) == sorted(members.tolist())
+
+    for group, couples, score in zip(
+        formation.groups, formation.couples, formation.scores
+    ):
+        assert len(group) == group_size
+        assert day_preference_mask(table, *np.ix_(group, group)).all()
+        assert sorted(idx for couple in couples for idx in couple) == group
+        for idx1, idx2 in couples:
+            assert idx1 != idx2 and pairable_mask(table, idx1, idx2)
+        assert score == pytest.approx(scores[np.ix_(group, group)].sum() / 2)
+    assert formation.total <= formation.upper_bound + 1e-9
+
+
+@pytest.mark.parametrize("group_size", [2, 4, 6])
+def test_groups_are_valid(synthetic_table, group_size, monkeypatch):
+    table = synthetic_table(300, seed=12)
+    scores = CompatibilityMatrix(table.answers).scores
+    members = np.arange(0, len(table), 2)
+    # Several blocks of rows at a time
+    monkeypatch.setattr(groups_module, "BLOCK_SIZE", 1000)
+    formation = form_groups(table, scores, members, group_size, seed=1)
+    assert len(formation)
+    check_formation(table, scores, members, group_size, formation)
+
+
+def best_total(table, scores, members, group_size) -> float:
+    """The best total score of any set of valid groups, by brute force"""
+    valid = {}
+    for group in itertools.combinations(members.tolist(), group_size):
+        if not day_preference_mask(table, *np.ix_(group, group)).all():
+            continue
+        # Valid if the group splits into couples that can be paired
+        for order in itertools.permutations(group):
+            couples = np.array(order).reshape(-1, 2)
+            if pairable_mask(table, couples[:, 0], couples[:, 1]).all():
+                valid[group] = scores[np.ix_(group, group)].sum() / 2
+                break
+
+    def best(groups, used) -> float:
+        options = [0.0]
+        for position, group in enumerate(groups):
+            if used.isdisjoint(group):
+                rest = groups[position + 1 :]
+                options.append(valid[group] + best(rest, used | set(group)))
+        return max(options)
+
+    return best(list(valid), frozenset())
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_total_is_within_the_upper_bound(make_table, seed):
+    rng = np.random.default_rng(seed)
+    size = 8
+    table = make_table(
+        rng.random((size, 4)),
+        gender=[Identity.MAN, Identity.WOMAN] * (size // 2),
+        seeking=[Identity.WOMAN, Identity.MAN, Identity.ANY, Identity.ANY]
+        * (size // 4),
+        day=rng.integers(0, 3, size=size).tolist(),
+        days=("Thursday", "Friday", "Either"),
+    )
+    scores = CompatibilityMatrix(table.answers).scores
+    members = np.arange(size)
+    formation = form_groups(table, scores, members, 4, seed=seed)
+    check_formation(table, scores, members, 4, formation)
+    optimum = best_total(table, scores, members, 4)
+    assert formation.total <= optimum + 1e-9
+    assert optimum <= formation.upper_bound + 1e-9
@@ -0,0 +1,20 @@
+"""
+main() runs the command given, and solves the matching without one
+
+    python -m pytest tests/test_main.py
+"""
+
+import logging
+
+import main
+
+
+def test_solve_is_the_default_command():
+    assert main.parse_args([]).run is main.solve
+    assert main.parse_args(["validate"]).run is main.validate
+
+
+def test_main_runs_the_command(caplog):
+    with caplog.at_level(logging.INFO):
+        main.main(["validate"])
+    assert "The export is valid." in caplog.messages
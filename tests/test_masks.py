@@ -0,0 +1,107 @@
+"""
+The vectorised constraints of masks.py give the same results as the Person methods they replace,
+for every pair of the sample data and of a synthetic population
+
+    python -m pytest tests/test_masks.py
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_responses
+from data_transformer import transform_chunk
+from date_matching.matching.masks import (
+    day_preference_mask,
+    gender_seeking_mask,
+    pairable_mask,
+    penalty_matrix,
+    preferred_mask,
+)
+from date_matching.participants import ParticipantTable
+from date_matching.person import Person
+
+SAMPLE_PATH = "date_matching/data/romantic_dates.csv"
+DAY_COLUMN = "Which day would you prefer the date to be on?"
+YEAR_PREFERENCE_COLUMN = "I would like to go on a date with someone who is..."
+
+
+def with_edge_cases(df: pd.DataFrame) -> pd.DataFrame:
+    """A copy of df where some people chose no day, and some an unknown year preference"""
+    df = df.reset_index(drop=True).copy()
+    df.loc[df.index[::7], DAY_COLUMN] = np.nan
+    df.loc[df.index[3::11], YEAR_PREFERENCE_COLUMN] = "No preference given"
+    return df
+
+
+@pytest.fixture
+def sample_data() -> pd.DataFrame:
+    return pd.read_csv(SAMPLE_PATH)
+
+
+@pytest.fixture
+def synthetic_data(tmp_path) -> pd.DataFrame:
+    # Read back from the raw export, as the benchmarks do
+    path = write_responses(str(tmp_path / "responses.csv"), 300, seed=7)
+    return transform_chunk(pd.read_csv(path))
+
+
+@pytest.fixture(params=["sample_data", "synthetic_data"], ids=["sample", "synthetic"])
+def population(request):
+    """The participant table of a population, and its people built one by one"""
+    df = with_edge_cases(request.getfixturevalue(request.param))
+    persons = [Person.build(row) for _, row in df.iterrows()]
+    return ParticipantTable.from_frame(df), persons
+
+
+def expected(persons, constraint) -> np.ndarray:
+    """The matrix of constraint(person1, person2) over every pair, computed pair by pair"""
+    return np.array(
+        [[constraint(person1, person2) for person2 in persons] for person1 in persons]
+    )
+
+
+def off_diagonal(persons) -> np.ndarray:
+    """
+    The pairs of different people. Person.is_pairable compares people by value, so identical
+    rows would be pairable with each other whatever their answers, and are left out
+    """
+    distinct = np.array(
+        [[person1 != person2 for person2 in persons] for person1 in persons]
+    )
+    np.fill_diagonal(distinct, False)
+    return distinct
+
+
+def test_population_has_edge_cases(population):
+    table, persons = population
+    assert any(not isinstance(person.day_choice, str) for person in persons)
+    assert any(person.year_preference is None for person in persons)
+
+
+def test_pairable_mask(population):
+    table, persons = population
+    pairable = expected(persons, Person.is_pairable)
+    distinct = off_diagonal(persons)
+
+    np.testing.assert_array_equal(pairable_mask(table)[distinct], pairable[distinct])
+    np.testing.assert_array_equal(
+        (gender_seeking_mask(table) & day_preference_mask(table))[distinct],
+        pairable[distinct],
+    )
+    # Everyone can be matched with themselves, i.e. left unmatched
+    assert pairable_mask(table).diagonal().all()
+
+
+def test_preferred_mask(population):
+    table, persons = population
+    preferred = expected(persons, Person.is_pairing_preferred)
+    distinct = off_diagonal(persons)
+
+    np.testing.assert_array_equal(preferred_mask(table)[distinct], preferred[distinct])
+    np.testing.assert_array_equal(
+        penalty_matrix(table)[distinct], (~preferred[distinct]).astype(np.float64)
+    )
+    # Being unmatched is never penalised
+    assert preferred_mask(table).diagonal().all()
+    assert not penalty_matrix(table).diagonal().any()
@@ -0,0 +1,24 @@
+"""
+The profiler works without the resource module, which Windows doesn't have
+
+    python -m pytest tests/test_profiling.py
+"""
+
+import sys
+
+from date_matching import profiling
+from date_matching.profiling import Profiler
+
+
+def test_peak_memory_without_resource(monkeypatch):
+    assert profiling._max_rss_mb() > 0
+    # A None entry makes the import fail, as on Windows
+    monkeypatch.setitem(sys.modules, "resource", None)
+    monkeypatch.setitem(sys.modules, "psutil", None)
+    assert profiling._max_rss_mb() == 0.0
+
+    profiler = Profiler()
+    with profiler.stage("load"):
+        profiler.record(rows=3)
+    (record,) = profiler.records
+    assert record["stage"] == "load" and record["stats"] == {"rows": 3}
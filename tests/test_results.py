@@ -0,0 +1,36 @@
+"""
+The published matches file only holds the matches, and reads back as the same pairs, while the
+solver statistics go to the summary and the JSON
+
+    python -m pytest tests/test_results.py
+"""
+
+import contextlib
+import io
+import json
+
+from date_matching.matching.incremental import load_previous_matches
+from date_matching.matching.matchmaker import MatchMaker
+from date_matching.matching.results import write_results
+
+
+def test_solver_statistics_stay_out_of_the_matches_file(synthetic_table, tmp_path):
+    table = synthetic_table(60, seed=13)
+    with contextlib.redirect_stdout(io.StringIO()):
+        mm = MatchMaker(table, solver_backend="blossom", quiet=True)
+        mm.solve()
+    text, summary, dump = write_results(
+        mm.results, str(tmp_path / "matches"), ["text", "summary", "json"]
+    )
+
+    with open(text) as f:
+        published = f.read()
+    assert "SOLVER" not in published and "Backend" not in published
+    ids = table.student_ids
+    pairs = [(str(ids[idx1]), str(ids[idx2])) for idx1, idx2 in mm.results.pairs]
+    assert sorted(load_previous_matches(text)) == sorted(pairs)
+
+    with open(summary) as f:
+        assert "backend: blossom" in f.read()
+    with open(dump) as f:
+        assert json.load(f)["solver"]["backend"] == "blossom"
@@ -0,0 +1,120 @@
+"""
+The schedule fits the venue capacity, and when space runs out it keeps the pairs of the highest
+total weight, as found by trying every subset of the pairs on small events
+
+    python -m pytest tests/test_scheduling.py
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from date_matching.matching.scheduling import flatten_capacity, schedule_matches
+from date_matching.participants import ParticipantTable
+
+DAYS = ["Thursday", "Friday", "Either"]
+
+
+def table_with_days(day: np.ndarray) -> ParticipantTable:
+    """Participants who only differ by their day, an index into DAYS or -1 if missing"""
+    size = len(day)
+    codes = np.zeros(size, dtype=np.int8)
+    return ParticipantTable(
+        names=np.array([f"p{idx}" for idx in range(size)], dtype=object),
+        student_ids=np.array([f"u{idx}" for idx in range(size)], dtype=object),
+        gender=codes,
+        seeking=codes,
+        day=np.asarray(day, dtype=np.int16),
+        days=DAYS,
+        year=codes,
+        year_preference=codes,
+        questions=["q"],
+        answers=np.ones((size, 1), dtype=np.float32),
+    )
+
+
+def schedulable(table, pairs, capacity) -> bool:
+    """Whether the pairs can all be given a slot, found by brute force over the slots"""
+    seats = [
+        slot for slot, pairs_per_slot in capacity.items() for _ in range(pairs_per_slot)
+    ]
+    if len(pairs) > len(seats):
+        return False
+    allowed = []
+    for idx1, idx2 in pairs:
+        fixed = {
+            DAYS[table.day[idx]]
+            for idx in (idx1, idx2)
+            if table.day[idx] >= 0 and DAYS[table.day[idx]] != "Either"
+        }
+        allowed.append(
+            [k for k, (day, _) in enumerate(seats) if not fixed or day in fixed]
+        )
+    return any(
+        len(set(choice)) == len(choice) for choice in itertools.product(*allowed)
+    )
+
+
+def check_schedule(table, matches, weights, venue_capacity):
+    schedule = schedule_matches(table, matches, weights, venue_capacity)
+    capacity = flatten_capacity(venue_capacity)
+
+    # Every pair is either scheduled on a day both people can make, or unscheduled
+    assert sorted(list(schedule.slots) + schedule.unscheduled) == sorted(matches)
+    for (idx1, idx2), (day, _) in schedule.slots.items():
+        for idx in (idx1, idx2):
+            assert DAYS[table.day[idx]] in (day, "Either")
+    for slot, load in schedule.load().items():
+        assert load <= capacity[slot]
+    return schedule
+
+
+def test_either_pair_takes_the_room_of_a_lighter_fixed_pair():
+    # Thursday can host a single pair: the pair free on either day weighs more, so it's kept
+    table = table_with_days([0, 0, 2, 2])
+    matches = [(0, 1), (2, 3)]
+    schedule = check_schedule(
+        table, matches, [0.5, 0.9], {"Thursday": {"18:00": 1}, "Friday": {}}
+    )
+    assert list(schedule.slots) == [(2, 3)]
+    assert schedule.unscheduled == [(0, 1)]
+
+
+def test_either_pairs_balance_the_load():
+    # A Thursday pair, then the pairs free on either day go to the least utilised slots
+    table = table_with_days([0, 2] + [2] * 8)
+    matches = [(0, 1), (2, 3), (4, 5), (6, 7), (8, 9)]
+    venue_capacity = {"Thursday": {"18:00": 2, "19:30": 2}, "Friday": {"18:00": 4}}
+    schedule = check_schedule(table, matches, [0.5, 0.9, 0.8, 0.7, 0.6], venue_capacity)
+    assert not schedule.unscheduled
+    capacity = flatten_capacity(venue_capacity)
+    # 5 pairs in 8 seats, no slot is more than 3/4 full
+    assert all(load / capacity[slot] <= 0.75 for slot, load in schedule.load().items())
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_schedule_has_the_highest_weight(seed):
+    rng = np.random.default_rng(seed)
+    num_pairs = int(rng.integers(1, 8))
+    # Pairable days: a fixed day with the same day or "Either", or "Either" with anyone free
+    kinds = [[0, 0], [0, 2], [1, 1], [2, 1], [2, 2], [-1, 2]]
+    day = [kinds[kind] for kind in rng.integers(0, len(kinds), size=num_pairs)]
+    table = table_with_days(np.concatenate(day))
+    matches = [(2 * k, 2 * k + 1) for k in range(num_pairs)]
+    weights = rng.random(num_pairs).round(3)
+    venue_capacity = {
+        day: {time: int(rng.integers(0, 3)) for time in ("18:00", "19:30")}
+        for day in ("Thursday", "Friday")
+    }
+    capacity = flatten_capacity(venue_capacity)
+
+    schedule = check_schedule(table, matches, weights, venue_capacity)
+    weight = {pair: w for pair, w in zip(matches, weights)}
+    best = max(
+        sum(weight[pair] for pair in subset)
+        for size in range(num_pairs + 1)
+        for subset in itertools.combinations(matches, size)
+        if schedulable(table, subset, capacity)
+    )
+    assert sum(weight[pair] for pair in schedule.slots) == pytest.approx(best)
@@ -0,0 +1,97 @@
+"""
+The score cache gives the same scores and pairability as computing them afresh, and a re-run
+only scores the participants whose responses are new or changed
+
+    python -m pytest tests/test_score_cache.py
+"""
+
+import numpy as np
+import pytest
+
+from date_matching.matching import score_cache
+from date_matching.matching.compatibility import CompatibilityMatrix
+from date_matching.matching.masks import pairable_mask
+from date_matching.matching.score_cache import ScoreCache
+from date_matching.participants import ParticipantTable
+
+
+@pytest.fixture
+def scored_rows(monkeypatch):
+    """The number of rows of each call scoring participants against everyone"""
+    rows = []
+
+    def cosine_similarity(left, right):
+        rows.append(len(left))
+        return score_cache_cosine_similarity(left, right)
+
+    score_cache_cosine_similarity = score_cache.cosine_similarity
+    monkeypatch.setattr(score_cache, "cosine_similarity", cosine_similarity)
+    return rows
+
+
+RESPONSE = ("gender", "seeking", "day", "year", "year_preference", "answers")
+
+
+def with_response(table: ParticipantTable, idx: int, **response) -> ParticipantTable:
+    """A copy of the table where the participant idx changed the given fields of their response"""
+    fields = {field: getattr(table, field).copy() for field in RESPONSE}
+    for field, value in response.items():
+        fields[field][idx] = value
+    return ParticipantTable(
+        names=table.names,
+        student_ids=table.student_ids,
+        days=table.days,
+        questions=table.questions,
+        date_format=table.date_format,
+        **fields,
+    )
+
+
+def check(table, scores, pairable):
+    everyone = np.arange(len(table))
+    np.testing.assert_allclose(
+        np.asarray(scores), CompatibilityMatrix(table.answers).scores
+    )
+    np.testing.assert_array_equal(np.asarray(pairable), pairable_mask(table))
+    # Indexed like the full matrices, by pairs and by blocks
+    idx1, idx2 = everyone[::3], everyone[::-3]
+    np.testing.assert_allclose(scores[idx1, idx2], np.asarray(scores)[idx1, idx2])
+    block = np.ix_(idx1, idx2)
+    np.testing.assert_array_equal(pairable[block], np.asarray(pairable)[block])
+
+
+def test_rerun_only_scores_the_changed_participant(
+    synthetic_table, tmp_path, scored_rows
+):
+    table = synthetic_table(120, seed=9)
+    cache = ScoreCache(str(tmp_path / "cache"))
+    check(table, *cache.lookup(table))
+    assert sum(scored_rows) == len(table)
+
+    # Nobody changed: the cache is read as is
+    scored_rows.clear()
+    scores, pairable = cache.lookup(table)
+    assert isinstance(scores, np.memmap) and isinstance(pairable, np.memmap)
+    assert not sum(scored_rows)
+    check(table, scores, pairable)
+
+    # A participant changed their answers: only their row is scored
+    changed = with_response(table, 17, answers=table.answers[17][::-1])
+    scored_rows.clear()
+    scores, pairable = cache.lookup(changed)
+    assert sum(scored_rows) == 1
+    check(changed, scores, pairable)
+
+
+def test_repeated_responses_are_scored_against_each_other(synthetic_table, tmp_path):
+    table = synthetic_table(60, seed=10)
+    repeated = with_response(
+        table, 5, **{field: getattr(table, field)[4] for field in RESPONSE}
+    )
+    cache = ScoreCache(str(tmp_path / "cache"))
+    keys = cache.participant_keys(repeated)
+    assert keys[4] == keys[5]
+    cache.lookup(table)
+    # Stored once, so the second lookup scores the repeated response again
+    for _ in range(2):
+        check(repeated, *cache.lookup(repeated))